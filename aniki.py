@@ -1,16 +1,24 @@
 from sqlalchemy import (
     create_engine, Column, Integer, String, Text, Boolean, Date, DateTime,
-    ForeignKey, Numeric, Table, Enum, UniqueConstraint
+    ForeignKey, Numeric, Table, Enum, UniqueConstraint, func, literal, event
 )
+from sqlalchemy.exc import IntegrityError, TimeoutError as PoolTimeoutError
 from sqlalchemy.orm import declarative_base, relationship, sessionmaker
+from sqlalchemy.pool import QueuePool
 from sqlalchemy.dialects import postgresql
 import enum
+import logging
 import os
+import re
+import threading
+import time
 from dotenv import load_dotenv # Importar load_dotenv
 
 # Cargar variables de entorno desde .env
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 # --- CONFIGURACIÓN DE LA BASE DE DATOS ---
 DATABASE_URL = os.getenv("DATABASE_URL")
 if not DATABASE_URL:
@@ -19,10 +27,120 @@ if not DATABASE_URL:
 
 print(f"URL de la base de datos utilizada: {DATABASE_URL}")
 
-ENGINE = create_engine(DATABASE_URL, echo=True)
+# Pool de conexiones y engine (todo configurable por entorno)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))  # segundos esperando una conexión libre
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # segundos; -1 para no reciclar
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "1") == "1"
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "30000"))  # 0 = sin límite
+DB_ECHO = os.getenv("DB_ECHO", "0") == "1"
+DB_ASYNC_ENABLED = os.getenv("DB_ASYNC_ENABLED", "1") == "1"
+DB_CREATE_MISSING_TABLES = os.getenv("DB_CREATE_MISSING_TABLES", "1") == "1"  # al arrancar, p. ej. chapter_manifests
+
+
+class _PoolMetrics:
+    """
+    Contadores del pool y del tiempo que tarda engine.connect() en dar una conexión (espera por
+    una libre + pre-ping + conexión nueva si hace falta). Solo usa API pública: eventos del pool
+    (checkout, connect) y una envoltura de engine.connect(), por donde pasan las sesiones sync y async.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.connects = 0
+        self.timed = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.timeouts = 0
+
+    def count(self, attr: str):
+        with self._lock:
+            setattr(self, attr, getattr(self, attr) + 1)
+
+    def record(self, waited: float, timed_out: bool = False):
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+                return
+            self.timed += 1
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "connections_opened": self.connects,
+                "timeouts": self.timeouts,
+                "wait_avg_ms": round(self.wait_total / self.timed * 1000, 2) if self.timed else 0.0,
+                "wait_max_ms": round(self.wait_max * 1000, 2),
+            }
+
+
+def _instrument(engine):
+    """Engancha _PoolMetrics a un engine síncrono (para uno async, a su sync_engine)."""
+    metrics = _PoolMetrics()
+    event.listen(engine, "checkout", lambda *args: metrics.count("checkouts"))
+    event.listen(engine, "connect", lambda *args: metrics.count("connects"))
+    connect = engine.connect
+
+    def timed_connect():
+        start = time.perf_counter()
+        try:
+            conn = connect()
+        except PoolTimeoutError:
+            metrics.record(0, timed_out=True)
+            raise
+        metrics.record(time.perf_counter() - start)
+        return conn
+
+    engine.connect = timed_connect
+    engine.pool_metrics = metrics
+    return engine
+
+
+def _engine_kwargs(pool_cls, statement_timeout_args: dict) -> dict:
+    return {
+        "echo": DB_ECHO,
+        "poolclass": pool_cls,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+        "connect_args": statement_timeout_args if DB_STATEMENT_TIMEOUT_MS > 0 else {},
+    }
+
+
+ENGINE = _instrument(create_engine(
+    DATABASE_URL,
+    **_engine_kwargs(QueuePool, {"options": f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"})
+))
 Base = declarative_base()
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=ENGINE)
 
+# Engine asíncrono opcional (asyncpg): permite guardar sin ocupar hilos del threadpool.
+# Si asyncpg no está instalado, ASYNC_ENGINE y AsyncSessionLocal quedan a None.
+ASYNC_ENGINE = None
+AsyncSessionLocal = None
+if DB_ASYNC_ENABLED:
+    try:
+        import asyncpg  # noqa: F401
+        from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+        from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+        ASYNC_DATABASE_URL = re.sub(r"^postgres(ql)?(\+\w+)?://", "postgresql+asyncpg://", DATABASE_URL)
+        ASYNC_ENGINE = create_async_engine(
+            ASYNC_DATABASE_URL,
+            **_engine_kwargs(AsyncAdaptedQueuePool, {"server_settings": {"statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)}})
+        )
+        _instrument(ASYNC_ENGINE.sync_engine)
+        AsyncSessionLocal = async_sessionmaker(ASYNC_ENGINE, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+    except ImportError:
+        pass
+
 # --- ENUMS ---
 class MediaTypeEnum(enum.Enum):
     anime = "anime"
@@ -207,6 +325,20 @@ class Chapter(Base):
     __table_args__ = (UniqueConstraint("manga_id", "number", name="uq_manga_chapter_number"),)
 
 
+class ChapterManifest(Base):
+    """Lista de imágenes de un capítulo (dirPath + images del visor); no cambia una vez subido."""
+    __tablename__ = "chapter_manifests"
+    id = Column(Integer, primary_key=True)
+    url = Column(String(255), unique=True, nullable=False) # URL canónica del visor (https://zonatmo.com/viewer/<id>)
+    source_url = Column(String(255)) # URL pedida (view_uploads), para enlazar con chapters.url
+    chapter_id = Column(Integer, ForeignKey("chapters.id"), nullable=True)
+    dir_path = Column(Text, nullable=False)
+    images = Column(postgresql.JSONB, nullable=False)
+    created_at = Column(DateTime(timezone=True))
+
+    chapter = relationship("Chapter")
+
+
 # --- TABLAS DE ENLACES (EMBEDS/DOWNLOADS) ---
 
 class Embed(Base):
@@ -386,6 +518,19 @@ def create_all_tables():
     Base.metadata.create_all(ENGINE)
     print("Base de datos y tablas creadas con éxito.")
 
+def create_missing_tables():
+    """
+    Crea las tablas que aún no existan (create_all no toca las existentes), para que las
+    añadidas después de la instalación, como chapter_manifests, aparezcan sin ejecutar este
+    script a mano. Se llama al arrancar la app; si la BD no responde, solo se avisa.
+    """
+    if not DB_CREATE_MISSING_TABLES:
+        return
+    try:
+        Base.metadata.create_all(ENGINE, checkfirst=True)
+    except Exception as e:
+        print(f"No se pudieron crear las tablas que faltan: {e}")
+
 def get_db():
     """
     Generador para obtener una sesión de base de datos.
@@ -397,6 +542,109 @@ def get_db():
     finally:
         db.close()
 
+async def get_async_db():
+    """
+    Equivalente asíncrono de get_db(). Solo disponible si asyncpg está instalado.
+    """
+    if AsyncSessionLocal is None:
+        raise RuntimeError("El engine asíncrono no está disponible (instala asyncpg o activa DB_ASYNC_ENABLED)")
+    async with AsyncSessionLocal() as db:
+        yield db
+
+def _pool_status(engine) -> dict:
+    pool = engine.pool
+    return {
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        "overflow": pool.overflow(),
+        **engine.pool_metrics.stats(),
+    }
+
+def get_db_stats() -> dict:
+    """Estado de los pools de conexiones (sync y, si existe, async) para /api/stats/db."""
+    stats = {
+        "echo": DB_ECHO,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "statement_timeout_ms": DB_STATEMENT_TIMEOUT_MS,
+        "upsert_skipped_rows": get_upsert_skipped(),
+        "sync": _pool_status(ENGINE),
+        "async": None,
+    }
+    if ASYNC_ENGINE is not None:
+        stats["async"] = _pool_status(ASYNC_ENGINE.sync_engine)
+    return stats
+
+UPSERT_CHUNK_SIZE = 1000  # filas por sentencia (Postgres admite como mucho 65535 parámetros)
+
+# Filas omitidas por upsert_rows desde el arranque, por tabla (se ven en /api/stats/db)
+_upsert_skipped = {}
+_upsert_skipped_lock = threading.Lock()
+
+def get_upsert_skipped() -> dict:
+    with _upsert_skipped_lock:
+        return dict(_upsert_skipped)
+
+def upsert_rows(db, model, rows, conflict_cols=None, update_cols=(), keep_existing_cols=(), fallbacks=None):
+    """
+    Inserta muchas filas con una sola sentencia INSERT ... ON CONFLICT por bloque.
+
+    - conflict_cols: columnas del índice único para ON CONFLICT. Si es None, cualquier
+      conflicto se ignora (DO NOTHING).
+    - update_cols: columnas que se sobrescriben con el valor nuevo si la fila ya existe.
+    - keep_existing_cols: columnas que solo se actualizan cuando el valor nuevo no es NULL.
+    - fallbacks: {columna: valor} que se inserta en las filas nuevas cuando el valor es NULL.
+      En las filas existentes ese valor cuenta como NULL (si la columna está en
+      keep_existing_cols se conserva el guardado).
+
+    Todas las filas deben tener las mismas claves. Con conflict_cols, las filas repetidas se
+    deduplican (gana la última). Si la sentencia falla por otra restricción de unicidad, se
+    reintenta fila a fila dentro de savepoints y solo se omiten las filas conflictivas.
+    Devuelve el número de filas omitidas, que además se acumula por tabla en get_upsert_skipped().
+    """
+    table = getattr(model, "__table__", model)
+    if conflict_cols:
+        rows = list({tuple(r.get(c) for c in conflict_cols): r for r in rows}.values())
+    if not rows:
+        return 0
+
+    fallbacks = fallbacks or {}
+    if fallbacks:
+        rows = [{**r, **{c: v for c, v in fallbacks.items() if r.get(c) is None}} for r in rows]
+
+    def incoming(stmt, c):
+        if c in fallbacks:
+            return func.nullif(stmt.excluded[c], literal(fallbacks[c], type_=table.c[c].type))
+        return stmt.excluded[c]
+
+    def build(values):
+        stmt = postgresql.insert(table).values(values)
+        set_ = {c: stmt.excluded[c] for c in update_cols}
+        set_.update({c: func.coalesce(incoming(stmt, c), table.c[c]) for c in keep_existing_cols})
+        if conflict_cols and set_:
+            return stmt.on_conflict_do_update(index_elements=list(conflict_cols), set_=set_)
+        return stmt.on_conflict_do_nothing(index_elements=list(conflict_cols) if conflict_cols else None)
+
+    skipped = 0
+    for i in range(0, len(rows), UPSERT_CHUNK_SIZE):
+        chunk = rows[i:i + UPSERT_CHUNK_SIZE]
+        try:
+            with db.begin_nested():
+                db.execute(build(chunk))
+        except IntegrityError:
+            for row in chunk:
+                try:
+                    with db.begin_nested():
+                        db.execute(build([row]))
+                except IntegrityError as ie:
+                    skipped += 1
+                    logger.warning("Fila omitida en %s por conflicto de integridad: %s", table.name, ie.orig)
+    if skipped:
+        with _upsert_skipped_lock:
+            _upsert_skipped[table.name] = _upsert_skipped.get(table.name, 0) + skipped
+    return skipped
+
 if __name__ == "__main__":
     # Asegúrate de que el archivo .env existe y contiene DATABASE_URL
     # Ejemplo de .env:
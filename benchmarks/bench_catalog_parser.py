@@ -0,0 +1,136 @@
+"""
+Benchmark del parser del catálogo (utils.catalog.parse_catalog) frente al anterior de
+animecatalog.get_animes: re.split por "},{", cinco re.search por anime, el regex de
+`a.name=` sobre todo el script dentro del bucle y BeautifulSoup para la paginación.
+
+Sin argumentos se genera una página sintética a partir de los animes de data.txt (repetidos
+hasta --items), con el payload al estilo SvelteKit. Ojo: el repo no incluye páginas reales del
+catálogo, así que esa página solo aproxima el payload (sin el resto del HTML ni del script de
+la web) y las cifras que da no son las de producción; en páginas grandes la diferencia entre
+los dos parsers es pequeña (del orden de un 15-20 % a 200 animes, frente a ~2x a 20). Para
+medir con páginas reales, guardarlas y pasarlas como argumento:
+    curl -A "Mozilla/5.0" -o /tmp/catalogo.html "https://animeav1.com/catalogo?page=1"
+
+Uso (desde la raíz del repo):
+    python benchmarks/bench_catalog_parser.py [/tmp/catalogo.html ...] [--items 200] [--repeat 20]
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.catalog import parse_catalog  # noqa: E402
+from utils.parsing import parse_html  # noqa: E402
+from utils.scraping import extract_sveltekit_script  # noqa: E402
+
+DATA_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data.txt")
+
+
+def synthetic_page(items: int) -> str:
+    """Página de catálogo con `items` animes sacados de la respuesta de ejemplo de data.txt."""
+    with open(DATA_FILE, encoding="utf-8") as f:
+        text = f.read()
+    start = text.find("\n  {", text.find("Anime search"))
+    sample, _ = json.JSONDecoder().raw_decode(text, start + 3)
+    base = sample["animes"]
+    results = []
+    for i in range(items):
+        a = base[i % len(base)]
+        results.append(
+            f'{{id:"{int(a["id"]) + 10000 * (i // len(base))}",title:{json.dumps(a["title"], ensure_ascii=False)},'
+            f'synopsis:{json.dumps(a["synopsis"], ensure_ascii=False)},categoryId:{a["categoryId"]},'
+            f'slug:"{a["slug"]}-{i}",category:a}}'
+        )
+    script = (
+        '__sveltekit_x={base:""};const data=(function(a){a.id=1;a.name="TV Anime";return '
+        '[{type:"data",data:{user:null}},{type:"data",data:{results:[' + ",".join(results) + "]}}]})({});"
+    )
+    links = "".join(f'<a href="/catalogo?page={n}">{n}</a>' for n in range(1, 51))
+    cards = "".join(f'<article><h3>{i}</h3><p>{"x" * 200}</p></article>' for i in range(items))
+    return (
+        f"<html><head><title>Catálogo</title></head><body><div>{items} Resultados</div>{cards}"
+        f"<nav>{links}</nav><script>{script}</script></body></html>"
+    )
+
+
+def legacy_parse(html: str, category=None):
+    """El parser anterior de get_animes (copiado tal cual, para comparar)."""
+    data_script = extract_sveltekit_script(html, "__sveltekit_")
+    soup = parse_html(html)
+    results_match = re.search(r"results:\s*\[([\s\S]*?)\]\s*}", data_script)
+    anime_strs = re.split(r"\}\s*,\s*\{", results_match.group(1))
+    animes = []
+    for i, anime_str in enumerate(anime_strs):
+        if i > 0:
+            anime_str = "{" + anime_str
+        if i < len(anime_strs) - 1:
+            anime_str += "}"
+        id_match = re.search(r'id:"([^"]+)"', anime_str)
+        title_match = re.search(r'title:"([^"]+)"', anime_str)
+        synopsis_match = re.search(r'synopsis:"(.*?)"(?=\s*,\s*categoryId:)', anime_str, re.DOTALL)
+        category_id_match = re.search(r'categoryId:(\d+)', anime_str)
+        slug_match = re.search(r'slug:"([^"]+)"', anime_str)
+        anime_dict = {}
+        if id_match:
+            anime_dict["id"] = id_match.group(1)
+        if title_match:
+            anime_dict["title"] = title_match.group(1)
+        if synopsis_match:
+            anime_dict["synopsis"] = synopsis_match.group(1)
+        if category_id_match:
+            anime_dict["categoryId"] = int(category_id_match.group(1))
+        if slug_match:
+            anime_dict["slug"] = slug_match.group(1)
+        category_match = re.search(r'a\.name="([^"]+)"', data_script)
+        anime_dict["category"] = {"name": category_match.group(1) if category_match else "Unknown"}
+        animes.append(anime_dict)
+    total_results = len(animes)
+    results_elem = soup.find(string=re.compile(r"\d+ Resultados"))
+    if results_elem:
+        total_results = int(re.search(r"\d+", results_elem).group())
+    pagination_links = soup.find_all("a", href=lambda href: href and "page=" in href if href else False)
+    pages = [int(plink.text) for plink in pagination_links if plink.text.isdigit()]
+    return animes, total_results, max(pages) if pages else 1
+
+
+def new_parse(html: str, category=None):
+    return parse_catalog(html, extract_sveltekit_script(html, "__sveltekit_"), category)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("pages", nargs="*", help="páginas del catálogo guardadas (HTML)")
+    ap.add_argument("--items", type=int, default=200, help="animes de la página sintética")
+    ap.add_argument("--repeat", type=int, default=20)
+    args = ap.parse_args()
+
+    samples = {}
+    for path in args.pages:
+        with open(path, encoding="utf-8") as f:
+            samples[os.path.basename(path)] = f.read()
+    if not samples:
+        samples[f"sintética ({args.items} animes)"] = synthetic_page(args.items)
+
+    for title, html in samples.items():
+        print(f"\n{title} ({len(html) / 1024:.1f} KiB)")
+        outputs = {}
+        for name, fn in (("parse_catalog", new_parse), ("anterior", legacy_parse)):
+            try:
+                outputs[name] = fn(html)
+            except Exception as e:
+                print(f"  {name:<14} error: {e.__class__.__name__}: {e}")
+                continue
+            best = min(timeit.repeat(lambda: fn(html), number=1, repeat=args.repeat))
+            animes, total, pages = outputs[name]
+            print(f"  {name:<14} {best * 1000:8.2f} ms  ({len(animes)} animes, {total} resultados, {pages} páginas)")
+        if len(outputs) == 2:
+            ids = [[a.get("id") for a in out[0]] for out in outputs.values()]
+            print(f"  mismos ids: {'sí' if ids[0] == ids[1] else 'no'}")
+
+
+if __name__ == "__main__":
+    main()
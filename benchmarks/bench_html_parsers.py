@@ -0,0 +1,60 @@
+"""
+Benchmark de los backends de parseo de HTML (utils.parsing) sobre páginas guardadas.
+
+Para cada página y cada parser instalado (html.parser, lxml, html5lib) mide el DOM completo
+y el parseo limitado con los filtros de subárboles de las rutas (SEARCH_CARDS, MANGA_DETAIL).
+Si selectolax está instalado se incluye como referencia (solo el parseo).
+
+Guardar páginas, por ejemplo:
+    curl -A "Mozilla/5.0" -o /tmp/library.html "https://zonatmo.com/library?title=one"
+    curl -A "Mozilla/5.0" -o /tmp/detalle.html "https://zonatmo.com/library/manga/73041/x"
+
+Uso (desde la raíz del repo):
+    python benchmarks/bench_html_parsers.py /tmp/library.html /tmp/detalle.html [--repeat 10]
+"""
+import argparse
+import importlib.util
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.parsing import parse_html, SEARCH_CARDS, MANGA_DETAIL  # noqa: E402
+
+FILTERS = {"completo": None, "SEARCH_CARDS": SEARCH_CARDS, "MANGA_DETAIL": MANGA_DETAIL}
+
+
+def available_parsers():
+    parsers = ["html.parser"]
+    for name in ("lxml", "html5lib"):
+        if importlib.util.find_spec(name) is not None:
+            parsers.append(name)
+    return parsers
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("pages", nargs="+", help="ficheros HTML guardados")
+    ap.add_argument("--repeat", type=int, default=10)
+    args = ap.parse_args()
+
+    selectolax = None
+    if importlib.util.find_spec("selectolax") is not None:
+        from selectolax.parser import HTMLParser as selectolax
+
+    for path in args.pages:
+        with open(path, encoding="utf-8", errors="replace") as f:
+            html = f.read()
+        print(f"\n{os.path.basename(path)} ({len(html) / 1024:.1f} KiB)")
+        for parser in available_parsers():
+            for label, only in FILTERS.items():
+                best = min(timeit.repeat(lambda: parse_html(html, only=only, parser=parser), number=1, repeat=args.repeat))
+                print(f"  {parser:<12} {label:<13} {best * 1000:8.2f} ms")
+        if selectolax is not None:
+            best = min(timeit.repeat(lambda: selectolax(html), number=1, repeat=args.repeat))
+            print(f"  {'selectolax':<12} {'completo':<13} {best * 1000:8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Benchmark del decodificador de payloads SvelteKit (utils.sveltekit.decode_js) frente a
+demjson3 y al antiguo truco regex + json.loads.
+
+Las muestras salen de las respuestas JSON de data.txt, reescritas como literales JS al
+estilo SvelteKit (claves sin comillas, undefined, comas finales). Además se genera una
+muestra "media" grande con cientos de episodios, que es el caso lento en /api/animes/{slug}.
+
+Uso (desde la raíz del repo):
+    python benchmarks/bench_sveltekit_decoder.py [--repeat 20] [--episodes 500]
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.sveltekit import decode_js  # noqa: E402
+
+try:
+    import demjson3
+except ImportError:
+    demjson3 = None
+
+DATA_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data.txt")
+_IDENT = re.compile(r"^[A-Za-z_$][\w$]*$")
+
+
+def to_js(value) -> str:
+    """Serializa un valor Python como lo haría SvelteKit (aprox.)."""
+    if value is None:
+        return "undefined"
+    if isinstance(value, dict):
+        items = [f"{k if _IDENT.match(k) else json.dumps(k)}:{to_js(v)}" for k, v in value.items()]
+        return "{" + ",".join(items) + (",}" if items else "}")
+    if isinstance(value, list):
+        items = [to_js(v) for v in value]
+        return "[" + ",".join(items) + (",]" if items else "]")
+    return json.dumps(value, ensure_ascii=False)
+
+
+def load_samples(episodes: int) -> dict:
+    with open(DATA_FILE, encoding="utf-8") as f:
+        text = f.read()
+    decoder = json.JSONDecoder()
+    samples = {}
+    for m in re.finditer(r"^(\S[^\n]*)\n+curl", text, re.M):
+        title = m.group(1).strip()
+        start = text.find("\n  {", m.end())
+        if start == -1:
+            continue
+        try:
+            obj, _ = decoder.raw_decode(text, start + 3)
+        except ValueError:
+            continue
+        samples[title] = to_js(obj)
+        if "slug (detalles)" in title and "episodes" in obj:
+            big = dict(obj)
+            template = obj["episodes"][0] if obj["episodes"] else {"number": 1}
+            big["episodes"] = [{**template, "number": n, "id": 100000 + n} for n in range(1, episodes + 1)]
+            samples[f"{title} x{episodes} episodios"] = to_js(big)
+    return samples
+
+
+def regex_hack(js: str):
+    """El parser anterior de animeepisode/animeschedule (para comparar)."""
+    data_json = re.sub(r'([{\[,]\s*)([A-Za-z0-9_@$-]+)\s*:', r'\1"\2":', js)
+    data_json = data_json.replace("undefined", "null").replace("void 0", "null")
+    data_json = re.sub(r',\s*(\]|})', r'\1', data_json)
+    return json.loads(data_json)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--repeat", type=int, default=20)
+    ap.add_argument("--episodes", type=int, default=500)
+    args = ap.parse_args()
+
+    decoders = {"decode_js": decode_js, "regex+json": regex_hack}
+    if demjson3 is not None:
+        decoders["demjson3"] = lambda s: demjson3.decode(s)
+    else:
+        print("(demjson3 no instalado: se omite de la comparación)")
+
+    for title, js in load_samples(args.episodes).items():
+        expected = decode_js(js)
+        print(f"\n{title} ({len(js) / 1024:.1f} KiB)")
+        for name, fn in decoders.items():
+            try:
+                ok = fn(js) == expected
+            except Exception as e:
+                print(f"  {name:<12} error: {e.__class__.__name__}")
+                continue
+            best = min(timeit.repeat(lambda: fn(js), number=1, repeat=args.repeat))
+            print(f"  {name:<12} {best * 1000:8.2f} ms{'' if ok else '  (resultado distinto)'}")
+
+
+if __name__ == "__main__":
+    main()
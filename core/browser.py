@@ -0,0 +1,252 @@
+import logging
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from core.config import BROWSER_POOL_SIZE, BROWSER_MAX_USES, BROWSER_LEASE_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+
+def create_chrome_driver():
+    """Chrome headless con las opciones que usaba el scraper del horario."""
+    from selenium import webdriver  # opcional: solo con SCHEDULE_ENGINE=selenium
+    from selenium.webdriver.chrome.options import Options
+
+    options = Options()
+    options.add_argument("--headless=new")
+    options.add_argument("--disable-gpu")
+    options.add_argument("--no-sandbox")
+    options.add_argument("--disable-dev-shm-usage")
+    return webdriver.Chrome(options=options)
+
+
+class _PooledDriver:
+    def __init__(self, driver):
+        self.driver = driver
+        self.uses = 0
+        self.created = time.time()
+
+
+class BrowserPool:
+    """
+    Pool de navegadores de larga vida, seguro entre hilos (los trabajos corren en to_thread).
+
+    - Como mucho `size` navegadores vivos; el resto de trabajos esperan en cola hasta
+      `lease_timeout` segundos (TimeoutError si no se libera ninguno).
+    - Antes de prestar un navegador se comprueba que responde; si no, se sustituye.
+    - Tras `max_uses` trabajos, o si al devolverlo ya no responde, se cierra y se arranca
+      otro en segundo plano para que el arranque en frío no caiga en la petición.
+    """
+
+    def __init__(self, size: int = BROWSER_POOL_SIZE, max_uses: int = BROWSER_MAX_USES,
+                 lease_timeout: float = BROWSER_LEASE_TIMEOUT, factory=create_chrome_driver):
+        self.size = size
+        self.max_uses = max_uses
+        self.lease_timeout = lease_timeout
+        self.factory = factory
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._alive = 0  # navegadores vivos + arranques en curso (huecos reservados)
+        self._pending = 0  # arranques en segundo plano todavía sin terminar
+        self._closed = False
+        self.leases = 0
+        self.waiting = 0
+        self.wait_max = 0.0
+        self.timeouts = 0
+        self.created = 0
+        self.recycled = 0
+        self.crashed = 0
+
+    # ---------- ciclo de vida ----------
+    def warm(self):
+        """
+        Arranca navegadores hasta llenar el pool (llamado al iniciar la app). Si uno no arranca
+        se deja de intentar y el pool sigue en modo degradado con los que haya.
+        """
+        self._closed = False
+        for _ in range(self.size):
+            with self._lock:
+                if not self._reserve_locked():
+                    return
+                self._pending += 1
+            if not self._spawn():
+                logger.warning(f"[BROWSER] Pool en modo degradado: {self._alive}/{self.size} navegadores")
+                return
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+        while True:
+            try:
+                entry = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._destroy(entry)
+
+    # ---------- préstamo ----------
+    @contextmanager
+    def lease(self):
+        # Un único plazo para todo el préstamo: esperar hueco y esperar navegador no se suman
+        start = time.perf_counter()
+        deadline = time.monotonic() + self.lease_timeout
+        with self._lock:
+            self.waiting += 1
+        acquired = self._slots.acquire(timeout=self.lease_timeout)
+        waited = time.perf_counter() - start
+        with self._lock:
+            self.waiting -= 1
+            self.wait_max = max(self.wait_max, waited)
+            if not acquired:
+                self.timeouts += 1
+        if not acquired:
+            raise TimeoutError(f"Ningún navegador libre tras {self.lease_timeout}s")
+        try:
+            entry = self._checkout(deadline)
+            with self._lock:
+                self.leases += 1
+            try:
+                yield entry.driver
+            finally:
+                self._checkin(entry)
+        finally:
+            self._slots.release()
+
+    def _checkout(self, deadline: float) -> _PooledDriver:
+        while True:
+            try:
+                entry = self._idle.get_nowait()
+            except queue.Empty:
+                entry = self._wait_or_create(deadline)
+            if self._healthy(entry):
+                return entry
+            with self._lock:
+                self.crashed += 1
+            self._destroy(entry)
+
+    def _checkin(self, entry: _PooledDriver):
+        entry.uses += 1
+        if self._closed:
+            self._destroy(entry)
+        elif not self._healthy(entry):
+            with self._lock:
+                self.crashed += 1
+            self._destroy(entry)
+            self._replace_in_background()
+        elif entry.uses >= self.max_uses:
+            with self._lock:
+                self.recycled += 1
+            self._destroy(entry)
+            self._replace_in_background()
+        else:
+            self._idle.put(entry)
+
+    def _wait_or_create(self, deadline: float) -> _PooledDriver:
+        """
+        Sin navegadores libres: si hay uno arrancando en segundo plano se espera a que llegue a
+        la cola; si no hay ninguno en camino y queda hueco, se arranca aquí. Nunca se pasa de `size`.
+        """
+        while True:
+            with self._lock:
+                reserved = not self._pending and self._reserve_locked()
+            if reserved:
+                return self._create()
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                with self._lock:
+                    self.timeouts += 1
+                raise TimeoutError(f"Ningún navegador libre tras {self.lease_timeout}s")
+            try:
+                # Espera corta y se vuelve a mirar: el arranque en curso puede fallar
+                return self._idle.get(timeout=min(remaining, 0.5))
+            except queue.Empty:
+                continue
+
+    # ---------- internos ----------
+    def _reserve_locked(self) -> bool:
+        """Reserva un hueco para un navegador nuevo (con self._lock tomado)."""
+        if self._alive >= self.size:
+            return False
+        self._alive += 1
+        return True
+
+    def _create(self) -> _PooledDriver:
+        """Arranca un navegador en un hueco ya reservado; si falla, lo libera."""
+        try:
+            entry = _PooledDriver(self.factory())
+        except Exception:
+            with self._lock:
+                self._alive -= 1
+            raise
+        with self._lock:
+            self.created += 1
+        return entry
+
+    def _spawn(self) -> bool:
+        """
+        Arranque en un hueco reservado (y contado en _pending); deja el navegador libre. Si el
+        pool se cerró mientras arrancaba, se cierra: close() ya vació la cola y nadie lo haría.
+        """
+        try:
+            entry = self._create()
+        except Exception as e:
+            logger.error(f"[BROWSER] No se pudo arrancar el navegador: {e}")
+            return False
+        finally:
+            with self._lock:
+                self._pending -= 1
+        with self._lock:
+            closed = self._closed
+            if not closed:
+                self._idle.put(entry)
+        if closed:
+            self._destroy(entry)
+        return True
+
+    def _replace_in_background(self):
+        with self._lock:
+            if self._closed or not self._reserve_locked():
+                return
+            self._pending += 1
+        threading.Thread(target=self._spawn, name="browser-warm", daemon=True).start()
+
+    def _destroy(self, entry: _PooledDriver):
+        with self._lock:
+            self._alive -= 1
+        try:
+            entry.driver.quit()
+        except Exception as e:
+            logger.warning(f"[BROWSER] Error al cerrar el navegador: {e}")
+
+    @staticmethod
+    def _healthy(entry: _PooledDriver) -> bool:
+        try:
+            entry.driver.execute_script("return 1")
+            return True
+        except Exception:
+            return False
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": self.size,
+                "alive": self._alive,
+                "idle": self._idle.qsize(),
+                "starting": self._pending,
+                "waiting": self.waiting,
+                "leases": self.leases,
+                "wait_max_ms": round(self.wait_max * 1000, 2),
+                "timeouts": self.timeouts,
+                "created": self.created,
+                "recycled": self.recycled,
+                "crashed": self.crashed,
+                "max_uses": self.max_uses,
+            }
+
+
+browser_pool = BrowserPool()
+
+
+def get_browser_stats() -> dict:
+    return browser_pool.stats()
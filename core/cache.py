@@ -1,13 +1,557 @@
+import asyncio
+import logging
+import struct
+import sys
+import threading
 import time
-from core.config import CACHE_TTL
+import zlib
+from collections import OrderedDict
+import orjson
+from core.config import (
+    CACHE_TTL, CACHE_MAX_ENTRIES, CACHE_MAX_BYTES, CACHE_SWEEP_INTERVAL,
+    CACHE_SWR_ENABLED, CACHE_POLICIES, CACHE_BACKEND, REDIS_URL, CACHE_REDIS_PREFIX,
+    CACHE_REDIS_TIMEOUT, CACHE_L1_TTL, CACHE_COMPRESS_MIN_BYTES
+)
 
-cache = {}
+logger = logging.getLogger(__name__)
 
-def get_cached(key):
-    now = time.time()
-    if key in cache and now - cache[key]["timestamp"] < CACHE_TTL:
-        return cache[key]["data"]
-    return None
 
-def set_cache(key, value):
-    cache[key] = {"timestamp": time.time(), "data": value}
+def _estimate_size(value, _seen=None) -> int:
+    """
+    Tamaño aproximado en bytes de un valor (recorre dicts, listas y tuplas).
+    No pretende ser exacto, solo dar una cota razonable para el límite de memoria.
+    """
+    if _seen is None:
+        _seen = set()
+    if id(value) in _seen:
+        return 0
+    _seen.add(id(value))
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        for k, v in value.items():
+            size += _estimate_size(k, _seen) + _estimate_size(v, _seen)
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        for v in value:
+            size += _estimate_size(v, _seen)
+    return size
+
+
+def _hit_rate(hits: int, stale_hits: int, misses: int) -> float:
+    """Las entradas viejas servidas por SWR también son aciertos (no hubo que esperar al scrapeo)."""
+    lookups = hits + stale_hits + misses
+    return round((hits + stale_hits) / lookups, 4) if lookups else 0.0
+
+
+class CacheBackend:
+    """
+    Interfaz común de los backends de caché. Las entradas tienen un TTL y un periodo de
+    gracia posterior en el que siguen disponibles como "viejas" (stale-while-revalidate).
+    Los métodos `a*` son los que se usan desde el bucle de eventos: por defecto llaman a los
+    síncronos (la memoria no bloquea) y los backends con E/S de red los sacan a un hilo.
+    """
+
+    def lookup(self, key, allow_stale: bool = True):
+        """Devuelve (valor, fresco); (None, False) si no hay nada usable."""
+        raise NotImplementedError
+
+    def get(self, key):
+        value, fresh = self.lookup(key, allow_stale=False)
+        return value
+
+    def set(self, key, value, ttl: float = None, grace: float = 0):
+        raise NotImplementedError
+
+    def delete(self, key):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def sweep(self) -> int:
+        """Purga entradas expiradas; los backends con expiración propia no hacen nada."""
+        return 0
+
+    def stats(self) -> dict:
+        return {}
+
+    async def alookup(self, key, allow_stale: bool = True):
+        return self.lookup(key, allow_stale=allow_stale)
+
+    async def aget(self, key):
+        value, fresh = await self.alookup(key, allow_stale=False)
+        return value
+
+    async def aset(self, key, value, ttl: float = None, grace: float = 0):
+        self.set(key, value, ttl=ttl, grace=grace)
+
+    async def adelete(self, key):
+        self.delete(key)
+
+
+class LRUCache(CacheBackend):
+    """
+    Caché en memoria con TTL por clave, límite de entradas y de bytes y expulsión LRU.
+    Cada entrada puede tener además un periodo de gracia tras el TTL en el que sigue
+    disponible como "vieja" (stale) para el modo stale-while-revalidate.
+    Es segura entre hilos: los endpoints síncronos corren en el threadpool de Starlette.
+    """
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES, max_bytes: int = CACHE_MAX_BYTES, default_ttl: float = CACHE_TTL):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self._data = OrderedDict()  # key -> {"data", "timestamp", "expires", "stale_until", "size"}
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.stale_hits = 0
+
+    def lookup(self, key, allow_stale: bool = True):
+        """
+        Devuelve (valor, fresco). Con allow_stale, una entrada expirada pero dentro de su
+        periodo de gracia se devuelve con fresco=False; si no hay nada usable, (None, False).
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None, False
+            if entry["expires"] > now:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return entry["data"], True
+            if entry["stale_until"] <= now:
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None, False
+            if not allow_stale:
+                self.misses += 1
+                return None, False
+            self._data.move_to_end(key)
+            self.stale_hits += 1
+            return entry["data"], False
+
+    def set(self, key, value, ttl: float = None, grace: float = 0):
+        ttl = self.default_ttl if ttl is None else ttl
+        now = time.time()
+        size = _estimate_size(value)
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            # Un valor más grande que toda la caché no se guarda
+            if size > self.max_bytes:
+                return
+            self._data[key] = {
+                "data": value, "timestamp": now, "expires": now + ttl,
+                "stale_until": now + ttl + grace, "size": size,
+            }
+            self._bytes += size
+            while len(self._data) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._data))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def sweep(self) -> int:
+        """Elimina las entradas expiradas. Devuelve cuántas se borraron."""
+        now = time.time()
+        with self._lock:
+            expired = [k for k, e in self._data.items() if e["stale_until"] <= now]
+            for k in expired:
+                self._remove(k)
+            self.expirations += len(expired)
+        return len(expired)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "backend": "memory",
+                "entries": len(self._data),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "hit_rate": _hit_rate(self.hits, self.stale_hits, self.misses),
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+    def _remove(self, key):
+        entry = self._data.pop(key)
+        self._bytes -= entry["size"]
+
+
+MemoryBackend = LRUCache
+
+
+# ===========================
+# Serialización compacta (para backends compartidos)
+# ===========================
+# Formato: 1 byte de codificación + cabecera (expires, stale_until) + cuerpo JSON.
+#   b"j": JSON sin comprimir; b"z": JSON comprimido con zlib.
+_HEADER = struct.Struct("!dd")
+
+
+def encode_entry(value, expires: float, stale_until: float) -> bytes:
+    body = orjson.dumps(value)
+    if len(body) >= CACHE_COMPRESS_MIN_BYTES:
+        return b"z" + _HEADER.pack(expires, stale_until) + zlib.compress(body, 6)
+    return b"j" + _HEADER.pack(expires, stale_until) + body
+
+
+def decode_entry(raw: bytes):
+    """Devuelve (valor, expires, stale_until)."""
+    kind, (expires, stale_until), body = raw[:1], _HEADER.unpack_from(raw, 1), raw[1 + _HEADER.size:]
+    if kind == b"z":
+        body = zlib.decompress(body)
+    elif kind != b"j":
+        raise ValueError(f"Formato de entrada de caché desconocido: {kind!r}")
+    return orjson.loads(body), expires, stale_until
+
+
+class RedisBackend(CacheBackend):
+    """
+    Caché compartida sobre cualquier servidor que hable el protocolo de Redis (Redis, Valkey,
+    KeyDB, o un servidor local de pruebas). Las entradas se guardan serializadas con
+    `encode_entry` y con expiración nativa en TTL + gracia, así que no hace falta barrerlas.
+    Se puede inyectar un cliente ya creado (`client`) para pruebas o para reutilizar conexiones.
+    Cualquier error de Redis se registra y se trata como un fallo de caché: la API sigue
+    funcionando, solo que scrapeando.
+    El cliente es el síncrono de redis-py: desde el bucle de eventos las llamadas van por
+    `asyncio.to_thread` (métodos `a*`), así un Redis lento o caído no para el resto de peticiones.
+    """
+
+    def __init__(self, url: str = REDIS_URL, prefix: str = CACHE_REDIS_PREFIX, default_ttl: float = CACHE_TTL, client=None):
+        if client is None:
+            import redis  # opcional: solo hace falta con CACHE_BACKEND=redis|tiered
+            client = redis.Redis.from_url(url, socket_timeout=CACHE_REDIS_TIMEOUT, socket_connect_timeout=CACHE_REDIS_TIMEOUT)
+        self.client = client
+        self.prefix = prefix
+        self.default_ttl = default_ttl
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    def _key(self, key) -> str:
+        return f"{self.prefix}{key}"
+
+    def _count(self, attr: str):
+        with self._lock:
+            setattr(self, attr, getattr(self, attr) + 1)
+
+    def lookup_entry(self, key):
+        """Devuelve (valor, expires, stale_until) o None; lo usa también TwoTierBackend."""
+        try:
+            raw = self.client.get(self._key(key))
+            return decode_entry(raw) if raw is not None else None
+        except Exception as e:
+            self._count("errors")
+            logger.warning(f"[CACHE] Error leyendo '{key}' de Redis: {e}")
+            return None
+
+    def lookup(self, key, allow_stale: bool = True):
+        entry = self.lookup_entry(key)
+        now = time.time()
+        if entry is None or entry[2] <= now:
+            self._count("misses")
+            return None, False
+        value, expires, _ = entry
+        if expires > now:
+            self._count("hits")
+            return value, True
+        if not allow_stale:
+            self._count("misses")
+            return None, False
+        self._count("stale_hits")
+        return value, False
+
+    def set(self, key, value, ttl: float = None, grace: float = 0):
+        ttl = self.default_ttl if ttl is None else ttl
+        now = time.time()
+        self.set_entry(key, value, now + ttl, now + ttl + grace)
+
+    def set_entry(self, key, value, expires: float, stale_until: float):
+        px = int((stale_until - time.time()) * 1000)
+        if px <= 0:
+            return
+        try:
+            self.client.set(self._key(key), encode_entry(value, expires, stale_until), px=px)
+        except Exception as e:
+            self._count("errors")
+            logger.warning(f"[CACHE] Error escribiendo '{key}' en Redis: {e}")
+
+    def delete(self, key):
+        try:
+            self.client.delete(self._key(key))
+        except Exception as e:
+            self._count("errors")
+            logger.warning(f"[CACHE] Error borrando '{key}' de Redis: {e}")
+
+    def clear(self):
+        """Borra solo las claves con nuestro prefijo."""
+        try:
+            keys = list(self.client.scan_iter(match=f"{self.prefix}*", count=500))
+            if keys:
+                self.client.delete(*keys)
+        except Exception as e:
+            self._count("errors")
+            logger.warning(f"[CACHE] Error vaciando Redis: {e}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "backend": "redis",
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "hit_rate": _hit_rate(self.hits, self.stale_hits, self.misses),
+                "errors": self.errors,
+            }
+
+    async def alookup_entry(self, key):
+        return await asyncio.to_thread(self.lookup_entry, key)
+
+    async def alookup(self, key, allow_stale: bool = True):
+        return await asyncio.to_thread(self.lookup, key, allow_stale)
+
+    async def aset(self, key, value, ttl: float = None, grace: float = 0):
+        await asyncio.to_thread(self.set, key, value, ttl, grace)
+
+    async def adelete(self, key):
+        await asyncio.to_thread(self.delete, key)
+
+
+class TwoTierBackend(CacheBackend):
+    """
+    L1 en memoria (por proceso) delante de un L2 compartido. Las lecturas van primero a L1;
+    un fallo de L1 que acierta en L2 se copia a L1 con a lo sumo `l1_ttl` segundos de vida,
+    para que un valor refrescado por otro worker se vea pronto. Las escrituras van a ambos.
+    """
+
+    def __init__(self, l1: LRUCache = None, l2: RedisBackend = None, l1_ttl: float = CACHE_L1_TTL):
+        self.l1 = l1 if l1 is not None else LRUCache()
+        self.l2 = l2 if l2 is not None else RedisBackend()
+        self.l1_ttl = l1_ttl
+
+    def lookup(self, key, allow_stale: bool = True):
+        value, fresh = self.l1.lookup(key, allow_stale=False)
+        if value is not None:
+            return value, fresh
+        return self._from_l2(key, self.l2.lookup_entry(key), allow_stale)
+
+    async def alookup(self, key, allow_stale: bool = True):
+        # Los aciertos de L1 no pasan por un hilo; solo la consulta a L2
+        value, fresh = self.l1.lookup(key, allow_stale=False)
+        if value is not None:
+            return value, fresh
+        return self._from_l2(key, await self.l2.alookup_entry(key), allow_stale)
+
+    def _from_l2(self, key, entry, allow_stale: bool):
+        now = time.time()
+        if entry is None or entry[2] <= now:
+            return None, False
+        value, expires, stale_until = entry
+        if expires > now:
+            self.l1.set(key, value, ttl=min(self.l1_ttl, expires - now))
+            return value, True
+        # Las entradas viejas no se copian a L1: en cuanto otro worker refresque, L2 tendrá la nueva
+        return (value, False) if allow_stale else (None, False)
+
+    def set(self, key, value, ttl: float = None, grace: float = 0):
+        ttl = self.l2.default_ttl if ttl is None else ttl
+        self.l1.set(key, value, ttl=min(self.l1_ttl, ttl))
+        self.l2.set(key, value, ttl=ttl, grace=grace)
+
+    async def aset(self, key, value, ttl: float = None, grace: float = 0):
+        ttl = self.l2.default_ttl if ttl is None else ttl
+        self.l1.set(key, value, ttl=min(self.l1_ttl, ttl))
+        await self.l2.aset(key, value, ttl=ttl, grace=grace)
+
+    def delete(self, key):
+        self.l1.delete(key)
+        self.l2.delete(key)
+
+    async def adelete(self, key):
+        self.l1.delete(key)
+        await self.l2.adelete(key)
+
+    def clear(self):
+        self.l1.clear()
+        self.l2.clear()
+
+    def sweep(self) -> int:
+        return self.l1.sweep()
+
+    def stats(self) -> dict:
+        return {"backend": "tiered", "l1": self.l1.stats(), "l2": self.l2.stats()}
+
+
+def create_backend(kind: str = CACHE_BACKEND) -> CacheBackend:
+    """Crea el backend configurado; si Redis no está disponible, cae a memoria."""
+    if kind in ("redis", "tiered"):
+        try:
+            l2 = RedisBackend()
+            return l2 if kind == "redis" else TwoTierBackend(l2=l2)
+        except ImportError:
+            logger.warning("[CACHE] CACHE_BACKEND=%s pero el paquete 'redis' no está instalado; usando memoria", kind)
+    elif kind != "memory":
+        logger.warning("[CACHE] CACHE_BACKEND desconocido '%s'; usando memoria", kind)
+    return MemoryBackend()
+
+
+cache = create_backend()
+
+# ===========================
+# Barrido en segundo plano
+# ===========================
+_sweeper = None
+_sweeper_stop = threading.Event()
+
+
+def _sweep_loop(interval: float):
+    while not _sweeper_stop.wait(interval):
+        cache.sweep()
+
+
+def start_sweeper(interval: float = CACHE_SWEEP_INTERVAL):
+    """Arranca (una sola vez) el hilo que purga entradas expiradas."""
+    global _sweeper
+    if _sweeper is not None and _sweeper.is_alive():
+        return
+    _sweeper_stop.clear()
+    _sweeper = threading.Thread(target=_sweep_loop, args=(interval,), name="cache-sweeper", daemon=True)
+    _sweeper.start()
+
+
+def stop_sweeper():
+    global _sweeper
+    _sweeper_stop.set()
+    _sweeper = None
+
+
+# ===========================
+# API usada por los routers
+# ===========================
+def get_policy(route: str = None) -> dict:
+    """Política de caché (ttl y gracia) de una ruta; ver CACHE_POLICIES en core.config."""
+    policy = CACHE_POLICIES.get(route) or CACHE_POLICIES["default"]
+    if not CACHE_SWR_ENABLED:
+        return {**policy, "grace": 0}
+    return policy
+
+async def get_cached(key):
+    return await cache.aget(key)
+
+async def set_cache(key, value, ttl: float = None, route: str = None):
+    start_sweeper()
+    policy = get_policy(route)
+    await cache.aset(key, value, ttl=policy["ttl"] if ttl is None else ttl, grace=policy["grace"])
+
+def get_cache_stats() -> dict:
+    stats = cache.stats()
+    stats["inflight"] = len(_inflight)
+    return stats
+
+
+# ===========================
+# Single-flight (coalescencia de fallos de caché)
+# ===========================
+_inflight = {}
+_waiters = {}  # tarea -> nº de llamadas esperándola
+_speculative = set()  # tareas que solo ha pedido una precarga especulativa
+
+
+def _forget_inflight(key, task):
+    if _inflight.get(key) is task:
+        del _inflight[key]
+    _speculative.discard(task)
+    # Marca la excepción como recuperada aunque todos los que esperaban se hayan ido
+    if not task.cancelled():
+        task.exception()
+
+
+async def single_flight(key, fetch, speculative: bool = False):
+    """
+    Ejecuta `fetch()` (una corrutina sin argumentos) una sola vez por clave mientras esté en curso.
+    Las peticiones concurrentes con la misma clave esperan a esa misma ejecución y reciben
+    su resultado o su excepción. Si quien la inició se desconecta, el scrapeo sigue para el resto.
+    Con `speculative` (precargas que nadie ha pedido todavía) el scrapeo sí se cancela si se
+    cancelan todos los que lo esperan, salvo que se haya unido alguna llamada normal.
+    """
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(fetch())
+        _inflight[key] = task
+        task.add_done_callback(lambda t: _forget_inflight(key, t))
+        if speculative:
+            _speculative.add(task)
+    elif not speculative:
+        _speculative.discard(task)
+    _waiters[task] = _waiters.get(task, 0) + 1
+    try:
+        return await asyncio.shield(task)
+    except asyncio.CancelledError:
+        if task in _speculative and _waiters[task] == 1:
+            task.cancel()
+        raise
+    finally:
+        _waiters[task] -= 1
+        if not _waiters[task]:
+            del _waiters[task]
+
+
+
+# ===========================
+# Stale-while-revalidate
+# ===========================
+_background_refreshes = set()
+
+
+def _on_refresh_done(key, task):
+    _background_refreshes.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.warning(f"[SWR] Fallo al refrescar '{key}' en segundo plano: {task.exception()}")
+
+
+def _refresh_in_background(key, fetch):
+    task = asyncio.ensure_future(single_flight(key, fetch))
+    _background_refreshes.add(task)
+    task.add_done_callback(lambda t: _on_refresh_done(key, t))
+
+
+async def cached_fetch(key, fetch, force_refresh: bool = False, speculative: bool = False):
+    """
+    Punto de entrada de los endpoints cacheados: devuelve el valor fresco si lo hay; si solo
+    queda uno viejo dentro del periodo de gracia lo devuelve al momento y lanza `fetch()` en
+    segundo plano; si no hay nada, espera a `fetch()` con single-flight.
+    `fetch` es responsable de llamar a set_cache con la ruta de su política.
+    `speculative`: ver single_flight.
+    """
+    if not force_refresh:
+        value, fresh = await cache.alookup(key)
+        if value is not None:
+            if not fresh:
+                _refresh_in_background(key, fetch)
+            return value
+        return await single_flight(key, fetch, speculative=speculative)
+    # Un refresco forzado no se une a un scrapeo normal ya en marcha (podría haber empezado
+    # antes del cambio que se quiere ver): va con su propia clave de single-flight
+    return await single_flight(f"{key}#refresh", fetch)
@@ -1,3 +1,5 @@
+import os
+
 BASE_URL = "https://animeav1.com"
 ZONATMO_BASE_URL = "https://zonatmo.com"
 
@@ -16,7 +18,93 @@ ZONATMO_HEADERS = {
     # "Cookie": "agrega aquí tus cookies si tienes una sesión válida",
 }
 
+# Parser de HTML para BeautifulSoup: "lxml" (rápido, por defecto), "html.parser" (stdlib) o
+# "html5lib". Si el elegido no está instalado se usa html.parser.
+HTML_PARSER = os.getenv("HTML_PARSER", "lxml")
+
+# Cliente HTTP compartido (un pool de conexiones por proceso)
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "15"))  # segundos
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+HTTP_PER_HOST_LIMIT = int(os.getenv("HTTP_PER_HOST_LIMIT", "10"))  # peticiones simultáneas por host
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "1") == "1"
+
+# Cola de persistencia en BD (los endpoints encolan y responden sin esperar al guardado)
+PERSIST_QUEUE_SIZE = int(os.getenv("PERSIST_QUEUE_SIZE", "200"))
+PERSIST_WORKERS = int(os.getenv("PERSIST_WORKERS", "2"))
+PERSIST_OVERFLOW = os.getenv("PERSIST_OVERFLOW", "drop_oldest")  # drop_oldest | drop_new
+PERSIST_SHUTDOWN_TIMEOUT = float(os.getenv("PERSIST_SHUTDOWN_TIMEOUT", "30"))  # segundos
+
+# Horario: por defecto se calcula día/hora a partir del payload (solo HTTP). "selenium" usa el
+# navegador headless de antes (requiere Chrome y chromedriver).
+SCHEDULE_ENGINE = os.getenv("SCHEDULE_ENGINE", "http")  # http | selenium
+SCHEDULE_TZ = os.getenv("SCHEDULE_TZ", "Europe/Madrid")  # zona en la que la web muestra las horas
+SCHEDULE_DELAY_DAYS = int(os.getenv("SCHEDULE_DELAY_DAYS", "7"))  # sin episodio nuevo en N días -> "Retrasado"
+
+# Pool de navegadores headless (solo se usa con SCHEDULE_ENGINE=selenium)
+BROWSER_POOL_SIZE = int(os.getenv("BROWSER_POOL_SIZE", "1"))  # Chromes vivos como máximo
+BROWSER_MAX_USES = int(os.getenv("BROWSER_MAX_USES", "50"))  # trabajos antes de reciclar un Chrome
+BROWSER_LEASE_TIMEOUT = float(os.getenv("BROWSER_LEASE_TIMEOUT", "60"))  # segundos en cola esperando uno libre
+
+# Detalles de anime: pedir el episodio 1 en paralelo (para los IDs de episodio) cuando la BD no los tiene
+DETAILS_SPECULATIVE_EPISODE = os.getenv("DETAILS_SPECULATIVE_EPISODE", "1") == "1"
+
+# POST /api/animes/batch: slugs por lote y scrapeos simultáneos de un mismo lote
+ANIME_BATCH_MAX = int(os.getenv("ANIME_BATCH_MAX", "100"))
+ANIME_BATCH_CONCURRENCY = int(os.getenv("ANIME_BATCH_CONCURRENCY", str(HTTP_PER_HOST_LIMIT)))
+
+# Catálogo por rangos (?pages=1-20): páginas por petición y descargas simultáneas
+CATALOG_MAX_PAGES = int(os.getenv("CATALOG_MAX_PAGES", "50"))
+CATALOG_CONCURRENCY = int(os.getenv("CATALOG_CONCURRENCY", "4"))
+
+# Home de mangas: plazo común (segundos) para descargar en paralelo las pestañas remotas
+MANGA_HOME_TAB_DEADLINE = float(os.getenv("MANGA_HOME_TAB_DEADLINE", "15"))
+
+# Caché en disco de imágenes proxificadas (páginas de manga; también vale para posters/backdrops)
+IMAGE_CACHE_ENABLED = os.getenv("IMAGE_CACHE_ENABLED", "1") == "1"
+IMAGE_CACHE_DIR = os.getenv("IMAGE_CACHE_DIR", os.path.join(".cache", "images"))
+IMAGE_CACHE_MAX_BYTES = int(os.getenv("IMAGE_CACHE_MAX_BYTES", str(2 * 1024 * 1024 * 1024)))  # 2 GiB
+IMAGE_CACHE_MAX_FILE_BYTES = int(os.getenv("IMAGE_CACHE_MAX_FILE_BYTES", str(20 * 1024 * 1024)))  # imágenes mayores no se guardan
+IMAGE_CACHE_WRITE_BUFFER = int(os.getenv("IMAGE_CACHE_WRITE_BUFFER", str(256 * 1024)))  # bytes acumulados por escritura a disco
+# Registro de visores de manga: caducan tras VIEWER_TTL segundos sin uso y como mucho hay
+# VIEWER_MAX_ENTRIES por proceso. VIEWER_BACKEND=redis los comparte entre workers (usa REDIS_URL).
+VIEWER_TTL = float(os.getenv("VIEWER_TTL", str(6 * 3600)))
+VIEWER_MAX_ENTRIES = int(os.getenv("VIEWER_MAX_ENTRIES", "1000"))
+VIEWER_BACKEND = os.getenv("VIEWER_BACKEND", "memory")
+# Precarga de los capítulos de manga en la caché de imágenes al crear un visor (opcional)
+IMAGE_PREFETCH_ENABLED = os.getenv("IMAGE_PREFETCH_ENABLED", "0") == "1"
+IMAGE_PREFETCH_CONCURRENCY = int(os.getenv("IMAGE_PREFETCH_CONCURRENCY", "4"))  # descargas simultáneas en total
+IMAGE_PREFETCH_HOST_RATE = float(os.getenv("IMAGE_PREFETCH_HOST_RATE", "8"))  # peticiones/s por host (0 = sin límite)
+IMAGE_PREFETCH_TIMEOUT = float(os.getenv("IMAGE_PREFETCH_TIMEOUT", "300"))  # segundos máximos por capítulo
+IMAGE_CACHE_CONTROL = os.getenv("IMAGE_CACHE_CONTROL", "public, max-age=86400")  # Cache-Control de los aciertos sin uno propio
+
 CACHE_TTL = 300  # segundos
+# Límites de la caché en memoria (entradas y bytes aproximados) y frecuencia del barrido de expirados
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "2000"))
+CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+CACHE_SWEEP_INTERVAL = float(os.getenv("CACHE_SWEEP_INTERVAL", "60"))  # segundos
+# Stale-while-revalidate: durante `grace` segundos tras expirar el TTL se sirve el valor viejo
+# y se refresca en segundo plano. grace=0 desactiva el modo para esa ruta.
+CACHE_SWR_ENABLED = os.getenv("CACHE_SWR_ENABLED", "1") == "1"
+# Backend de la caché: "memory" (por proceso), "redis" (compartida entre workers/instancias)
+# o "tiered" (L1 en memoria delante de Redis como L2). Redis requiere el paquete `redis`.
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory")
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+CACHE_REDIS_PREFIX = os.getenv("CACHE_REDIS_PREFIX", "aniki:cache:")
+CACHE_REDIS_TIMEOUT = float(os.getenv("CACHE_REDIS_TIMEOUT", "0.5"))  # segundos; si Redis no responde, es un fallo de caché
+CACHE_L1_TTL = float(os.getenv("CACHE_L1_TTL", "30"))  # segundos máximos que una entrada de L2 vive en L1
+CACHE_COMPRESS_MIN_BYTES = int(os.getenv("CACHE_COMPRESS_MIN_BYTES", "1024"))  # comprimir con zlib por encima de este tamaño
+CACHE_POLICIES = {
+    "default": {"ttl": CACHE_TTL, "grace": 0},
+    "home": {"ttl": CACHE_TTL, "grace": int(os.getenv("CACHE_GRACE_HOME", "3600"))},
+    "horario": {"ttl": CACHE_TTL, "grace": int(os.getenv("CACHE_GRACE_HORARIO", "3600"))},
+    "details": {"ttl": CACHE_TTL, "grace": int(os.getenv("CACHE_GRACE_DETAILS", "900"))},
+    "episode": {"ttl": CACHE_TTL, "grace": 0},  # los embeds caducan, mejor no servirlos viejos
+    # Las imágenes de un capítulo no cambian una vez subido: TTL largo (además quedan en BD)
+    "manifest": {"ttl": int(os.getenv("CACHE_TTL_MANIFEST", str(7 * 24 * 3600))), "grace": 0},
+}
 
 VALID_CATEGORIES = ["tv-anime", "pelicula", "ova", "especial"]
 VALID_GENRES = [
@@ -0,0 +1,119 @@
+import asyncio
+import logging
+from urllib.parse import urlsplit
+import httpx
+from core.config import (
+    HTTP_TIMEOUT, HTTP_CONNECT_TIMEOUT, HTTP_MAX_CONNECTIONS, HTTP_MAX_KEEPALIVE,
+    HTTP_KEEPALIVE_EXPIRY, HTTP_PER_HOST_LIMIT, HTTP2_ENABLED
+)
+
+logger = logging.getLogger(__name__)
+
+_client = None
+_image_client = None
+_host_limits = {}
+_host_active = {}
+
+
+def _http2_available() -> bool:
+    # HTTP/2 necesita el paquete opcional h2 (httpx[http2])
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def create_client(**kwargs) -> httpx.AsyncClient:
+    """
+    Crea un AsyncClient con la configuración de pool común (keep-alive, límites y HTTP/2).
+    """
+    options = {
+        "http2": HTTP2_ENABLED and _http2_available(),
+        "timeout": httpx.Timeout(HTTP_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+        "limits": httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+        ),
+    }
+    options.update(kwargs)
+    return httpx.AsyncClient(**options)
+
+
+async def start_http_client():
+    """Abre el cliente compartido; se llama desde el lifespan de FastAPI."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = create_client()
+        logger.info(f"[HTTP] Cliente compartido abierto (http2={HTTP2_ENABLED and _http2_available()})")
+
+
+async def close_http_client():
+    global _client, _image_client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+    if _image_client is not None:
+        await _image_client.aclose()
+        _image_client = None
+    _host_limits.clear()
+    _host_active.clear()
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """
+    Devuelve el cliente compartido. Si no se abrió en el lifespan (scripts, pruebas),
+    se crea bajo demanda.
+    """
+    global _client
+    if _client is None or _client.is_closed:
+        _client = create_client()
+    return _client
+
+
+def get_image_client() -> httpx.AsyncClient:
+    """
+    Cliente aparte para las imágenes del CDN de mangas: sin verificación TLS (como el proxy
+    anterior con requests, el CDN sirve certificados que no validan) y con su propio pool
+    para que las descargas largas no ocupen las conexiones del scraping.
+    """
+    global _image_client
+    if _image_client is None or _image_client.is_closed:
+        _image_client = create_client(verify=False)
+    return _image_client
+
+
+def host_limit(url: str) -> asyncio.Semaphore:
+    """Semáforo que limita las peticiones simultáneas a un mismo host."""
+    host = urlsplit(url).netloc
+    sem = _host_limits.get(host)
+    if sem is None:
+        sem = _host_limits[host] = asyncio.Semaphore(HTTP_PER_HOST_LIMIT)
+    return sem
+
+
+async def http_get(url: str, headers: dict = None, **kwargs) -> httpx.Response:
+    """
+    GET a través del cliente compartido respetando el límite por host.
+    Los kwargs se pasan tal cual a httpx (timeout, follow_redirects, params...).
+    """
+    host = urlsplit(url).netloc
+    async with host_limit(url):
+        _host_active[host] = _host_active.get(host, 0) + 1
+        try:
+            return await get_http_client().get(url, headers=headers, **kwargs)
+        finally:
+            _host_active[host] -= 1
+
+
+def get_http_stats() -> dict:
+    return {
+        "open": _client is not None and not _client.is_closed,
+        "image_client_open": _image_client is not None and not _image_client.is_closed,
+        "http2": HTTP2_ENABLED and _http2_available(),
+        "max_connections": HTTP_MAX_CONNECTIONS,
+        "max_keepalive": HTTP_MAX_KEEPALIVE,
+        "per_host_limit": HTTP_PER_HOST_LIMIT,
+        "active_by_host": dict(_host_active),
+    }
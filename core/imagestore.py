@@ -0,0 +1,302 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from core.config import (
+    IMAGE_CACHE_ENABLED, IMAGE_CACHE_DIR, IMAGE_CACHE_MAX_BYTES, IMAGE_CACHE_MAX_FILE_BYTES, IMAGE_CACHE_WRITE_BUFFER
+)
+
+logger = logging.getLogger(__name__)
+
+# Metadatos de la respuesta original que se guardan junto a cada imagen para servirla igual
+META_HEADERS = ("content-type", "content-encoding", "etag", "last-modified", "cache-control")
+
+
+def image_key(url: str) -> str:
+    """Clave de contenido: sha256 de la URL absoluta de la imagen (dir_path + filename en mangas)."""
+    return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+
+class DiskImageStore:
+    """
+    Caché de imágenes en disco direccionada por contenido, con límite de tamaño y expulsión LRU.
+    Estructura fragmentada: <root>/ab/cd/<sha256> (+ <sha256>.meta con las cabeceras), para que
+    ningún directorio acumule miles de ficheros. Las escrituras van a un temporal dentro de <root>
+    y se publican con os.replace, así un lector nunca ve una imagen a medias.
+    El índice LRU vive en memoria y se reconstruye al arrancar a partir del mtime de los ficheros
+    (cada acierto hace un utime, así el orden sobrevive a los reinicios).
+    """
+
+    def __init__(self, root: str = IMAGE_CACHE_DIR, max_bytes: int = IMAGE_CACHE_MAX_BYTES,
+                 max_file_bytes: int = IMAGE_CACHE_MAX_FILE_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.max_file_bytes = max_file_bytes
+        self._index = OrderedDict()  # key -> bytes (imagen + meta), del menos al más reciente
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._loaded = False
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+
+    # ---------- rutas ----------
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], key[2:4], key)
+
+    def _tmp_dir(self) -> str:
+        return os.path.join(self.root, "tmp")
+
+    # ---------- índice ----------
+    def load(self):
+        """Recorre el directorio y reconstruye el índice LRU (llamar fuera del bucle de eventos)."""
+        with self._lock:
+            if self._loaded:
+                return
+            entries = []
+            os.makedirs(self._tmp_dir(), exist_ok=True)
+            for dirpath, _dirs, files in os.walk(self.root):
+                if dirpath == self._tmp_dir():
+                    # Temporales de escrituras interrumpidas por un reinicio
+                    for name in files:
+                        try:
+                            os.remove(os.path.join(dirpath, name))
+                        except OSError:
+                            pass
+                    continue
+                for name in files:
+                    if name.endswith(".meta"):
+                        continue
+                    path = os.path.join(dirpath, name)
+                    try:
+                        st = os.stat(path)
+                        size = st.st_size + os.path.getsize(path + ".meta")
+                    except OSError:
+                        continue
+                    entries.append((st.st_mtime, name, size))
+            entries.sort()
+            for _mtime, key, size in entries:
+                self._index[key] = size
+                self._bytes += size
+            self._loaded = True
+        self._evict()
+        logger.info("Caché de imágenes: %d ficheros, %d bytes en %s", len(self._index), self._bytes, self.root)
+
+    def lookup(self, url: str):
+        """Devuelve (ruta, cabeceras) si la imagen está en disco, o None."""
+        if not self._loaded:
+            self.load()
+        key = image_key(url)
+        with self._lock:
+            present = key in self._index
+            if present:
+                self._index.move_to_end(key)
+        if not present:
+            self.misses += 1
+            return None
+        path = self._path(key)
+        try:
+            with open(path + ".meta", "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            os.utime(path)
+        except (OSError, ValueError):
+            # Borrado por fuera o meta corrupta: se trata como fallo y se olvida
+            self._forget(key)
+            self.misses += 1
+            return None
+        self.hits += 1
+        return path, meta
+
+    def contains(self, url: str) -> bool:
+        if not self._loaded:
+            self.load()
+        with self._lock:
+            return image_key(url) in self._index
+
+    def writer(self, url: str, headers) -> "ImageWriter":
+        if not self._loaded:
+            self.load()
+        meta = {k: headers[k] for k in META_HEADERS if k in headers}
+        return ImageWriter(self, image_key(url), meta)
+
+    def _commit(self, key: str, tmp_path: str, meta: dict, size: int):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        meta_raw = json.dumps(meta).encode("utf-8")
+        fd, meta_tmp = tempfile.mkstemp(dir=self._tmp_dir())
+        with os.fdopen(fd, "wb") as f:
+            f.write(meta_raw)
+        # Primero la meta y después la imagen: la imagen es la que marca la entrada como presente
+        os.replace(meta_tmp, path + ".meta")
+        os.replace(tmp_path, path)
+        total = size + len(meta_raw)
+        with self._lock:
+            self._bytes += total - self._index.pop(key, 0)
+            self._index[key] = total
+        self.writes += 1
+        self._evict()
+
+    def _forget(self, key: str):
+        with self._lock:
+            self._bytes -= self._index.pop(key, 0)
+
+    def _evict(self):
+        while True:
+            with self._lock:
+                if self._bytes <= self.max_bytes or not self._index:
+                    return
+                key, size = self._index.popitem(last=False)
+                self._bytes -= size
+            path = self._path(key)
+            for p in (path, path + ".meta"):
+                try:
+                    os.remove(p)
+                except OSError:
+                    pass
+            self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            keys = list(self._index)
+        for key in keys:
+            self._forget(key)
+            path = self._path(key)
+            for p in (path, path + ".meta"):
+                try:
+                    os.remove(p)
+                except OSError:
+                    pass
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        with self._lock:
+            files, size = len(self._index), self._bytes
+        return {
+            "enabled": IMAGE_CACHE_ENABLED,
+            "root": self.root,
+            "files": files,
+            "bytes": size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "writes": self.writes,
+            "evictions": self.evictions,
+        }
+
+
+class ImageWriter:
+    """
+    Escritura de una imagen mientras se reenvía al cliente (tee): los trozos se acumulan en
+    memoria y van a un temporal en bloques de `buffer_size` desde un hilo (el disco nunca se
+    toca en el bucle de eventos); solo se publica en la caché con commit() si la descarga
+    terminó completa. Si el cliente se desconecta o el origen corta, abort() descarta el temporal.
+    La mayoría de páginas caben en un bloque: una sola escritura, en el propio commit.
+    """
+
+    def __init__(self, store: DiskImageStore, key: str, meta: dict, buffer_size: int = IMAGE_CACHE_WRITE_BUFFER):
+        self.store = store
+        self.key = key
+        self.meta = meta
+        self.buffer_size = buffer_size
+        self.size = 0
+        self._buffer = bytearray()
+        self._file = None
+        self._tmp_path = None
+        self._touched_disk = False  # algún bloque se ha mandado ya a un hilo
+        self._lock = threading.Lock()  # el fichero se usa desde hilos del executor
+        self.failed = False
+        self.committed = False
+
+    async def write(self, chunk: bytes):
+        if self.failed:
+            return
+        self.size += len(chunk)
+        if self.size > self.store.max_file_bytes:
+            self.abort()  # demasiado grande para cachear; se sigue sirviendo igualmente
+            return
+        self._buffer += chunk
+        if len(self._buffer) >= self.buffer_size:
+            data, self._buffer = bytes(self._buffer), bytearray()
+            self._touched_disk = True
+            await asyncio.to_thread(self._write, data)
+
+    async def commit(self, expected_size: int = None):
+        if self.failed or not self.size or (expected_size is not None and expected_size != self.size):
+            self.abort()  # fallida, vacía o respuesta truncada
+            return
+        data, self._buffer = bytes(self._buffer), bytearray()
+        self._touched_disk = True
+        await asyncio.to_thread(self._publish, data)
+
+    def abort(self):
+        """Descarta la escritura; la limpieza del temporal va a un hilo para no bloquear."""
+        if self.committed:
+            return
+        self.failed = True
+        self._buffer = bytearray()
+        if not self._touched_disk:
+            return
+        try:
+            asyncio.get_running_loop().run_in_executor(None, self._discard)
+        except RuntimeError:  # fuera del bucle de eventos
+            self._discard()
+
+    # ---------- en hilos ----------
+    def _write(self, data: bytes):
+        with self._lock:
+            if self.failed:
+                return
+            try:
+                if self._file is None:
+                    fd, self._tmp_path = tempfile.mkstemp(dir=self.store._tmp_dir())
+                    self._file = os.fdopen(fd, "wb")
+                self._file.write(data)
+            except OSError as e:
+                logger.warning("No se pudo escribir en la caché de imágenes: %s", e)
+                self.failed = True
+                self._discard_locked()
+
+    def _publish(self, data: bytes):
+        self._write(data)
+        with self._lock:
+            if self.failed or self._file is None:
+                self._discard_locked()
+                return
+            try:
+                self._file.close()
+                self._file = None
+                self.store._commit(self.key, self._tmp_path, self.meta, self.size)
+                self._tmp_path = None
+                self.committed = True
+            except OSError as e:
+                logger.warning("No se pudo guardar en la caché de imágenes: %s", e)
+                self.failed = True
+                self._discard_locked()
+
+    def _discard(self):
+        with self._lock:
+            self._discard_locked()
+
+    def _discard_locked(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self._tmp_path is not None:
+            try:
+                os.remove(self._tmp_path)
+            except OSError:
+                pass
+            self._tmp_path = None
+
+
+image_store = DiskImageStore()
+
+
+def get_image_cache_stats() -> dict:
+    return image_store.stats()
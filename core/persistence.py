@@ -0,0 +1,148 @@
+import asyncio
+import inspect
+import logging
+import time
+from collections import OrderedDict
+from core.config import PERSIST_QUEUE_SIZE, PERSIST_WORKERS, PERSIST_OVERFLOW, PERSIST_SHUTDOWN_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+
+class PersistenceQueue:
+    """
+    Cola acotada de guardados en BD que se vacía en segundo plano.
+
+    - Cada trabajo tiene una clave (p. ej. "details:one-piece"); si llega otro con la misma
+      clave antes de procesarse, se sustituye el payload (gana el scrapeo más reciente).
+    - Si la cola está llena se aplica la política de desbordamiento: descartar el trabajo
+      más antiguo (drop_oldest) o el nuevo (drop_new).
+    - Las funciones de guardado síncronas (SQLAlchemy) se ejecutan en hilos; las corrutinas
+      (p. ej. con aniki.AsyncSessionLocal) se esperan directamente en el bucle. En ambos casos
+      hay a lo sumo `workers` guardados a la vez y nunca dos de la misma clave en paralelo.
+    """
+
+    def __init__(self, maxsize: int = PERSIST_QUEUE_SIZE, workers: int = PERSIST_WORKERS, overflow: str = PERSIST_OVERFLOW):
+        self.maxsize = maxsize
+        self.workers = workers
+        self.overflow = overflow
+        self._pending = OrderedDict()  # key -> (fn, payload, enqueued_at)
+        self._running = set()
+        self._wakeup = None
+        self._tasks = []
+        self.enqueued = 0
+        self.merged = 0
+        self.dropped = 0
+        self.processed = 0
+        self.failed = 0
+        self.last_error = None
+
+    # --------------------------- ciclo de vida ---------------------------
+    def start(self):
+        if self._tasks:
+            return
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.ensure_future(self._worker(i)) for i in range(self.workers)]
+        logger.info(f"[PERSIST] {self.workers} workers arrancados (cola máx. {self.maxsize})")
+
+    async def stop(self, timeout: float = PERSIST_SHUTDOWN_TIMEOUT):
+        """Espera (hasta `timeout`) a que se vacíe la cola y detiene los workers."""
+        if not self._tasks:
+            return
+        deadline = time.monotonic() + timeout
+        while (self._pending or self._running) and time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+        if self._pending:
+            logger.warning(f"[PERSIST] Se descartan {len(self._pending)} guardados pendientes al apagar")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    # --------------------------- encolado ---------------------------
+    def submit(self, key: str, fn, payload) -> bool:
+        """
+        Encola `fn(payload)` sin bloquear. Devuelve False si el trabajo se descartó por desbordamiento.
+        """
+        self.start()
+        if key in self._pending:
+            self._pending[key] = (fn, payload, self._pending[key][2])
+            self.merged += 1
+            self._wakeup.set()
+            return True
+        if len(self._pending) >= self.maxsize:
+            self.dropped += 1
+            if self.overflow == "drop_new":
+                logger.warning(f"[PERSIST] Cola llena, se descarta el guardado '{key}'")
+                return False
+            oldest, _ = self._pending.popitem(last=False)
+            logger.warning(f"[PERSIST] Cola llena, se descarta el guardado más antiguo '{oldest}'")
+        self._pending[key] = (fn, payload, time.monotonic())
+        self.enqueued += 1
+        self._wakeup.set()
+        return True
+
+    def _next_job(self):
+        for key in self._pending:
+            if key not in self._running:
+                fn, payload, enqueued_at = self._pending.pop(key)
+                return key, fn, payload, enqueued_at
+        return None
+
+    async def _worker(self, n: int):
+        while True:
+            job = self._next_job()
+            if job is None:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            key, fn, payload, enqueued_at = job
+            self._running.add(key)
+            try:
+                if inspect.iscoroutinefunction(fn):
+                    await fn(payload)
+                else:
+                    await asyncio.to_thread(fn, payload)
+                self.processed += 1
+            except Exception as e:
+                self.failed += 1
+                self.last_error = f"{key}: {e}"
+                logger.error(f"[PERSIST] Error al guardar '{key}': {e}")
+            finally:
+                self._running.discard(key)
+                # Puede haber un trabajo de la misma clave esperando a que terminara este
+                if self._pending:
+                    self._wakeup.set()
+
+    def stats(self) -> dict:
+        oldest = next(iter(self._pending.values()), None)
+        return {
+            "depth": len(self._pending),
+            "running": len(self._running),
+            "maxsize": self.maxsize,
+            "workers": self.workers,
+            "overflow": self.overflow,
+            "oldest_wait_seconds": round(time.monotonic() - oldest[2], 3) if oldest else 0.0,
+            "enqueued": self.enqueued,
+            "merged": self.merged,
+            "dropped": self.dropped,
+            "processed": self.processed,
+            "failed": self.failed,
+            "last_error": self.last_error,
+        }
+
+
+persistence = PersistenceQueue()
+
+
+def enqueue_save(key: str, fn, payload) -> bool:
+    """Encola un guardado en BD; los endpoints responden sin esperar a la base de datos."""
+    return persistence.submit(key, fn, payload)
+
+async def start_persistence():
+    persistence.start()
+
+async def stop_persistence():
+    await persistence.stop()
+
+def get_persistence_stats() -> dict:
+    return persistence.stats()
@@ -0,0 +1,180 @@
+import asyncio
+import logging
+import threading
+import time
+from collections import OrderedDict
+from uuid import uuid4
+from core.config import VIEWER_TTL, VIEWER_MAX_ENTRIES, VIEWER_BACKEND, CACHE_REDIS_PREFIX
+
+logger = logging.getLogger(__name__)
+
+PREFIX_LEN = 8  # las URLs del visor usan los 8 primeros caracteres del id
+
+
+class ViewerRegistry:
+    """
+    Registro de visores de manga creados por POST /scrape-manga, en sustitución del dict global
+    que crecía sin límite. Cada visor caduca `ttl` segundos después de su último uso (TTL
+    deslizante, así el orden LRU coincide con el de expiración) y, por encima de `max_entries`,
+    se expulsa el menos usado. Los ids se eligen con prefijo de 8 caracteres único, de modo que
+    el visor se resuelve por prefijo con un dict en O(1) en vez de recorrer todos los ids.
+    Con `backend` (un CacheBackend compartido, p. ej. Redis) los visores creados en un worker
+    se resuelven en cualquier otro; esas consultas van por los métodos `a*` del backend para no
+    bloquear el bucle de eventos, y un acierto local no llega a tocarlo. `on_evict(viewer_id)`
+    se llama al expirar o expulsar un visor local (lo usa la precarga de capítulos para cancelar
+    su trabajo).
+    """
+
+    def __init__(self, ttl: float = VIEWER_TTL, max_entries: int = VIEWER_MAX_ENTRIES, backend=None, on_evict=None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.backend = backend
+        self.on_evict = on_evict
+        self._entries = OrderedDict()  # viewer_id -> (expires, info), del menos al más reciente
+        self._by_prefix = {}  # prefijo -> viewer_id
+        self._lock = threading.Lock()
+        self.created = 0
+        self.expired = 0
+        self.evicted = 0
+        self.shared_hits = 0
+
+    async def new_id(self) -> str:
+        """uuid4 cuyo prefijo de 8 caracteres no colisiona con ningún visor vivo."""
+        while True:
+            viewer_id = str(uuid4())
+            if await self.resolve_prefix(viewer_id[:PREFIX_LEN]) is None:
+                return viewer_id
+
+    async def register(self, viewer_id: str, info: dict):
+        self._put(viewer_id, info)
+        self.created += 1
+        if self.backend is not None:
+            await asyncio.gather(
+                self.backend.aset(f"id:{viewer_id}", info, ttl=self.ttl),
+                self.backend.aset(f"prefix:{viewer_id[:PREFIX_LEN]}", viewer_id, ttl=self.ttl),
+            )
+
+    async def get(self, viewer_id: str):
+        """Datos del visor o None si no existe o ha caducado."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(viewer_id)
+            if entry is not None and entry[0] > now:
+                self._entries[viewer_id] = (now + self.ttl, entry[1])
+                self._entries.move_to_end(viewer_id)
+                return entry[1]
+        if entry is not None:
+            self._drop(viewer_id, expired=True)
+        if self.backend is None:
+            return None
+        info = await self.backend.aget(f"id:{viewer_id}")
+        if info is not None:
+            self.shared_hits += 1
+            self._put(viewer_id, info)
+        return info
+
+    async def resolve_prefix(self, prefix: str):
+        """viewer_id completo a partir de su prefijo de 8 caracteres, o None."""
+        with self._lock:
+            viewer_id = self._by_prefix.get(prefix)
+        if viewer_id is not None and await self.get(viewer_id) is not None:
+            return viewer_id
+        if self.backend is None:
+            return None
+        viewer_id = await self.backend.aget(f"prefix:{prefix}")
+        return viewer_id if viewer_id is not None and await self.get(viewer_id) is not None else None
+
+    async def remove(self, viewer_id: str):
+        self._drop(viewer_id)
+        if self.backend is not None:
+            await asyncio.gather(
+                self.backend.adelete(f"id:{viewer_id}"),
+                self.backend.adelete(f"prefix:{viewer_id[:PREFIX_LEN]}"),
+            )
+
+    def sweep(self) -> int:
+        """Purga los visores caducados (están al principio del orden LRU)."""
+        now = time.monotonic()
+        expired = []
+        with self._lock:
+            for viewer_id, (expires, _) in self._entries.items():
+                if expires > now:
+                    break
+                expired.append(viewer_id)
+        for viewer_id in expired:
+            self._drop(viewer_id, expired=True)
+        return len(expired)
+
+    def _put(self, viewer_id: str, info: dict):
+        self.sweep()
+        overflow = []
+        with self._lock:
+            self._entries[viewer_id] = (time.monotonic() + self.ttl, info)
+            self._entries.move_to_end(viewer_id)
+            self._by_prefix[viewer_id[:PREFIX_LEN]] = viewer_id
+            while len(self._entries) > self.max_entries:
+                overflow.append(next(iter(self._entries)))
+                self._remove_locked(overflow[-1])
+        for old_id in overflow:
+            self.evicted += 1
+            self._notify(old_id)
+
+    def _drop(self, viewer_id: str, expired: bool = False):
+        with self._lock:
+            if viewer_id not in self._entries:
+                return
+            self._remove_locked(viewer_id)
+        if expired:
+            self.expired += 1
+        self._notify(viewer_id)
+
+    def _remove_locked(self, viewer_id: str):
+        del self._entries[viewer_id]
+        prefix = viewer_id[:PREFIX_LEN]
+        if self._by_prefix.get(prefix) == viewer_id:
+            del self._by_prefix[prefix]
+
+    def _notify(self, viewer_id: str):
+        if self.on_evict is not None:
+            try:
+                self.on_evict(viewer_id)
+            except Exception as e:
+                logger.warning("Error al liberar el visor %s: %s", viewer_id, e)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        with self._lock:
+            size = len(self._entries)
+        return {
+            "backend": "shared" if self.backend is not None else "memory",
+            "viewers": size,
+            "max_entries": self.max_entries,
+            "ttl": self.ttl,
+            "created": self.created,
+            "expired": self.expired,
+            "evicted": self.evicted,
+            "shared_hits": self.shared_hits,
+        }
+
+
+def create_registry(kind: str = VIEWER_BACKEND) -> ViewerRegistry:
+    """Registro local; con VIEWER_BACKEND=redis, además compartido en Redis entre workers."""
+    backend = None
+    if kind == "redis":
+        try:
+            from core.cache import RedisBackend
+            backend = RedisBackend(prefix=f"{CACHE_REDIS_PREFIX}viewer:", default_ttl=VIEWER_TTL)
+        except ImportError:
+            logger.warning("VIEWER_BACKEND=redis pero el paquete 'redis' no está instalado; visores solo en memoria")
+    elif kind != "memory":
+        logger.warning("VIEWER_BACKEND desconocido '%s'; visores solo en memoria", kind)
+    return ViewerRegistry(backend=backend)
+
+
+viewer_registry = create_registry()
+
+
+def get_viewer_stats() -> dict:
+    return viewer_registry.stats()
@@ -1,8 +1,39 @@
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
-from routers import animehome, animecatalog, animedetails, animeepisode, animeschedule, mangas, mangadetails, mangaimages, mangasearch
-app = FastAPI(title="Anime & Manga API")
+from core.http import start_http_client, close_http_client
+from core.persistence import start_persistence, stop_persistence
+from core.browser import browser_pool
+from core.imagestore import image_store
+from aniki import create_missing_tables
+from utils.prefetch import image_prefetcher
+from core.config import SCHEDULE_ENGINE, IMAGE_CACHE_ENABLED
+from routers import animebatch, animehome, animecatalog, animedetails, animeepisode, animeschedule, mangas, mangadetails, mangaimages, mangasearch, stats
 
-# Registrar routers
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Un único cliente HTTP por proceso: las conexiones a animeav1/zonatmo se reutilizan
+    await start_http_client()
+    await start_persistence()
+    # Tablas añadidas tras la instalación (chapter_manifests); sin BD la app arranca igual
+    await asyncio.to_thread(create_missing_tables)
+    # El índice de la caché de imágenes se reconstruye recorriendo el disco, fuera del bucle
+    if IMAGE_CACHE_ENABLED:
+        await asyncio.to_thread(image_store.load)
+    # Con el motor Selenium del horario, los navegadores se arrancan aquí y no en la primera petición
+    if SCHEDULE_ENGINE == "selenium":
+        await asyncio.to_thread(browser_pool.warm)
+    yield
+    # Cancelar las precargas de capítulos en curso y vaciar los guardados pendientes antes de cerrar
+    await image_prefetcher.close()
+    await stop_persistence()
+    await close_http_client()
+    await asyncio.to_thread(browser_pool.close)
+
+app = FastAPI(title="Anime & Manga API", lifespan=lifespan)
+
+# Registrar routers (batch antes que detalles, para que /batch no se tome como un slug)
+app.include_router(animebatch.router, prefix="/api/animes", tags=["Animes Batch"])
 app.include_router(animehome.router, prefix="/api/animes", tags=["Animes Home"])
 app.include_router(animecatalog.router, prefix="/api/animes", tags=["Animes Catalog"])
 app.include_router(animedetails.router, prefix="/api/animes", tags=["Animes Details"])
@@ -12,6 +43,7 @@ app.include_router(mangas.router, prefix="/api/mangas", tags=["Mangas"])
 app.include_router(mangadetails.router, prefix="/api/mangas", tags=["Manga Details"])
 app.include_router(mangaimages.router, prefix="/api/mangas", tags=["Manga Images"])
 app.include_router(mangasearch.router, prefix="/api/mangas", tags=["Manga Search"])
+app.include_router(stats.router, prefix="/api/stats", tags=["Stats"])
 
 if __name__ == "__main__":
     import uvicorn
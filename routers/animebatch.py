@@ -0,0 +1,83 @@
+import asyncio
+from typing import List
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from core.cache import cached_fetch
+from core.config import ANIME_BATCH_MAX, ANIME_BATCH_CONCURRENCY
+from routers.animedetails import scrape_anime_details
+from utils.ndjson import dumps_line, MEDIA_TYPE as NDJSON
+
+router = APIRouter()
+
+class BatchRequest(BaseModel):
+    slugs: List[str]
+    force_refresh: bool = False
+
+def unique_slugs(slugs: List[str]) -> List[str]:
+    seen = set()
+    out = []
+    for slug in slugs:
+        slug = slug.strip()
+        if slug and slug not in seen:
+            seen.add(slug)
+            out.append(slug)
+    return out
+
+async def fetch_item(slug: str, semaphore: asyncio.Semaphore, force_refresh: bool) -> dict:
+    """
+    Detalles de un slug como elemento del lote: {"slug", "ok", "data"} o {"slug", "ok", "error"}.
+    Misma caché y single-flight que GET /{slug}; el cupo del lote solo se toma si cached_fetch
+    llega a scrapear, así que los aciertos de caché salen sin esperar turno (y los scrapeos,
+    por debajo, respetan además el límite por host del cliente HTTP).
+    """
+    async def scrape():
+        async with semaphore:
+            return await scrape_anime_details(slug)
+
+    try:
+        data = await cached_fetch(slug, scrape, force_refresh=force_refresh)
+    except HTTPException as e:
+        return {"slug": slug, "ok": False, "error": e.detail}
+    except Exception as e:
+        return {"slug": slug, "ok": False, "error": str(e) or type(e).__name__}
+    if isinstance(data, dict) and "error" in data:
+        return {"slug": slug, "ok": False, "error": data["error"]}
+    return {"slug": slug, "ok": True, "data": data}
+
+# -------------------- /batch --------------------
+@router.post("/batch", summary="Detalles de varios animes en una sola llamada")
+async def get_anime_details_batch(
+    request: BatchRequest,
+    stream: bool = Query(False, description="Devolver NDJSON, un elemento por línea según van terminando"),
+):
+    """
+    Equivale a N llamadas a GET /api/animes/{slug}: resultados parciales con error por elemento.
+    Sin `stream` devuelve la lista en el orden pedido (sin duplicados); con `stream=true` cada
+    elemento sale en cuanto está listo (primero los aciertos de caché).
+    """
+    slugs = unique_slugs(request.slugs)
+    if not slugs:
+        raise HTTPException(status_code=400, detail="La lista de slugs está vacía")
+    if len(slugs) > ANIME_BATCH_MAX:
+        raise HTTPException(status_code=400, detail=f"Máximo {ANIME_BATCH_MAX} slugs por lote")
+
+    semaphore = asyncio.Semaphore(ANIME_BATCH_CONCURRENCY)
+    tasks = [asyncio.ensure_future(fetch_item(slug, semaphore, request.force_refresh)) for slug in slugs]
+
+    if stream:
+        async def lines():
+            try:
+                for next_done in asyncio.as_completed(tasks):
+                    yield dumps_line(await next_done)
+            finally:
+                # Cliente desconectado: cancelar las tareas solo deja de esperarlas. Los scrapeos
+                # ya lanzados (también los que esperan turno en el semáforo) corren bajo el shield
+                # de single_flight, terminan igualmente y dejan su resultado en la caché.
+                for task in tasks:
+                    task.cancel()
+        return StreamingResponse(lines(), media_type=NDJSON)
+
+    items = await asyncio.gather(*tasks)
+    ok = sum(1 for item in items if item["ok"])
+    return {"count": len(items), "ok": ok, "failed": len(items) - ok, "items": items}
@@ -1,37 +1,32 @@
 from fastapi import APIRouter, Query, HTTPException
-from bs4 import BeautifulSoup
-import re, requests
-from core.cache import get_cached, set_cache
-from core.config import BASE_URL, VALID_CATEGORIES, VALID_GENRES, VALID_STATUS, VALID_ORDERS, VALID_LETTERS
+from fastapi.responses import StreamingResponse
+import asyncio
+import re, httpx
+from core.http import http_get
+from core.persistence import enqueue_save
+from utils.scraping import extract_sveltekit_script, get_sveltekit_script
+from utils.catalog import parse_catalog
+from utils.ndjson import dumps_line, MEDIA_TYPE as NDJSON
+from core.config import CATALOG_CONCURRENCY, CATALOG_MAX_PAGES
+from core.config import BASE_URL, HEADERS, VALID_CATEGORIES, VALID_GENRES, VALID_STATUS, VALID_ORDERS, VALID_LETTERS
 from save_anime_functions import save_anime_catalog
 
 router = APIRouter()
 
-# -------------------- /animes --------------------
-@router.get("")
-def get_animes(
-    search: str = None,                # <-- Añadido
-    category: list[str] = Query(None),
-    genre: list[str] = Query(None),
-    min_year: int = None,
-    max_year: int = None,
-    status: str = None,
-    order: str = "predeterminado",
-    letter: str = None,
-    page: int = 1
-):
-    if category and not all(c in VALID_CATEGORIES for c in category):
-        raise HTTPException(status_code=400, detail=f"Category inválida. Opciones: {VALID_CATEGORIES}")
-    if genre and not all(g in VALID_GENRES for g in genre):
-        raise HTTPException(status_code=400, detail=f"Genre inválido. Opciones: {VALID_GENRES}")
-    if status and status not in VALID_STATUS:
-        raise HTTPException(status_code=400, detail=f"Status inválido. Opciones: {VALID_STATUS}")
-    if order and order not in VALID_ORDERS:
-        raise HTTPException(status_code=400, detail=f"Order inválido. Opciones: {VALID_ORDERS}")
-    if letter and letter.upper() not in VALID_LETTERS:
-        raise HTTPException(status_code=400, detail=f"Letter inválida. Opciones: {VALID_LETTERS}")
-    if min_year and max_year and min_year > max_year:
-        raise HTTPException(status_code=400, detail="min_year no puede ser mayor que max_year")
+def parse_page_range(pages: str):
+    """'1-20' -> (1, 20); '3' -> (3, 3). Valida el formato y el tamaño máximo del rango."""
+    m = re.fullmatch(r"\s*(\d+)\s*(?:-\s*(\d+)\s*)?", pages or "")
+    if not m:
+        raise HTTPException(status_code=400, detail="pages debe tener el formato 'N' o 'N-M' (p. ej. 1-20)")
+    first = int(m.group(1))
+    last = int(m.group(2) or first)
+    if first < 1 or last < first:
+        raise HTTPException(status_code=400, detail="Rango de páginas inválido")
+    if last - first + 1 > CATALOG_MAX_PAGES:
+        raise HTTPException(status_code=400, detail=f"Máximo {CATALOG_MAX_PAGES} páginas por petición")
+    return first, last
+
+def build_catalog_url(search, category, genre, min_year, max_year, status, order, letter, page) -> str:
     base_url = f"{BASE_URL}/catalogo"
     params = []
     if search:                        # <-- Añadido
@@ -53,80 +48,23 @@ def get_animes(
     if letter:
         params.append(f"letter={letter.upper()}")
     params.append(f"page={page}")
-    url = base_url + "?" + "&".join(params) if params else base_url
-    response = requests.get(url)
+    return base_url + "?" + "&".join(params) if params else base_url
+
+async def fetch_catalog_page(url: str, page: int, category: list[str] = None):
+    try:
+        response = await http_get(url, headers=HEADERS, follow_redirects=True)
+    except httpx.HTTPError as e:
+        raise HTTPException(status_code=502, detail=f"Error al obtener el catálogo: {str(e)}")
     if response.status_code != 200:
         return {"error": "Failed to fetch the page", "url": url}
-    soup = BeautifulSoup(response.text, "html.parser")
-    scripts = soup.find_all("script")
-    data_script = None
-    for script in scripts:
-        if script.string and "__sveltekit_" in script.string:
-            data_script = script.string
-            break
+    html = response.text
+    data_script = extract_sveltekit_script(html, "__sveltekit_") or get_sveltekit_script(html)
     if not data_script:
         return {"error": "Data script not found", "url": url}
-    results_match = re.search(r"results:\s*\[([\s\S]*?)\]\s*}", data_script)
-    if not results_match:
+    try:
+        animes, total_results, total_pages = parse_catalog(html, data_script, category)
+    except ValueError:
         return {"error": "Results not found in script", "url": url}
-    results_str = results_match.group(1)
-    anime_strs = re.split(r"\}\s*,\s*\{", results_str)
-    animes = []
-    for i, anime_str in enumerate(anime_strs):
-        if i > 0:
-            anime_str = "{" + anime_str
-        if i < len(anime_strs) - 1:
-            anime_str += "}"
-        id_match = re.search(r'id:"([^"]+)"', anime_str)
-        title_match = re.search(r'title:"([^"]+)"', anime_str)
-        synopsis_match = re.search(r'synopsis:"(.*?)"(?=\s*,\s*categoryId:)', anime_str, re.DOTALL)
-        category_id_match = re.search(r'categoryId:(\d+)', anime_str)
-        slug_match = re.search(r'slug:"([^"]+)"', anime_str)
-        anime_dict = {}
-        if id_match:
-            anime_id = id_match.group(1)
-            anime_dict["id"] = anime_id
-            anime_dict["cover"] = f"https://cdn.animeav1.com/covers/{anime_id}.jpg"
-        if title_match:
-            anime_dict["title"] = title_match.group(1)
-        if synopsis_match:
-            anime_dict["synopsis"] = synopsis_match.group(1).replace("\n", "\n")
-        if category_id_match:
-            anime_dict["categoryId"] = int(category_id_match.group(1))
-        if slug_match:
-            anime_dict["slug"] = slug_match.group(1)
-        # Fix category slug to use the correct slug from input or VALID_CATEGORIES
-        category_match = re.search(r'a\.name="([^"]+)"', data_script)
-        category_name = category_match.group(1) if category_match else "Unknown"
-        category_slug = "tv-anime"  # Default
-        if category and len(category) == 1:
-            category_slug = category[0]
-        elif anime_dict.get("categoryId"):
-            category_map = {
-                1: "tv-anime",
-                2: "pelicula",
-                3: "ova",
-                4: "especial"
-            }
-            category_slug = category_map.get(anime_dict["categoryId"], "tv-anime")
-        anime_dict["category"] = {
-            "id": anime_dict.get("categoryId"),
-            "name": category_name,
-            "slug": category_slug
-        }
-        if anime_dict:
-            animes.append(anime_dict)
-    total_results = len(animes)
-    results_elem = soup.find(string=re.compile(r"\d+ Resultados"))
-    if results_elem:
-        match = re.search(r"\d+", results_elem)
-        if match:
-            total_results = int(match.group())
-    total_pages = 1
-    pagination_links = soup.find_all("a", href=lambda href: href and "page=" in href if href else False)
-    pages = [int(plink.text) for plink in pagination_links if plink.text.isdigit()]
-    if pages:
-        total_pages = max(pages)
     result = {
         "url": url,
         "page": page,
@@ -134,5 +72,89 @@ def get_animes(
         "total_pages": total_pages,
         "animes": animes,
     }
-    save_anime_catalog(result)
+    enqueue_save(f"catalog:{url}", save_anime_catalog, result)
     return result
+
+async def crawl_catalog(urls: dict, category: list[str] = None):
+    """
+    Descarga las páginas del rango en paralelo (como mucho CATALOG_CONCURRENCY a la vez) y
+    emite una línea NDJSON por página en orden, en cuanto esa página y las anteriores están
+    listas. Los animes repetidos entre páginas (el catálogo se mueve mientras se recorre) se
+    emiten solo la primera vez. Las páginas más allá de total_pages se cancelan sin pedirlas.
+    """
+    semaphore = asyncio.Semaphore(CATALOG_CONCURRENCY)
+
+    async def fetch(page: int, url: str):
+        async with semaphore:
+            try:
+                return await fetch_catalog_page(url, page, category)
+            except HTTPException as e:
+                return {"url": url, "page": page, "error": e.detail}
+            except Exception as e:
+                # Cualquier otro fallo de la página también es una línea de error, no un corte del stream
+                return {"url": url, "page": page, "error": str(e) or type(e).__name__}
+
+    tasks = {page: asyncio.ensure_future(fetch(page, url)) for page, url in urls.items()}
+    seen = set()
+    last_page = max(tasks)
+    try:
+        for page, task in tasks.items():
+            if page > last_page:
+                break
+            result = await task
+            if "error" in result:
+                yield dumps_line({"page": page, "url": result.get("url"), "error": result["error"]})
+                continue
+            animes = []
+            for anime in result["animes"]:
+                key = anime.get("id")
+                if key is not None and key in seen:
+                    continue
+                seen.add(key)
+                animes.append(anime)
+            yield dumps_line({**result, "animes": animes})
+            # Con la primera página ya se sabe cuántas hay: no pedir las que no existen
+            if result["total_pages"] < last_page:
+                last_page = max(result["total_pages"], page)
+                for later, later_task in tasks.items():
+                    if later > last_page:
+                        later_task.cancel()
+    finally:
+        for task in tasks.values():
+            task.cancel()
+
+# -------------------- /animes --------------------
+@router.get("")
+async def get_animes(
+    search: str = None,                # <-- Añadido
+    category: list[str] = Query(None),
+    genre: list[str] = Query(None),
+    min_year: int = None,
+    max_year: int = None,
+    status: str = None,
+    order: str = "predeterminado",
+    letter: str = None,
+    page: int = 1,
+    pages: str = Query(None, description="Rango de páginas (p. ej. 1-20): se descargan en paralelo y se devuelven como NDJSON"),
+):
+    if category and not all(c in VALID_CATEGORIES for c in category):
+        raise HTTPException(status_code=400, detail=f"Category inválida. Opciones: {VALID_CATEGORIES}")
+    if genre and not all(g in VALID_GENRES for g in genre):
+        raise HTTPException(status_code=400, detail=f"Genre inválido. Opciones: {VALID_GENRES}")
+    if status and status not in VALID_STATUS:
+        raise HTTPException(status_code=400, detail=f"Status inválido. Opciones: {VALID_STATUS}")
+    if order and order not in VALID_ORDERS:
+        raise HTTPException(status_code=400, detail=f"Order inválido. Opciones: {VALID_ORDERS}")
+    if letter and letter.upper() not in VALID_LETTERS:
+        raise HTTPException(status_code=400, detail=f"Letter inválida. Opciones: {VALID_LETTERS}")
+    if min_year and max_year and min_year > max_year:
+        raise HTTPException(status_code=400, detail="min_year no puede ser mayor que max_year")
+    if pages:
+        first, last = parse_page_range(pages)
+        urls = {
+            n: build_catalog_url(search, category, genre, min_year, max_year, status, order, letter, n)
+            for n in range(first, last + 1)
+        }
+        return StreamingResponse(crawl_catalog(urls, category), media_type=NDJSON)
+    url = build_catalog_url(search, category, genre, min_year, max_year, status, order, letter, page)
+    return await fetch_catalog_page(url, page, category)
@@ -1,41 +1,79 @@
+import asyncio
 from fastapi import APIRouter, Query
-from bs4 import BeautifulSoup
-import re, demjson3
-from utils.scraping import fetch_html, find_sveltekit_script, extract_js_object
+from utils.scraping import fetch_html, get_sveltekit_script, extract_js_object
+from utils.sveltekit import decode_js
 from utils.builders import (
     build_poster_url, build_backdrop_url,
     build_episode_image_url, build_episode_url
 )
-from core.cache import get_cached, set_cache
-from core.config import BASE_URL
-from save_anime_functions import save_anime_details
+from core.cache import set_cache, cached_fetch
+from core.config import BASE_URL, DETAILS_SPECULATIVE_EPISODE
+from core.persistence import enqueue_save
+from save_anime_functions import save_anime_details, load_episode_ids
+from routers.animeepisode import episode_cache_key, scrape_episode
 
 router = APIRouter()
 
 # -------------------- /{slug} --------------------
 @router.get("/{slug}")
 async def get_anime_details(slug: str, force_refresh: bool = Query(False)):
-    if not force_refresh:
-        cached = get_cached(slug)
-        if cached:
-            return cached
+    return await cached_fetch(slug, lambda: scrape_anime_details(slug), force_refresh=force_refresh)
 
-    # Fetch and parse details as before
-    html = await fetch_html(f"{BASE_URL}/media/{slug}")
-    soup = BeautifulSoup(html, "html.parser")
-    script_tag = find_sveltekit_script(soup)
+async def load_known_episode_ids(slug: str) -> dict:
+    try:
+        return await asyncio.to_thread(load_episode_ids, slug)
+    except Exception as e:
+        print(f"No se pudieron leer los IDs de episodios de {slug} de la BD: {e}")
+        return {}
+
+async def first_episode_ids(slug: str, speculative: bool = False) -> dict:
+    """
+    {número: id} de los episodios, sacados del episodio 1. Pasa por la caché y el single-flight
+    de GET /{slug}/1: un acierto o un scrapeo ya en curso se reutilizan, y el resultado queda
+    cacheado para esa petición, que suele llegar después. Un fallo (anime sin episodios) da {}.
+    """
+    key = episode_cache_key(slug, 1)
+    fetch = lambda: scrape_episode(slug, 1)  # noqa: E731
+    try:
+        result = await cached_fetch(key, fetch, speculative=speculative)
+        if "episodes" not in result.get("anime", {}):
+            # Entrada cacheada con el formato anterior, sin la lista de episodios
+            result = await cached_fetch(key, fetch, force_refresh=True)
+    except Exception:
+        return {}
+    return {ep["number"]: ep["id"] for ep in result["anime"].get("episodes", [])}
+
+async def scrape_anime_details(slug: str):
+    # La página de detalles, la consulta de IDs en BD y el episodio 1 (de donde salen los IDs
+    # si la BD no los tiene) van a la vez; el episodio 1 se cancela en cuanto la BD los da.
+    details_task = asyncio.ensure_future(fetch_html(f"{BASE_URL}/media/{slug}"))
+    first_task = None
+    if DETAILS_SPECULATIVE_EPISODE:
+        first_task = asyncio.ensure_future(first_episode_ids(slug, speculative=True))
+
+    try:
+        known_ids = await load_known_episode_ids(slug)
+        if known_ids and first_task is not None:
+            first_task.cancel()
+            first_task = None
+        html = await details_task
+    except BaseException:
+        details_task.cancel()
+        if first_task is not None:
+            first_task.cancel()
+        raise
+    script_tag = get_sveltekit_script(html)
     if not script_tag:
         return {"error": "No se encontró el bloque de datos JSON"}
 
     try:
         media_js = extract_js_object(script_tag, "media:")
-        media_data = demjson3.decode(media_js)
+        media_data = decode_js(media_js)
     except Exception as e:
         return {"error": f"Fallo al extraer/parsear media: {str(e)}"}
 
     anime_id = media_data.get("id")
 
-    # Existing episode processing (placeholders without ID)
     episodes = []
     for ep in media_data.get("episodes", []):
         num = ep.get("number")
@@ -46,65 +84,16 @@ async def get_anime_details(slug: str, force_refresh: bool = Query(False)):
                 "image": build_episode_image_url(anime_id, num),
                 "url": build_episode_url(slug, num)
             })
-        media_data.update({
-            "poster": build_poster_url(anime_id),
-            "backdrop": build_backdrop_url(anime_id),
-            "episodes": episodes
-        })
-
-    # Check if episodes lack IDs (common case)
-    if episodes and all("id" not in ep for ep in media_data.get("episodes", [])):
-        # Asynchronously fetch one episode (e.g., #1) to get full IDs
-        async def fetch_episode_ids():
-            ep_html = await fetch_html(f"{BASE_URL}/media/{slug}/1")
-            ep_soup = BeautifulSoup(ep_html, "html.parser")
-            ep_script_text = find_sveltekit_script(ep_soup)
-            if not ep_script_text:
-                return None  # Fallback if fail
-            try:
-                # Parse like in get_episode
-                m = re.search(r"data\s*:\s*\[", ep_script_text)
-                if not m:
-                    return None
-                start = ep_script_text.find("[", m.start())
-                depth, end = 0, None
-                for i in range(start, len(ep_script_text)):
-                    ch = ep_script_text[i]
-                    if ch == "[":
-                        depth += 1
-                    elif ch == "]":
-                        depth -= 1
-                        if depth == 0:
-                            end = i
-                            break
-                if end is None:
-                    return None
-                data_js = ep_script_text[start:end + 1]
-                data_json = re.sub(r'([{\[,]\s*)([A-Za-z0-9_@$-]+)\s*:', r'\1"\2":', data_js)
-                data_json = data_json.replace("undefined", "null").replace("void 0", "null")
-                data_json = re.sub(r',\s*(\]|})', r'\1', data_json)
-                data = json.loads(data_json)
-                media_block = None
-                for item in data:
-                    if isinstance(item, dict) and item.get("type") == "data":
-                        dd = item.get("data", {})
-                        if "media" in dd:
-                            media_block = dd["media"]
-                            break
-                if media_block:
-                    return media_block.get("episodes", [])
-                return None
-            except Exception:
-                return None
 
-        full_episodes = await fetch_episode_ids()
-        if full_episodes:
-            # Map IDs to the existing episodes list (assume ordered by number)
-            id_map = {ep.get("number"): ep.get("id") for ep in full_episodes if ep.get("number") and ep.get("id")}
-            for ep in episodes:
-                num = ep.get("number")
-                if num in id_map:
-                    ep["id"] = id_map[num]
+    # El payload de detalles no trae los IDs de episodio (caso habitual): BD o episodio 1
+    if episodes and all(ep["id"] is None for ep in episodes):
+        id_map = dict(known_ids)
+        if any(ep["number"] not in id_map for ep in episodes):
+            # Episodios nuevos que aún no están en BD: hace falta el episodio 1 igualmente
+            id_map.update(await (first_task or first_episode_ids(slug)))
+        for ep in episodes:
+            if ep["number"] in id_map:
+                ep["id"] = id_map[ep["number"]]
 
     media_data.update({
         "poster": build_poster_url(anime_id),
@@ -112,11 +101,8 @@ async def get_anime_details(slug: str, force_refresh: bool = Query(False)):
         "episodes": episodes
     })
 
-    # Save with enriched data (now has IDs)
-    try:
-        save_anime_details(media_data)
-    except Exception as e:
-        print(f"Error al guardar en la base de datos: {e}")
+    # Save with enriched data (now has IDs); se guarda en segundo plano
+    enqueue_save(f"details:{slug}", save_anime_details, media_data)
 
-    set_cache(slug, media_data)
+    await set_cache(slug, media_data, route="details")
     return media_data
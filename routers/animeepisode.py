@@ -1,111 +1,102 @@
 from fastapi import APIRouter, Query, HTTPException
-from bs4 import BeautifulSoup
-import re, json
-from utils.scraping import fetch_html, find_sveltekit_script
-from core.cache import get_cached, set_cache
+from utils.scraping import fetch_html, get_sveltekit_script, extract_js_array
+from utils.sveltekit import decode_js
+from core.cache import set_cache, cached_fetch
 from core.config import BASE_URL
+from core.persistence import enqueue_save
 from save_anime_functions import save_anime_episode
 
 router = APIRouter()
 
+def episode_cache_key(slug: str, number: int) -> str:
+    return f"{slug}_ep_{number}"
+
+
 # -------------------- /{slug}/{number} --------------------
 @router.get("/{slug}/{number}")
 async def get_episode(slug: str, number: int, force_refresh: bool = Query(False)):
-    cache_key = f"{slug}_ep_{number}"
-    if not force_refresh:
-        cached = get_cached(cache_key)
-        if cached:
-            return cached
+    return await cached_fetch(episode_cache_key(slug, number), lambda: scrape_episode(slug, number), force_refresh=force_refresh)
+
+def parse_episode_payload(script_text: str):
+    """Bloques 'media' y de episodio (el que contiene 'episode') del payload SvelteKit de /media/{slug}/{n}."""
+    try:
+        data_js = extract_js_array(script_text, "data")
+    except ValueError:
+        raise HTTPException(status_code=500, detail="No se encontró 'data:[' en el script")
+    data = decode_js(data_js)
+    media_block = None
+    ep_block = None
+    for item in data:
+        if isinstance(item, dict) and item.get("type") == "data":
+            dd = item.get("data", {})
+            if media_block is None and "media" in dd:
+                media_block = dd["media"]
+            if ep_block is None and "episode" in dd:
+                ep_block = dd
+    if not media_block or not ep_block:
+        raise HTTPException(status_code=500, detail="No se encontraron bloques 'media' o 'episode'")
+    return media_block, ep_block
+
+def collect_servers(section: dict) -> list:
+    out = []
+    if not isinstance(section, dict):
+        return out
+    for variant, items in section.items():
+        if isinstance(items, list):
+            for it in items:
+                out.append({
+                    "server": it.get("server"),
+                    "url": it.get("url"),
+                    "variant": variant
+                })
+    return out
+
+def build_episode_result(media: dict, ep_block: dict) -> dict:
+    episode = ep_block["episode"]
+    return {
+        "anime": {
+            "id": media.get("id"),
+            "title": media.get("title"),
+            "aka": media.get("aka"),
+            "genres": [g.get("name") for g in media.get("genres", []) if isinstance(g, dict)],
+            "score": media.get("score"),
+            "votes": media.get("votes"),
+            "malId": media.get("malId"),
+            "status": media.get("status"),
+            "episodes_count": media.get("episodesCount"),
+            # Número e id de todos los episodios (los detalles los sacan de aquí: su payload no trae ids)
+            "episodes": [
+                {"number": ep.get("number"), "id": ep.get("id")}
+                for ep in media.get("episodes", [])
+                if isinstance(ep, dict) and ep.get("number") is not None and ep.get("id") is not None
+            ],
+        },
+        "episode": {
+            "id": episode.get("id"),
+            "number": episode.get("number"),
+            "filler": episode.get("filler"),
+        },
+        "embeds": collect_servers(ep_block.get("embeds", {})),
+        "downloads": collect_servers(ep_block.get("downloads", {})),
+    }
+
+async def scrape_episode(slug: str, number: int):
+    """Scrapea /media/{slug}/{number} y guarda el resultado (caché con la clave de get_episode y BD)."""
     url = f"{BASE_URL}/media/{slug}/{number}"
     html = await fetch_html(url)
-    soup = BeautifulSoup(html, "html.parser")
-    script_text = find_sveltekit_script(soup)
+    script_text = get_sveltekit_script(html)
     if not script_text:
         raise HTTPException(status_code=500, detail="No se encontró bloque de datos")
     try:
-        m = re.search(r"data\s*:\s*\[", script_text)
-        if not m:
-            raise HTTPException(status_code=500, detail="No se encontró 'data:[' en el script")
-        start = script_text.find("[", m.start())
-        depth, end = 0, None
-        for i in range(start, len(script_text)):
-            ch = script_text[i]
-            if ch == "[":
-                depth += 1
-            elif ch == "]":
-                depth -= 1
-                if depth == 0:
-                    end = i
-                    break
-        if end is None:
-            raise HTTPException(status_code=500, detail="No se cerró el array de 'data'")
-        data_js = script_text[start:end + 1]
-        data_json = re.sub(r'([{\[,]\s*)([A-Za-z0-9_@$-]+)\s*:', r'\1"\2":', data_js)
-        data_json = data_json.replace("undefined", "null").replace("void 0", "null")
-        data_json = re.sub(r',\s*(\]|})', r'\1', data_json)
-        data = json.loads(data_json)
-        media_block = None
-        ep_block = None
-        for item in data:
-            if isinstance(item, dict) and item.get("type") == "data":
-                dd = item.get("data", {})
-                if media_block is None and "media" in dd:
-                    media_block = dd["media"]
-                if ep_block is None and "episode" in dd:
-                    ep_block = dd
-        if not media_block or not ep_block:
-            raise HTTPException(status_code=500, detail="No se encontraron bloques 'media' o 'episode'")
-
-        media = media_block
-        episode = ep_block["episode"]
-
-        def collect_servers(section: dict) -> list:
-            out = []
-            if not isinstance(section, dict):
-                return out
-            for variant, items in section.items():
-                if isinstance(items, list):
-                    for it in items:
-                        out.append({
-                            "server": it.get("server"),
-                            "url": it.get("url"),
-                            "variant": variant
-                        })
-            return out
-
-        embeds = collect_servers(ep_block.get("embeds", {}))
-        downloads = collect_servers(ep_block.get("downloads", {}))
-
-        result = {
-            "anime": {
-                "id": media.get("id"),
-                "title": media.get("title"),
-                "aka": media.get("aka"),
-                "genres": [g.get("name") for g in media.get("genres", []) if isinstance(g, dict)],
-                "score": media.get("score"),
-                "votes": media.get("votes"),
-                "malId": media.get("malId"),
-                "status": media.get("status"),
-                "episodes_count": media.get("episodesCount"),
-            },
-            "episode": {
-                "id": episode.get("id"),
-                "number": episode.get("number"),
-                "filler": episode.get("filler"),
-            },
-            "embeds": embeds,
-            "downloads": downloads,
-        }
-
-        # Guardar los datos en la base
-        try:
-            save_anime_episode(result)
-        except Exception as e:
-            print(f"Error al guardar episodio en BD: {e}")
-
-        set_cache(cache_key, result)
-        return result
+        media_block, ep_block = parse_episode_payload(script_text)
+        result = build_episode_result(media_block, ep_block)
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al parsear episodio: {e}")
+
+    # Guardar los datos en la base (en segundo plano)
+    enqueue_save(f"episode:{slug}:{number}", save_anime_episode, result)
+
+    await set_cache(episode_cache_key(slug, number), result, route="episode")
+    return result
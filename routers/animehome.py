@@ -1,13 +1,14 @@
 from fastapi import APIRouter, Query
-from bs4 import BeautifulSoup
-import re, demjson3
-from utils.scraping import fetch_html, find_sveltekit_script, extract_home_block
+import re
+from utils.scraping import fetch_html, get_sveltekit_script, extract_home_block
+from utils.sveltekit import decode_js
 from utils.builders import (
     build_featured_image_url, build_latest_episode_image_url,
     build_latest_media_image_url, build_watch_url
 )
-from core.cache import get_cached, set_cache
+from core.cache import set_cache, cached_fetch
 from core.config import BASE_URL
+from core.persistence import enqueue_save
 from save_anime_functions import save_anime_home
 
 router = APIRouter()
@@ -38,20 +39,17 @@ def validate_home_data(data):
 
 @router.get("/home")
 async def get_home_data(force_refresh: bool = Query(False)):
-    if not force_refresh:
-        cached = get_cached("home_data")
-        if cached:
-            return cached
+    return await cached_fetch("home_data", scrape_home_data, force_refresh=force_refresh)
 
+async def scrape_home_data():
     html = await fetch_html(BASE_URL)
-    soup = BeautifulSoup(html, "html.parser")
-    script_tag = find_sveltekit_script(soup)
+    script_tag = get_sveltekit_script(html)
     result = {"featured": [], "latestEpisodes": [], "latestMedia": []}
 
     if script_tag:
         try:
             home_js = extract_home_block(script_tag)
-            home_data = demjson3.decode(home_js)
+            home_data = decode_js(home_js)
 
             # Featured
             for item in home_data.get("featured", []):
@@ -81,15 +79,15 @@ async def get_home_data(force_refresh: bool = Query(False)):
             # Validar y guardar los datos
             try:
                 validate_home_data(result)
-                save_anime_home(result)
+                enqueue_save("anime_home", save_anime_home, result)
             except Exception as e:
                 print(f"Error al guardar en la base de datos: {e}, datos problemáticos: {result}")
                 raise
 
-            set_cache("home_data", result)
+            await set_cache("home_data", result, route="home")
             return result
         except Exception as e:
             print(f"[WARN] Fallback a scraping: {e}")
 
-    set_cache("home_data", result)
+    await set_cache("home_data", result, route="home")
     return result
@@ -1,44 +1,56 @@
 from fastapi import APIRouter, Query
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.support.ui import WebDriverWait
-from bs4 import BeautifulSoup
-import asyncio, re, json
-from core.cache import get_cached, set_cache
-from core.config import BASE_URL
-from utils.scraping import fetch_html
+import asyncio
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+from dateutil import parser
+from core.browser import browser_pool
+from core.cache import set_cache, cached_fetch
+from core.config import BASE_URL, SCHEDULE_ENGINE, SCHEDULE_TZ, SCHEDULE_DELAY_DAYS
+from core.persistence import enqueue_save
+from utils.scraping import fetch_html, extract_js_array
+from utils.parsing import parse_html
+from utils.sveltekit import decode_js
+from utils.builders import build_latest_media_image_url
 from save_anime_functions import save_anime_schedule
 
 router = APIRouter()
 
 async def fetch_media():
     html = await fetch_html(f"{BASE_URL}/horario")
-    m = re.search(r'media\s*:\s*\[', html)
-    start = html.find("[", m.start())
-    depth, end = 0, None
-    for i in range(start, len(html)):
-        if html[i] == "[":
-            depth += 1
-        elif html[i] == "]":
-            depth -= 1
-            if depth == 0:
-                end = i
-                break
-    media_js = html[start:end + 1]
-    media_json = re.sub(r'([{\[,]\s*)([A-Za-z0-9_@$-]+)\s*:', r'\1"\2":', media_js)
-    media_json = media_json.replace("undefined", "null")
-    return json.loads(re.sub(r',\s*(\]|})', r'\1', media_json))
+    # El payload va en el script de SvelteKit; empezar ahí evita los apóstrofes del HTML previo
+    return decode_js(extract_js_array(html, "media", pos=max(html.find("__sveltekit"), 0)))
+
+DIAS = ["Lunes", "Martes", "Miércoles", "Jueves", "Viernes", "Sábado", "Domingo"]
+
+def schedule_slot(item: dict, now: datetime = None) -> dict:
+    """
+    Calcula día, hora y póster de un anime del horario a partir del propio payload, igual que
+    hace la web en el navegador: el día y la hora son los de publicación del último episodio
+    en SCHEDULE_TZ, con el prefijo "Retrasado - " si lleva más de SCHEDULE_DELAY_DAYS sin
+    episodio nuevo. Sin último episodio, el día sale de startDate y la hora queda vacía.
+    """
+    tz = ZoneInfo(SCHEDULE_TZ)
+    now = now or datetime.now(timezone.utc)
+    slot = {"day": None, "time": None, "poster": build_latest_media_image_url(item.get("id"))}
+    latest = item.get("latestEpisode") or {}
+    if latest.get("createdAt"):
+        published = parser.isoparse(latest["createdAt"]).astimezone(tz)
+        slot["day"] = DIAS[published.weekday()]
+        slot["time"] = published.strftime("%I:%M %p").lower()
+        if now - published > timedelta(days=SCHEDULE_DELAY_DAYS):
+            slot["time"] = f"Retrasado - {slot['time']}"
+    elif item.get("startDate"):
+        slot["day"] = DIAS[parser.isoparse(item["startDate"]).weekday()]
+    return slot
 
 def scrape_schedule_all_days():
-    options = Options()
-    options.add_argument("--headless=new")
-    options.add_argument("--disable-gpu")
-    options.add_argument("--no-sandbox")
-    driver = webdriver.Chrome(options=options)
+    # Motor antiguo (SCHEDULE_ENGINE=selenium): Chrome headless recorriendo las pestañas de días.
+    # El navegador sale del pool compartido (core.browser), ya arrancado y reutilizable.
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support.ui import WebDriverWait
 
     slug_to_data = {}
-    try:
+    with browser_pool.lease() as driver:
         driver.get(f"{BASE_URL}/horario")
 
         WebDriverWait(driver, 15).until(lambda d: d.find_elements(By.CSS_SELECTOR, "div.tabs button"))
@@ -48,7 +60,7 @@ def scrape_schedule_all_days():
         for idx, btn in enumerate(day_buttons):
             driver.execute_script("arguments[0].click();", btn)
             WebDriverWait(driver, 15).until(lambda d: d.find_elements(By.CSS_SELECTOR, "div.grid div.relative"))
-            soup = BeautifulSoup(driver.page_source, "html.parser")
+            soup = parse_html(driver.page_source)
             grid = soup.select_one("div.grid.grid-cols-2")
             if not grid:
                 continue
@@ -71,33 +83,32 @@ def scrape_schedule_all_days():
                     "poster": poster
                 }
         return slug_to_data
-    finally:
-        driver.quit()
 
 @router.get("/horario")
 async def get_horario(force_refresh: bool = Query(False)):
-    if not force_refresh:
-        cached = get_cached("horario")
-        if cached:
-            return {"schedule": cached}
-
-    media, slug_to_data = await asyncio.gather(
-        fetch_media(),
-        asyncio.to_thread(scrape_schedule_all_days)
-    )
-
-    for item in media:
-        slug = item.get("slug")
-        if slug in slug_to_data:
-            item.update(slug_to_data[slug])
-        else:
-            item.update({"day": None, "time": None, "poster": None})
-
-# Guardar los datos en la base de datos
-    try:
-        save_anime_schedule({"schedule": media})
-    except Exception as e:
-        print(f"Error al guardar en la base de datos: {e}")
-
-    set_cache("horario", media)
+    media = await cached_fetch("horario", scrape_horario, force_refresh=force_refresh)
     return {"schedule": media}
+
+async def scrape_horario():
+    if SCHEDULE_ENGINE == "selenium":
+        media, slug_to_data = await asyncio.gather(
+            fetch_media(),
+            asyncio.to_thread(scrape_schedule_all_days)
+        )
+        for item in media:
+            slug = item.get("slug")
+            if slug in slug_to_data:
+                item.update(slug_to_data[slug])
+            else:
+                item.update({"day": None, "time": None, "poster": None})
+    else:
+        media = await fetch_media()
+        now = datetime.now(timezone.utc)
+        for item in media:
+            item.update(schedule_slot(item, now))
+
+    # Guardar los datos en la base de datos (en segundo plano)
+    enqueue_save("anime_schedule", save_anime_schedule, {"schedule": media})
+
+    await set_cache("horario", media, route="horario")
+    return media
@@ -5,8 +5,10 @@ import httpx
 import re
 from typing import Dict
 
-from core.cache import get_cached, set_cache
+from core.cache import get_cached, set_cache, single_flight
 from core.config import ZONATMO_BASE_URL, ZONATMO_HEADERS
+from core.http import http_get
+from utils.parsing import parse_html, MANGA_DETAIL
 from routers.mangas import normalize_href, extract_cover_url_from_element, detect_type_from_element
 
 # Configuración básica de logs
@@ -23,23 +25,22 @@ async def fetch_html_remote(url: str, force_refresh: bool = False) -> str:
     """
     Descarga HTML remoto con caché opcional.
     """
-    cached = None if force_refresh else get_cached(url)
+    cached = None if force_refresh else await get_cached(url)
     if cached:
         logger.info(f"[CACHE HIT] {url}")
         return cached
 
     logger.info(f"[FETCH] Descargando: {url}")
     try:
-        async with httpx.AsyncClient(headers=HEADERS, timeout=15.0) as client:
-            resp = await client.get(url)
-            resp.raise_for_status()
-            text = resp.text
+        resp = await http_get(url, headers=HEADERS)
+        resp.raise_for_status()
+        text = resp.text
     except httpx.HTTPError as e:
         logger.error(f"[ERROR] Fallo al obtener {url}: {e}")
         raise HTTPException(status_code=502, detail=f"Error al obtener página: {str(e)}")
 
     if not force_refresh:
-        set_cache(url, text)
+        await set_cache(url, text)
         logger.info(f"[CACHE SET] Guardado en caché: {url}")
 
     return text
@@ -52,29 +53,28 @@ async def resolve_final_chapter_url(upload_url: str) -> str:
     si no, usa regex en el HTML.
     """
     logger.info(f"[RESOLVE] Resolviendo uniqid en: {upload_url}")
-    async with httpx.AsyncClient(headers=HEADERS, timeout=15.0, follow_redirects=False) as client:
-        resp = await client.get(upload_url)
-
-        # Caso 1: Redirección directa -> usar cabecera Location
-        if resp.status_code in (301, 302, 303, 307, 308):
-            final_url = resp.headers.get("Location")
-            if not final_url.startswith("http"):
-                final_url = BASE_URL + final_url
-            logger.info(f"[OK:REDIRECT] {upload_url} -> {final_url}")
-            return final_url
-
-        # Caso 2: No hubo redirect -> buscar uniqid en el HTML
-        html = resp.text
-        match = re.search(r"uniqid:\s*['\"]([^'\"]+)['\"]", html)
-        if not match:
-            logger.warning(f"[WARN] No se encontró uniqid en {upload_url}")
-            raise HTTPException(status_code=500, detail=f"No se encontró uniqid en {upload_url}")
-
-        uniqid = match.group(1)
-        final_url = f"{BASE_URL}/viewer/{uniqid}/paginated"
-        logger.info(f"[OK:HTML] {upload_url} -> {final_url}")
+    resp = await http_get(upload_url, headers=HEADERS, follow_redirects=False)
+
+    # Caso 1: Redirección directa -> usar cabecera Location
+    if resp.status_code in (301, 302, 303, 307, 308):
+        final_url = resp.headers.get("Location")
+        if not final_url.startswith("http"):
+            final_url = BASE_URL + final_url
+        logger.info(f"[OK:REDIRECT] {upload_url} -> {final_url}")
         return final_url
 
+    # Caso 2: No hubo redirect -> buscar uniqid en el HTML
+    html = resp.text
+    match = re.search(r"uniqid:\s*['\"]([^'\"]+)['\"]", html)
+    if not match:
+        logger.warning(f"[WARN] No se encontró uniqid en {upload_url}")
+        raise HTTPException(status_code=500, detail=f"No se encontró uniqid en {upload_url}")
+
+    uniqid = match.group(1)
+    final_url = f"{BASE_URL}/viewer/{uniqid}/paginated"
+    logger.info(f"[OK:HTML] {upload_url} -> {final_url}")
+    return final_url
+
 
 def parse_detail(soup: BeautifulSoup, url: str) -> Dict:
     """
@@ -157,9 +157,16 @@ async def detalle(
     Obtiene todos los detalles de una obra desde su URL en ZonaTMO.
     Entrega las URLs de capítulos en formato /view_uploads/... sin resolver automáticamente.
     """
+    # Las peticiones simultáneas a la misma obra comparten un único scrapeo
+    key = f"{url}#refresh" if force_refresh else url
+    return await single_flight(key, lambda: scrape_detalle(url, force_refresh))
+
+
+async def scrape_detalle(url: str, force_refresh: bool = False) -> Dict:
     logger.info(f"[START] Procesando obra: {url}")
     html = await fetch_html_remote(url, force_refresh=force_refresh)
-    soup = BeautifulSoup(html, "lxml")
+    # Solo cabecera, estado y lista de capítulos (ver utils.parsing.MANGA_DETAIL)
+    soup = parse_html(html, only=MANGA_DETAIL)
     data = parse_detail(soup, url)
     logger.info(f"[END] Finalizado scrapeo de: {url}")
     return data
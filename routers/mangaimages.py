@@ -1,16 +1,20 @@
-from fastapi import APIRouter, HTTPException, Response
+from fastapi import APIRouter, HTTPException, Request
 from fastapi.responses import HTMLResponse
 from pydantic import BaseModel
 from typing import List
-from uuid import uuid4
-import requests
+import asyncio
+import httpx
 import re
 import json
 from urllib.parse import urljoin
-from bs4 import BeautifulSoup
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
 from core.config import ZONATMO_HEADERS
+from core.cache import set_cache, cached_fetch
+from core.http import http_get
+from core.persistence import enqueue_save
+from core.viewers import viewer_registry, PREFIX_LEN
+from utils.images import serve_image, RETRY_STATUS, RETRIES, RETRY_BACKOFF
+from utils.prefetch import image_prefetcher
+from save_manga_functions import save_chapter_manifest, load_chapter_manifest
 
 router = APIRouter()
 
@@ -28,45 +32,94 @@ class MangaResponse(BaseModel):
     viewer_url: str
     message: str
 
-viewers = {}
+# Al expirar o expulsarse un visor se cancela la precarga de su capítulo
+viewer_registry.on_evict = image_prefetcher.cancel
 
-def create_session_with_retries():
-    session = requests.Session()
-    retries = Retry(total=3, backoff_factor=1, status_forcelist=[429, 500, 502, 503, 504])
-    session.mount("https://", HTTPAdapter(max_retries=retries))
-    return session
+CHAPTER_TIMEOUT = 20.0  # segundos
+DIR_PATH_RE = re.compile(r"dirPath = '([^']+)';")
+IMAGES_RE = re.compile(r"images = JSON\.parse\('([^']+)'\);")
+VIEWER_URL_RE = re.compile(r"^https?://(?:www\.)?zonatmo\.com/viewer/([^/?#]+)")
 
-def extract_image_data(url: str):
-    headers = ZONATMO_HEADERS
-    session = create_session_with_retries()
-    response = session.get(url, headers=headers, verify=False)
-    if response.status_code != 200:
-        raise HTTPException(status_code=400, detail=f"No se pudo acceder a la página: Código de estado {response.status_code}")
-    
-    soup = BeautifulSoup(response.text, 'html.parser')
-    script_tags = soup.find_all('script')
-    
-    dir_path = None
+def canonical_chapter_url(url: str) -> str:
+    """
+    URL canónica de un capítulo: /viewer/<id>/paginated, /viewer/<id>/cascade y sus páginas
+    son el mismo capítulo, así que todas comparten clave. Las URLs de subida (view_uploads)
+    se dejan igual: solo se sabe a qué visor llevan tras seguir la redirección.
+    """
+    m = VIEWER_URL_RE.match(url.strip())
+    return f"https://zonatmo.com/viewer/{m.group(1)}" if m else url.strip()
+
+def parse_chapter_page(html: str):
+    """Extrae dirPath e images del script del visor directamente del HTML, sin construir un DOM."""
+    dir_match = DIR_PATH_RE.search(html)
+    images_match = IMAGES_RE.search(html)
     images = None
-    referer = url
-    
-    for script in script_tags:
-        if script.string and 'dirPath' in script.string and 'images = JSON.parse' in script.string:
-            dir_match = re.search(r"dirPath = '([^']+)';", script.string)
-            if dir_match:
-                dir_path = dir_match.group(1)
-            
-            images_match = re.search(r"images = JSON\.parse\('([^']+)'\);", script.string)
-            if images_match:
-                try:
-                    images = json.loads(images_match.group(1))
-                except json.JSONDecodeError as e:
-                    raise HTTPException(status_code=400, detail=f"Error al parsear JSON de imágenes: {str(e)}")
-    
-    if not dir_path or not images:
+    if images_match:
+        try:
+            images = json.loads(images_match.group(1))
+        except json.JSONDecodeError as e:
+            raise HTTPException(status_code=400, detail=f"Error al parsear JSON de imágenes: {str(e)}")
+    if not dir_match or not images:
         raise HTTPException(status_code=400, detail="No se encontraron imágenes o directorio en la página")
-    
-    return dir_path, images, referer
+    return dir_match.group(1), images
+
+async def fetch_chapter_page(url: str) -> httpx.Response:
+    for attempt in range(RETRIES + 1):
+        try:
+            response = await http_get(url, headers=ZONATMO_HEADERS, timeout=CHAPTER_TIMEOUT, follow_redirects=True)
+        except httpx.HTTPError as e:
+            if attempt == RETRIES:
+                raise HTTPException(status_code=502, detail=f"No se pudo acceder a la página: {str(e)}")
+        else:
+            if response.status_code not in RETRY_STATUS or attempt == RETRIES:
+                break
+        await asyncio.sleep(RETRY_BACKOFF * 2 ** attempt)
+    if response.status_code != 200:
+        raise HTTPException(status_code=400, detail=f"No se pudo acceder a la página: Código de estado {response.status_code}")
+    return response
+
+async def load_manifest(url: str, cache_key: str) -> dict:
+    """
+    Fallo de caché: primero la BD (los manifiestos de un capítulo no cambian) y si no está,
+    el visor de ZonaTMO. El resultado se cachea con la política larga "manifest", también bajo
+    la URL canónica del visor al que redirigió, y se guarda en BD en segundo plano.
+    """
+    try:
+        manifest = await asyncio.to_thread(load_chapter_manifest, url)
+    except Exception as e:
+        print(f"No se pudo leer el manifiesto de {url} de la BD: {e}")
+        manifest = None
+    if manifest is None:
+        response = await fetch_chapter_page(url)
+        dir_path, images = parse_chapter_page(response.text)
+        resolved = canonical_chapter_url(str(response.url))
+        manifest = {"url": resolved, "dir_path": dir_path, "images": images}
+        source_url = url if url != resolved else None
+        enqueue_save(f"manifest:{resolved}", save_chapter_manifest, {**manifest, "source_url": source_url})
+    await set_cache(f"manifest:{manifest['url']}", manifest, route="manifest")
+    await set_cache(cache_key, manifest, route="manifest")
+    return manifest
+
+async def extract_image_data(url: str):
+    """
+    (dir_path, images, referer) de un capítulo. Las peticiones repetidas solo cuestan una
+    búsqueda en caché y las concurrentes del mismo capítulo comparten un único scrapeo.
+    La URL canónica solo es la clave de caché y del manifiesto: el Referer de las imágenes
+    sigue siendo la URL del visor que se pidió, como antes.
+    """
+    referer = url.strip()
+    canonical = canonical_chapter_url(referer)
+    cache_key = f"manifest:{canonical}"
+    manifest = await cached_fetch(cache_key, lambda: load_manifest(canonical, cache_key))
+    return manifest["dir_path"], manifest["images"], referer
+
+def image_headers(referer: str) -> dict:
+    """Cabeceras para pedir las imágenes al CDN de ZonaTMO (exige el Referer del capítulo)."""
+    headers = ZONATMO_HEADERS.copy()
+    headers["Referer"] = referer
+    headers["User-Agent"] = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+    headers["Accept"] = "image/avif,image/webp,image/*,*/*;q=0.8"
+    return headers
 
 def generate_viewer_html(chapter_title: str, images: List[str], viewer_id: str):
     html_content = f"""
@@ -97,9 +150,9 @@ def generate_viewer_html(chapter_title: str, images: List[str], viewer_id: str):
 async def scrape_manga(request: MangaRequest):
     try:
         chapter_title = request.url.split('/')[-2] if 'viewer' in request.url else request.url.split('/')[-1].replace('.html', '').replace('-', '_')
-        viewer_id = str(uuid4())
+        viewer_id = await viewer_registry.new_id()
         
-        dir_path, images, referer = extract_image_data(request.url)
+        dir_path, images, referer = await extract_image_data(request.url)
         
         image_info_list = [
             ImageInfo(
@@ -112,18 +165,20 @@ async def scrape_manga(request: MangaRequest):
         if not image_info_list:
             raise HTTPException(status_code=400, detail="No se encontraron imágenes")
         
-        viewers[viewer_id] = {
+        await viewer_registry.register(viewer_id, {
             "dir_path": dir_path,
             "referer": referer,
             "chapter_title": chapter_title,
             "images": images
-        }
+        })
+        # Precarga opcional de las páginas en la caché de disco mientras el lector abre el visor
+        image_prefetcher.start(viewer_id, [urljoin(dir_path, img) for img in images], image_headers(referer))
         
         return MangaResponse(
             chapter_title=chapter_title,
             images=image_info_list,
-            viewer_url=f"http://localhost:8000/api/mangas/scrape-manga/viewer/{chapter_title}/{viewer_id[:8]}",
-            message=f"Se generaron {len(image_info_list)} enlaces de imágenes. Abre el visor en http://localhost:8000/api/mangas/scrape-manga/viewer/{chapter_title}/{viewer_id[:8]}."
+            viewer_url=f"http://localhost:8000/api/mangas/scrape-manga/viewer/{chapter_title}/{viewer_id[:PREFIX_LEN]}",
+            message=f"Se generaron {len(image_info_list)} enlaces de imágenes. Abre el visor en http://localhost:8000/api/mangas/scrape-manga/viewer/{chapter_title}/{viewer_id[:PREFIX_LEN]}."
         )
     
     except HTTPException as he:
@@ -133,34 +188,22 @@ async def scrape_manga(request: MangaRequest):
 
 @router.get("/scrape-manga/viewer/{chapter_title}/{uuid}", response_class=HTMLResponse)
 async def get_viewer(chapter_title: str, uuid: str):
-    viewer_id = next((vid for vid in viewers if vid.startswith(uuid)), None)
-    if not viewer_id or viewers[viewer_id]["chapter_title"] != chapter_title:
+    viewer_id = await viewer_registry.resolve_prefix(uuid[:PREFIX_LEN])
+    viewer_info = await viewer_registry.get(viewer_id) if viewer_id and viewer_id.startswith(uuid) else None
+    if not viewer_info or viewer_info["chapter_title"] != chapter_title:
         raise HTTPException(status_code=404, detail="Página del visor no encontrada")
     
-    viewer_info = viewers[viewer_id]
     html_content = generate_viewer_html(viewer_info["chapter_title"], viewer_info["images"], viewer_id)
     return HTMLResponse(content=html_content)
 
 @router.get("/scrape-manga/image/{viewer_id}/{page_number}/{filename}")
-async def proxy_image(viewer_id: str, page_number: int, filename: str):
-    viewer_info = viewers.get(viewer_id)
+async def proxy_image(viewer_id: str, page_number: int, filename: str, request: Request):
+    viewer_info = await viewer_registry.get(viewer_id)
     if not viewer_info:
         raise HTTPException(status_code=404, detail="Visor no encontrado")
     
-    dir_path = viewer_info["dir_path"]
-    referer = viewer_info["referer"]
-    
-    headers = ZONATMO_HEADERS.copy()
-    headers["Referer"] = referer
-    headers["User-Agent"] = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-    session = create_session_with_retries()
-    image_url = urljoin(dir_path, filename)
-    response = session.get(image_url, headers=headers, stream=True, verify=False)
-    
-    if response.status_code != 200:
-        raise HTTPException(status_code=400, detail=f"No se pudo obtener la imagen: Código de estado {response.status_code}")
-    
-    return Response(
-        content=response.content,
-        media_type=response.headers.get('content-type', 'image/webp')
-    )
\ No newline at end of file
+    image_url = urljoin(viewer_info["dir_path"], filename)
+    # Desde la caché en disco si ya se sirvió o precargó; si no, streaming desde el CDN guardándola
+    response = await serve_image(image_url, image_headers(viewer_info["referer"]), request)
+    image_prefetcher.record(viewer_id, image_url, response.headers.get("x-cache") == "HIT")
+    return response
@@ -1,13 +1,17 @@
 # app/routers/mangas.py
 from fastapi import APIRouter, HTTPException, Query
 from bs4 import BeautifulSoup
+import asyncio
 import httpx
 import re
 from urllib.parse import urljoin
 from typing import Optional, List, Dict, Any
 
-from core.cache import get_cached, set_cache  # tu caché síncrona
-from core.config import ZONATMO_BASE_URL, ZONATMO_HEADERS
+from core.cache import get_cached, set_cache, single_flight
+from core.config import ZONATMO_BASE_URL, ZONATMO_HEADERS, MANGA_HOME_TAB_DEADLINE
+from core.http import http_get
+from utils.parsing import parse_html
+from core.persistence import enqueue_save
 from save_manga_functions import save_manga_home
 router = APIRouter()
 
@@ -23,21 +27,20 @@ async def fetch_html_remote(url: str, force_refresh: bool = False) -> str:
     """
     Recupera HTML remoto con caché local. Si force_refresh es True se ignora la caché.
     """
-    cached = None if force_refresh else get_cached(url)
+    cached = None if force_refresh else await get_cached(url)
     if cached:
         return cached
 
     try:
-        async with httpx.AsyncClient(headers=HEADERS, timeout=15.0) as client:
-            resp = await client.get(url)
-            resp.raise_for_status()
-            text = resp.text
+        resp = await http_get(url, headers=HEADERS)
+        resp.raise_for_status()
+        text = resp.text
     except httpx.HTTPError as e:
         raise HTTPException(status_code=502, detail=f"Error fetching remote: {str(e)}")
 
     # almacenar sólo si no forzamos refresco
     if not force_refresh:
-        set_cache(url, text)
+        await set_cache(url, text)
     return text
 
 
@@ -269,9 +272,11 @@ def parse_elements(container) -> List[Dict]:
     return items
 
 
-async def find_tab_content_by_button_text_async(soup: BeautifulSoup, texts: List[str], force_refresh: bool = False):
+def discover_tab_candidates(soup: BeautifulSoup, texts: List[str]) -> List[Any]:
     """
-    Busca pestañas por texto de botón/enlace. Si necesita abrir una URL real, usa fetch_html_remote(..., force_refresh=force_refresh)
+    Busca pestañas por texto de botón/enlace y devuelve, en orden, los candidatos a contenido:
+    nodos de la propia página (pestañas locales) o URLs remotas que habría que abrir.
+    Se corta en el primer nodo local, porque a partir de ahí no se probaría nada más.
     """
     texts_lower = [t.lower() for t in texts]
 
@@ -284,8 +289,8 @@ async def find_tab_content_by_button_text_async(soup: BeautifulSoup, texts: List
         low = txt.lower()
         return any(t in low for t in texts_lower)
 
-    candidates = soup.find_all(candidate_fn)
-    for tag in candidates:
+    found: List[Any] = []
+    for tag in soup.find_all(candidate_fn):
         href = tag.get("href")
         data_target = tag.get("data-target")
         aria = tag.get("aria-controls")
@@ -299,64 +304,101 @@ async def find_tab_content_by_button_text_async(soup: BeautifulSoup, texts: List
         if target:
             node = soup.select_one(f"#{target}")
             if node:
-                return node
+                found.append(node)
+                return found
 
         if href and (href.startswith("/") or href.startswith("http")):
             full = normalize_href(href)
-            try:
-                html = await fetch_html_remote(full, force_refresh=force_refresh)
-                return BeautifulSoup(html, "lxml")
-            except Exception:
-                continue
-    return None
+            if full not in found:
+                found.append(full)
+    return found
 
 
-# ===========================
-# Home (resumen completo)
-# ===========================
-@router.get("/home", summary="Resumen completo de mangas (home)")
-async def home(
-    force_refresh: bool = Query(False, description="Forzar refresco y evitar caché (boolean)")
-):
-    """
-    Devuelve un único JSON con las secciones en el siguiente orden:
-    - populares (general, seinen, josei)
-    - trending (general, seinen, josei)
-    - ultimos_anadidos
-    - ultimas_subidas
-    - top_semanal
-    - top_mensual
+async def fetch_tab_page(url: str, force_refresh: bool = False):
+    html = await fetch_html_remote(url, force_refresh=force_refresh)
+    return await asyncio.to_thread(parse_html, html)
 
-    Parámetros:
-    - force_refresh (query boolean): si es True, se ignora la caché al obtener HTML remoto.
+
+async def tab_page(url: str, pages: Dict[str, asyncio.Task], deadline: float, force_refresh: bool = False):
     """
-    html = await fetch_html_remote(BASE_URL, force_refresh=force_refresh)
-    soup = BeautifulSoup(html, "lxml")
+    Página remota de una pestaña. Las descargas se comparten entre pestañas a través de `pages`
+    (URL -> tarea) y nunca se espera más allá de `deadline` (hora del bucle). None si falla o
+    no llega a tiempo.
+    """
+    remaining = deadline - asyncio.get_running_loop().time()
+    task = pages.get(url)
+    if task is None:
+        if remaining <= 0:
+            return None  # sin tiempo: ni se lanza
+        task = pages[url] = asyncio.ensure_future(fetch_tab_page(url, force_refresh=force_refresh))
+    if not task.done() and remaining > 0:
+        await asyncio.wait([task], timeout=remaining)
+    if task.done() and not task.cancelled() and task.exception() is None:
+        return task.result()
+    return None
 
-    # ======================
-    # Populares
-    # ======================
-    general_container = soup.select_one("#pills-populars")
-    populares_general = parse_elements(general_container)
 
-    seinen_container = await find_tab_content_by_button_text_async(soup, ["p.seinen", "seinen"], force_refresh=force_refresh)
-    josei_container = await find_tab_content_by_button_text_async(soup, ["p.josei", "josei"], force_refresh=force_refresh)
+async def resolve_tab(candidates: List[Any], pages: Dict[str, asyncio.Task], deadline: float, force_refresh: bool = False):
+    """
+    Primer candidato que da contenido: un nodo local o la primera URL que se descarga a tiempo.
+    Si una URL falla se prueba la siguiente, pero siempre dentro del plazo común.
+    """
+    for cand in candidates:
+        if not isinstance(cand, str):
+            return cand
+        page = await tab_page(cand, pages, deadline, force_refresh=force_refresh)
+        if page is not None:
+            return page
+    return None
 
-    populares_seinen = parse_elements(seinen_container) if seinen_container else []
-    populares_josei = parse_elements(josei_container) if josei_container else []
 
-    # ======================
-    # Trending
-    # ======================
-    trending_container = soup.select_one("#pills-trending")
-    trending_general = parse_elements(trending_container)
+async def fetch_tabs(tabs: Dict[str, List[Any]], force_refresh: bool = False) -> Dict[str, Any]:
+    """
+    Resuelve todas las pestañas a la vez con un plazo común (MANGA_HOME_TAB_DEADLINE): cada una
+    descarga su primera URL remota (sin repetir URLs entre pestañas) y, solo si falla, las
+    siguientes con el tiempo que quede. Lo que no llegue a tiempo deja la pestaña vacía, igual
+    que antes cuando la descarga fallaba.
+    """
+    deadline = asyncio.get_running_loop().time() + MANGA_HOME_TAB_DEADLINE
+    pages: Dict[str, asyncio.Task] = {}
+    try:
+        resolved = await asyncio.gather(*(
+            resolve_tab(candidates, pages, deadline, force_refresh=force_refresh)
+            for candidates in tabs.values()
+        ))
+    finally:
+        for task in pages.values():
+            if not task.done():
+                task.cancel()
+            elif not task.cancelled():
+                task.exception()  # los fallos ya cuentan como pestaña vacía
+    containers = dict(zip(tabs, resolved))
+    for name, container in containers.items():
+        if container is None and tabs[name]:
+            print(f"[MANGAS] Pestaña {name} sin contenido (fallo o fuera de plazo)")
+    return containers
+
+
+def parse_ranked(container) -> List[Dict]:
+    items: List[Dict] = []
+    if container:
+        for row in container.select(".ranked-item"):
+            a = row.find("a", href=True)
+            pos = row.select_one(".position")
+            badge = row.select_one(".badge")
+            mtype = badge.get_text(strip=True).lower() if badge else None
 
-    t_seinen_container = await find_tab_content_by_button_text_async(soup, ["t.seinen", "seinen"], force_refresh=force_refresh)
-    t_josei_container = await find_tab_content_by_button_text_async(soup, ["t.josei", "josei"], force_refresh=force_refresh)
+            items.append({
+                "position": int(pos.get_text(strip=True).replace(".", "")) if pos else None,
+                "title": a.get_text(strip=True) if a else None,
+                "url": normalize_href(a["href"]) if a else None,
+                "type": mtype
+            })
+    return items
 
-    trending_seinen = parse_elements(t_seinen_container) if t_seinen_container else []
-    trending_josei = parse_elements(t_josei_container) if t_josei_container else []
 
+def parse_static_sections(soup: BeautifulSoup):
+    """Últimos añadidos, últimas subidas y tops semanal/mensual (todo en la página principal)."""
     # ======================
     # Últimos añadidos
     # ======================
@@ -372,44 +414,24 @@ async def home(
     ultimas_subidas = parse_elements(container_uploaded)
 
     # ======================
-    # Top semanal
+    # Top semanal / mensual
     # ======================
-    weekly = soup.select_one("#pills-weekly")
-    top_semanal: List[Dict] = []
-    if weekly:
-        for row in weekly.select(".ranked-item"):
-            a = row.find("a", href=True)
-            pos = row.select_one(".position")
-            badge = row.select_one(".badge")
-            mtype = badge.get_text(strip=True).lower() if badge else None
-
-            top_semanal.append({
-                "position": int(pos.get_text(strip=True).replace(".", "")) if pos else None,
-                "title": a.get_text(strip=True) if a else None,
-                "url": normalize_href(a["href"]) if a else None,
-                "type": mtype
-            })
-
-    # ======================
-    # Top mensual
-    # ======================
-    monthly = soup.select_one("#pills-monthly")
-    top_mensual: List[Dict] = []
-    if monthly:
-        for row in monthly.select(".ranked-item"):
-            a = row.find("a", href=True)
-            pos = row.select_one(".position")
-            badge = row.select_one(".badge")
-            mtype = badge.get_text(strip=True).lower() if badge else None
-
-            top_mensual.append({
-                "position": int(pos.get_text(strip=True).replace(".", "")) if pos else None,
-                "title": a.get_text(strip=True) if a else None,
-                "url": normalize_href(a["href"]) if a else None,
-                "type": mtype
-            })
-
-    result = {
+    top_semanal = parse_ranked(soup.select_one("#pills-weekly"))
+    top_mensual = parse_ranked(soup.select_one("#pills-monthly"))
+    return ultimos_anadidos, ultimas_subidas, top_semanal, top_mensual
+
+
+def parse_home_sections(soup: BeautifulSoup, containers: Dict[str, Any]) -> Dict:
+    """Todas las secciones de la home a partir de la página principal y las pestañas resueltas."""
+    populares_general = parse_elements(soup.select_one("#pills-populars"))
+    populares_seinen = parse_elements(containers["p_seinen"])
+    populares_josei = parse_elements(containers["p_josei"])
+    trending_general = parse_elements(soup.select_one("#pills-trending"))
+    trending_seinen = parse_elements(containers["t_seinen"])
+    trending_josei = parse_elements(containers["t_josei"])
+    ultimos_anadidos, ultimas_subidas, top_semanal, top_mensual = parse_static_sections(soup)
+
+    return {
         "populares": {
             "general": {"count": len(populares_general), "items": populares_general},
             "seinen": {"count": len(populares_seinen), "items": populares_seinen},
@@ -426,7 +448,52 @@ async def home(
         "top_mensual": {"count": len(top_mensual), "items": top_mensual},
     }
 
-    save_manga_home(result)
-    
+
+# ===========================
+# Home (resumen completo)
+# ===========================
+@router.get("/home", summary="Resumen completo de mangas (home)")
+async def home(
+    force_refresh: bool = Query(False, description="Forzar refresco y evitar caché (boolean)")
+):
+    """
+    Devuelve un único JSON con las secciones en el siguiente orden:
+    - populares (general, seinen, josei)
+    - trending (general, seinen, josei)
+    - ultimos_anadidos
+    - ultimas_subidas
+    - top_semanal
+    - top_mensual
+
+    Parámetros:
+    - force_refresh (query boolean): si es True, se ignora la caché al obtener HTML remoto.
+    """
+    # Las peticiones simultáneas comparten un único scrapeo (las forzadas van aparte)
+    key = "manga_home#refresh" if force_refresh else "manga_home"
+    return await single_flight(key, lambda: build_home(force_refresh))
+
+
+async def build_home(force_refresh: bool = False) -> Dict:
+    html = await fetch_html_remote(BASE_URL, force_refresh=force_refresh)
+    # DOM completo a propósito: "últimos añadidos" y "últimas subidas" se localizan por su
+    # encabezado y el siguiente <div> (find_next), y las pestañas por el texto de sus botones;
+    # un filtro de subárboles no puede conservar esas relaciones entre hermanos.
+    soup = await asyncio.to_thread(parse_html, html)
+
+    # Pestañas: se localizan todas primero y se resuelven a la vez con un plazo común
+    # (una sola ronda de red en frío en lugar de una por pestaña)
+    tabs = {
+        "p_seinen": discover_tab_candidates(soup, ["p.seinen", "seinen"]),
+        "p_josei": discover_tab_candidates(soup, ["p.josei", "josei"]),
+        "t_seinen": discover_tab_candidates(soup, ["t.seinen", "seinen"]),
+        "t_josei": discover_tab_candidates(soup, ["t.josei", "josei"]),
+    }
+    containers = await fetch_tabs(tabs, force_refresh=force_refresh)
+
+    # El parseo es CPU pura sobre el mismo árbol: un solo hilo para no bloquear el bucle
+    # (repartirlo en varios no gana nada con el GIL)
+    result = await asyncio.to_thread(parse_home_sections, soup, containers)
+
+    enqueue_save("manga_home", save_manga_home, result)
 
     return result
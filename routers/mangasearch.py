@@ -1,11 +1,12 @@
 from fastapi import APIRouter, HTTPException, Query
 from typing import Optional, List
-import requests
-from bs4 import BeautifulSoup
+import httpx
 from pydantic import BaseModel
 import urllib.parse
 import re
 from core.config import ZONATMO_HEADERS
+from core.http import http_get
+from utils.parsing import parse_html, SEARCH_CARDS
 
 router = APIRouter()
 
@@ -164,15 +165,18 @@ def build_url(
     base_url = "https://zonatmo.com/library"
     return f"{base_url}?{urllib.parse.urlencode(query_params, doseq=True)}"
 
-def scrape(url: str) -> List[MangaSearchResult]:
+SEARCH_TIMEOUT = 20.0  # segundos
+
+async def scrape(url: str) -> List[MangaSearchResult]:
     headers = ZONATMO_HEADERS
     try:
-        response = requests.get(url, headers=headers, timeout=20)
+        response = await http_get(url, headers=headers, timeout=SEARCH_TIMEOUT, follow_redirects=True)
         response.raise_for_status()
-    except requests.RequestException as e:
+    except httpx.HTTPError as e:
         raise HTTPException(status_code=500, detail=f"Failed to fetch data from ZonaTMO: {str(e)}")
 
-    soup = BeautifulSoup(response.text, "html.parser")
+    # Solo se parsean las tarjetas de resultados, no el resto de la página
+    soup = parse_html(response.text, only=SEARCH_CARDS)
     cards = soup.select("div.element")
 
     results: List[MangaSearchResult] = []
@@ -256,6 +260,5 @@ async def search_get(
     url = build_url(title, order_item, order_dir, type, demography, status,
                     translation_status, webcomic, yonkoma, amateur, erotic,
                     genres, exclude_genres, page, filter_by)
-    results = scrape(url)
-    return MangaSearchResponse(url=url, results=results)
+    results = await scrape(url)
     return MangaSearchResponse(url=url, results=results)
@@ -0,0 +1,44 @@
+from fastapi import APIRouter
+from core.cache import get_cache_stats
+from core.http import get_http_stats
+from core.persistence import get_persistence_stats
+from aniki import get_db_stats
+from core.browser import get_browser_stats
+from core.imagestore import get_image_cache_stats
+from utils.prefetch import get_prefetch_stats
+from core.viewers import get_viewer_stats
+
+router = APIRouter()
+
+# -------------------- /stats --------------------
+@router.get("/cache", summary="Contadores de la caché en memoria")
+async def cache_stats():
+    return get_cache_stats()
+
+@router.get("/http", summary="Estado del cliente HTTP compartido")
+async def http_stats():
+    return get_http_stats()
+
+@router.get("/persistence", summary="Estado de la cola de guardado en BD")
+async def persistence_stats():
+    return get_persistence_stats()
+
+@router.get("/db", summary="Estado del pool de conexiones a la BD")
+async def db_stats():
+    return get_db_stats()
+
+@router.get("/browser", summary="Estado del pool de navegadores headless (horario con Selenium)")
+async def browser_stats():
+    return get_browser_stats()
+
+@router.get("/images", summary="Estado de la caché de imágenes en disco")
+async def image_cache_stats():
+    return get_image_cache_stats()
+
+@router.get("/prefetch", summary="Precarga de capítulos de manga en la caché de imágenes")
+async def prefetch_stats():
+    return get_prefetch_stats()
+
+@router.get("/viewers", summary="Registro de visores de manga")
+async def viewer_stats():
+    return get_viewer_stats()
@@ -1,15 +1,117 @@
-from sqlalchemy.exc import IntegrityError
 from datetime import datetime
 from dateutil import parser
-from slugify import slugify
-from sqlalchemy.orm import Session
 import re
-from sqlalchemy import or_
-
-from datetime import datetime
-from dateutil import parser
-from sqlalchemy.exc import IntegrityError
-from aniki import AnimeFilterOption as FilterOption, Genre, Anime as Media, Episode, Embed, Download, AnimeCatalog, AnimeHomeSection, AnimeStatusEnum as MediaStatus, Category as MediaType, get_db, AnimeHomeFeatured, AnimeHomeLatestEpisode, AnimeHomeLatestMedia, MediaTypeEnum, AnimeSchedule
+from sqlalchemy import or_, update
+from aniki import (
+    Genre, Anime as Media, Episode, Embed, Download, AnimeCatalog, AnimeHomeSection,
+    AnimeStatusEnum as MediaStatus, Category as MediaType, get_db, AnimeHomeFeatured,
+    AnimeHomeLatestEpisode, AnimeHomeLatestMedia, MediaTypeEnum, AnimeSchedule,
+    anime_genres, upsert_rows
+)
+
+# ===========================
+# Helpers de guardado por lotes
+# ===========================
+# Cada función de guardado resuelve las filas existentes con consultas IN (...) y escribe con
+# INSERT ... ON CONFLICT (ver aniki.upsert_rows), todo en una única transacción por payload.
+
+def _parse_dt(value):
+    return parser.isoparse(value) if value else None
+
+def _unique(rows, key):
+    """Deduplica filas por clave conservando la última aparición."""
+    return list({key(r): r for r in rows}.values())
+
+def _ensure_categories(db, categories) -> dict:
+    """
+    Crea las categorías de anime que falten y devuelve {nombre: id}.
+    Acepta dicts con id opcional, name y slug opcional.
+    """
+    categories = [c for c in categories if c and c.get("name")]
+    if not categories:
+        return {}
+    with_id = [c for c in categories if c.get("id") is not None]
+    without_id = [c for c in categories if c.get("id") is None]
+
+    def row(c):
+        return {
+            "name": c["name"],
+            "slug": c.get("slug") or c["name"].lower().replace(" ", "-"),
+            "media_type": MediaTypeEnum.anime,
+        }
+    upsert_rows(db, MediaType, _unique([{"id": c["id"], **row(c)} for c in with_id], lambda r: r["id"]))
+    upsert_rows(db, MediaType, _unique([row(c) for c in without_id], lambda r: r["name"]))
+
+    names = {c["name"] for c in categories}
+    return {name: id_ for id_, name in db.query(MediaType.id, MediaType.name).filter(MediaType.name.in_(names)).all()}
+
+def _ensure_genres(db, genres) -> dict:
+    """
+    Crea los géneros que falten (buscando por slug o por nombre) y devuelve {slug: id}.
+    Acepta dicts (id opcional, name, slug opcional) o nombres sueltos.
+    """
+    normalized = []
+    for g in genres:
+        if isinstance(g, str):
+            normalized.append({"id": None, "name": g, "slug": generate_slug(g)})
+        elif isinstance(g, dict) and g.get("name"):
+            normalized.append({"id": g.get("id"), "name": g["name"], "slug": g.get("slug") or generate_slug(g["name"])})
+    if not normalized:
+        return {}
+
+    slugs = {g["slug"] for g in normalized}
+    names = {g["name"] for g in normalized}
+
+    def lookup():
+        found = db.query(Genre.id, Genre.slug, Genre.name).filter(
+            or_(Genre.slug.in_(slugs), Genre.name.in_(names))
+        ).all()
+        by_slug = {slug: id_ for id_, slug, _ in found}
+        by_name = {name: id_ for id_, _, name in found}
+        return {g["slug"]: by_slug.get(g["slug"]) or by_name.get(g["name"]) for g in normalized}
+
+    existing = lookup()
+    missing = [g for g in normalized if existing.get(g["slug"]) is None]
+    if missing:
+        upsert_rows(db, Genre, _unique([
+            {"id": g["id"], "name": g["name"], "slug": g["slug"], "applies_to": ["anime"]}
+            for g in missing if g["id"] is not None
+        ], lambda r: r["id"]))
+        upsert_rows(db, Genre, _unique([
+            {"name": g["name"], "slug": g["slug"], "applies_to": ["anime"]}
+            for g in missing if g["id"] is None
+        ], lambda r: r["slug"]))
+        existing = lookup()
+    return {slug: id_ for slug, id_ in existing.items() if id_ is not None}
+
+def _link_genres(db, genres_by_anime: dict, replace: bool = False):
+    """
+    Asocia géneros a animes ({anime_id: [géneros]}). Con replace=True se sustituyen las
+    asociaciones previas de esos animes; si no, solo se añaden las que falten.
+    """
+    if not genres_by_anime:
+        return
+    genre_ids = _ensure_genres(db, [g for gs in genres_by_anime.values() for g in gs])
+    if replace:
+        db.execute(anime_genres.delete().where(anime_genres.c.anime_id.in_(list(genres_by_anime))))
+    links = []
+    for anime_id, gs in genres_by_anime.items():
+        for g in gs:
+            slug = generate_slug(g) if isinstance(g, str) else (g.get("slug") or generate_slug(g.get("name") or ""))
+            if slug in genre_ids:
+                links.append({"anime_id": anime_id, "genre_id": genre_ids[slug]})
+    upsert_rows(db, anime_genres, links, conflict_cols=["anime_id", "genre_id"])
+
+def _existing_episodes(db, anime_ids, episode_ids=()) -> tuple:
+    """
+    Devuelve ({(anime_id, number): id}, {ids existentes}) para los animes y episodios dados.
+    """
+    if not anime_ids and not episode_ids:
+        return {}, set()
+    rows = db.query(Episode.id, Episode.anime_id, Episode.number).filter(
+        or_(Episode.anime_id.in_(list(anime_ids)), Episode.id.in_(list(episode_ids)))
+    ).all()
+    return {(anime_id, number): id_ for id_, anime_id, number in rows}, {id_ for id_, _, _ in rows}
 
 def save_anime_home(data: dict):
     db = next(get_db())
@@ -18,288 +120,97 @@ def save_anime_home(data: dict):
         1: MediaStatus.finalizado,
         2: MediaStatus.emision
     }
-    
+    now = datetime.utcnow()
+    featured = data.get("featured", [])
+    latest_episodes = data.get("latestEpisodes", [])
+    latest_media = data.get("latestMedia", [])
+
     try:
-        # Limpiar las tablas home
+        # Limpiar las tablas home (en la misma transacción que la nueva portada)
         db.query(AnimeHomeFeatured).delete()
         db.query(AnimeHomeLatestEpisode).delete()
         db.query(AnimeHomeLatestMedia).delete()
-        db.commit()
+
+        print(f"Procesando home: {len(featured)} destacados, {len(latest_episodes)} episodios, {len(latest_media)} medios recientes")
+        category_ids = _ensure_categories(db, [item.get("category") for item in featured + latest_media])
 
         # Procesar featured
-        print("Procesando featured...")
-        print(f"Procesando {len(data.get('featured', []))} elementos destacados")
-        
-        for item in data.get("featured", []):
-            try:
-                print(f"Procesando anime destacado {item['id']}")
-                
-                # Buscar o crear la categoría
-                category_data = item.get("category")
-                category = db.query(MediaType).filter(MediaType.id == category_data["id"]).first()
-                if not category:
-                    category = MediaType(
-                        id=category_data["id"],
-                        name=category_data["name"],
-                        slug=category_data["name"].lower().replace(" ", "-"),
-                        media_type=MediaTypeEnum.anime
-                    )
-                    db.add(category)
-                    db.commit()
-                    print(f"Categoría creada: {category.id} - {category.name}")
-
-                # Buscar o crear el anime
-                media = db.query(Media).filter(Media.id == item["id"]).first()
-                
-                if not media:
-                    media = Media(
-                        id=item["id"],
-                        slug=item["slug"],
-                        title=item["title"],
-                        synopsis=item.get("synopsis"),
-                        backdrop_url=item.get("image_url"),
-                        watch_url=item.get("watch_url"),
-                        status=status_map.get(item.get("status"), MediaStatus.unknown),
-                        start_date=parser.isoparse(item["startDate"]) if item.get("startDate") else None,
-                        created_at=datetime.utcnow(),
-                        updated_at=datetime.utcnow(),
-                        category_id=category.id
-                    )
-                    db.add(media)
-                    db.commit()
-                    print(f"Media creado: {media.id} - {media.title}")
-                else:
-                    # Actualizar datos del anime
-                    media.slug = item["slug"]
-                    media.title = item["title"]
-                    media.synopsis = item.get("synopsis")
-                    media.backdrop_url = item.get("image_url")
-                    media.watch_url = item.get("watch_url")
-                    media.status = status_map.get(item.get("status"), MediaStatus.unknown)
-                    media.start_date = parser.isoparse(item["startDate"]) if item.get("startDate") else media.start_date
-                    media.updated_at = datetime.utcnow()
-                    media.category_id = category.id
-
-                # Manejar géneros
-                genre_ids = [g["id"] for g in item.get("genres", [])]
-                existing_genres = db.query(Genre).filter(Genre.id.in_(genre_ids)).all()
-                existing_genre_ids = {g.id for g in existing_genres}
-                
-                # Crear géneros que no existan
-                for genre_data in item.get("genres", []):
-                    if genre_data["id"] not in existing_genre_ids:
-                        genre = Genre(
-                            id=genre_data["id"],
-                            name=genre_data["name"],
-                            slug=genre_data["slug"],
-                            applies_to=["anime"]
-                        )
-                        db.add(genre)
-                        existing_genres.append(genre)
-                        print(f"Género creado: {genre.id} - {genre.name}")
-                
-                db.commit()
-                
-                # Asociar géneros al anime
-                media.genres = existing_genres
-                db.commit()
-
-                # Verificar si ya existe en home_featured
-                existing_home_featured = db.query(AnimeHomeFeatured).filter(
-                    AnimeHomeFeatured.anime_id == media.id
-                ).first()
-
-                if not existing_home_featured:
-                    home_featured = AnimeHomeFeatured(
-                        anime_id=media.id,
-                        section_id=1,  # Asumiendo section_id=1 para featured
-                        position=item.get("position", 0),
-                        created_at=parser.isoparse(item["createdAt"]) if item.get("createdAt") else datetime.utcnow()
-                    )
-                    db.add(home_featured)
-                    db.commit()
-                    print(f"Agregado a home_featured: {media.id}")
-                else:
-                    print(f"Ya existe en home_featured: {media.id}")
-
-            except IntegrityError as ie:
-                print(f"Error de integridad procesando anime destacado {item.get('id', 'N/A')}: {str(ie)}")
-                db.rollback()
-                continue
-            except Exception as e:
-                print(f"Error procesando anime destacado {item.get('id', 'N/A')}: {str(e)}")
-                import traceback
-                traceback.print_exc()
-                db.rollback()
-                continue
-
-        # Procesar latestEpisodes
-        print("Procesando latestEpisodes...")
-        print(f"Procesando {len(data.get('latestEpisodes', []))} episodios")
-        
-        for ep in data.get("latestEpisodes", []):
-            try:
-                print(f"Procesando episodio ID {ep['id']} del anime {ep['media']['id']}")
-                
-                # Buscar o crear el anime
-                media_data = ep.get("media")
-                media = db.query(Media).filter(Media.id == media_data["id"]).first()
-                
-                if not media:
-                    media = Media(
-                        id=media_data["id"],
-                        slug=media_data["slug"],
-                        title=media_data["title"],
-                        created_at=datetime.utcnow(),
-                        updated_at=datetime.utcnow()
-                    )
-                    db.add(media)
-                    db.commit()
-                    print(f"Media creado: {media.id} - {media.title}")
-
-                # Buscar episodio por ID
-                episode = db.query(Episode).filter(Episode.id == ep["id"]).first()
-
-                created_at = parser.isoparse(ep["createdAt"]) if ep.get("createdAt") else datetime.utcnow()
-                
-                if not episode:
-                    # Crear nuevo episodio con el ID proporcionado
-                    episode = Episode(
-                        id=ep["id"],  # Usar el ID del episodio del JSON
-                        anime_id=media_data["id"],
-                        number=ep["number"],
-                        image_url=ep.get("image_url"),
-                        watch_url=ep.get("watch_url"),
-                        filler=False,
-                        created_at=created_at,
-                        published_at=parser.isoparse(ep["publishedAt"]) if ep.get("publishedAt") else None
-                    )
-                    db.add(episode)
-                    db.commit()
-                    print(f"Episodio creado: ID {episode.id}, número {episode.number} para anime {media.id}")
-                else:
-                    # Actualizar episodio existente
-                    episode.anime_id = media_data["id"]
-                    episode.number = ep["number"]
-                    episode.image_url = ep.get("image_url")
-                    episode.watch_url = ep.get("watch_url")
-                    episode.published_at = parser.isoparse(ep["publishedAt"]) if ep.get("publishedAt") else None
-                    episode.updated_at = datetime.utcnow()
-                    print(f"Episodio actualizado: ID {episode.id}, número {episode.number} para anime {media.id}")
-
-                # Verificar si ya existe en home_latest_episodes
-                existing_home_ep = db.query(AnimeHomeLatestEpisode).filter(
-                    AnimeHomeLatestEpisode.episode_id == episode.id
-                ).first()
-
-                if not existing_home_ep:
-                    home_latest_ep = AnimeHomeLatestEpisode(
-                        episode_id=episode.id,
-                        section_id=2,  # Asumiendo section_id=2 para latestEpisodes
-                        created_at=created_at
-                    )
-                    db.add(home_latest_ep)
-                    db.commit()
-                    print(f"Agregado a home_latest_episodes: {episode.id}")
-                else:
-                    print(f"Ya existe en home_latest_episodes: {episode.id}")
-
-            except IntegrityError as ie:
-                print(f"Error de integridad procesando episodio ID {ep.get('id', 'N/A')}: {str(ie)}")
-                db.rollback()
-                continue
-            except Exception as e:
-                print(f"Error procesando episodio ID {ep.get('id', 'N/A')}: {str(e)}")
-                import traceback
-                traceback.print_exc()
-                db.rollback()
-                continue
+        upsert_rows(db, Media, [{
+            "id": item["id"],
+            "slug": item["slug"],
+            "title": item["title"],
+            "synopsis": item.get("synopsis"),
+            "backdrop_url": item.get("image_url"),
+            "watch_url": item.get("watch_url"),
+            "status": status_map.get(item.get("status"), MediaStatus.unknown),
+            "start_date": _parse_dt(item.get("startDate")),
+            "created_at": now,
+            "updated_at": now,
+            "category_id": category_ids.get((item.get("category") or {}).get("name")),
+        } for item in featured],
+            conflict_cols=["id"],
+            update_cols=["slug", "title", "synopsis", "backdrop_url", "watch_url", "status", "updated_at"],
+            keep_existing_cols=["start_date", "category_id"])
+        _link_genres(db, {item["id"]: item["genres"] for item in featured if "genres" in item}, replace=True)
+        upsert_rows(db, AnimeHomeFeatured, _unique([{
+            "anime_id": item["id"],
+            "section_id": 1,  # Asumiendo section_id=1 para featured
+            "position": item.get("position", 0),
+            "created_at": _parse_dt(item.get("createdAt")) or now,
+        } for item in featured], lambda r: r["anime_id"]))
+
+        # Procesar latestEpisodes: el anime se crea solo si no existe
+        upsert_rows(db, Media, [{
+            "id": ep["media"]["id"],
+            "slug": ep["media"]["slug"],
+            "title": ep["media"]["title"],
+            "created_at": now,
+            "updated_at": now,
+        } for ep in latest_episodes], conflict_cols=["id"])
+        upsert_rows(db, Episode, [{
+            "id": ep["id"],
+            "anime_id": ep["media"]["id"],
+            "number": ep["number"],
+            "image_url": ep.get("image_url"),
+            "watch_url": ep.get("watch_url"),
+            "filler": False,
+            "created_at": _parse_dt(ep.get("createdAt")) or now,
+            "published_at": _parse_dt(ep.get("publishedAt")),
+        } for ep in latest_episodes],
+            conflict_cols=["id"],
+            update_cols=["anime_id", "number", "image_url", "watch_url", "published_at"])
+        upsert_rows(db, AnimeHomeLatestEpisode, _unique([{
+            "episode_id": ep["id"],
+            "section_id": 2,  # Asumiendo section_id=2 para latestEpisodes
+            "created_at": _parse_dt(ep.get("createdAt")) or now,
+        } for ep in latest_episodes], lambda r: r["episode_id"]))
 
         # Procesar latestMedia
-        print("Procesando latestMedia...")
-        print(f"Procesando {len(data.get('latestMedia', []))} medios recientes")
-        
-        for media_item in data.get("latestMedia", []):
-            try:
-                print(f"Procesando anime reciente {media_item['id']}")
-                
-                # Buscar o crear la categoría
-                category_data = media_item.get("category")
-                category = db.query(MediaType).filter(MediaType.id == category_data["id"]).first()
-                if not category:
-                    category = MediaType(
-                        id=category_data["id"],
-                        name=category_data["name"],
-                        slug=category_data["name"].lower().replace(" ", "-"),
-                        media_type=MediaTypeEnum.anime
-                    )
-                    db.add(category)
-                    db.commit()
-                    print(f"Categoría creada: {category.id} - {category.name}")
-
-                # Buscar o crear el anime
-                media = db.query(Media).filter(Media.id == media_item["id"]).first()
-                
-                if not media:
-                    media = Media(
-                        id=media_item["id"],
-                        slug=media_item["slug"],
-                        title=media_item["title"],
-                        synopsis=media_item.get("synopsis"),
-                        poster_url=media_item.get("poster"),
-                        backdrop_url=media_item.get("image_url"),
-                        watch_url=media_item.get("watch_url"),
-                        created_at=parser.isoparse(media_item["createdAt"]) if media_item.get("createdAt") else datetime.utcnow(),
-                        updated_at=datetime.utcnow(),
-                        category_id=category.id
-                    )
-                    db.add(media)
-                    db.commit()
-                    print(f"Media creado: {media.id} - {media.title}")
-                else:
-                    # Actualizar datos del anime
-                    media.slug = media_item["slug"]
-                    media.title = media_item["title"]
-                    media.synopsis = media_item.get("synopsis")
-                    media.poster_url = media_item.get("poster")
-                    media.backdrop_url = media_item.get("image_url")
-                    media.watch_url = media_item.get("watch_url")
-                    media.updated_at = datetime.utcnow()
-                    media.category_id = category.id
-
-                # Verificar si ya existe en home_latest_media
-                existing_home_media = db.query(AnimeHomeLatestMedia).filter(
-                    AnimeHomeLatestMedia.media_id == media.id,
-                    AnimeHomeLatestMedia.media_type == MediaTypeEnum.anime
-                ).first()
-
-                if not existing_home_media:
-                    home_latest_media = AnimeHomeLatestMedia(
-                        media_type=MediaTypeEnum.anime,
-                        media_id=media.id,
-                        section_id=3,  # Asumiendo section_id=3 para latestMedia
-                        created_at=parser.isoparse(media_item["createdAt"]) if media_item.get("createdAt") else datetime.utcnow()
-                    )
-                    db.add(home_latest_media)
-                    db.commit()
-                    print(f"Agregado a home_latest_media: {media.id}")
-                else:
-                    print(f"Ya existe en home_latest_media: {media.id}")
-
-            except IntegrityError as ie:
-                print(f"Error de integridad procesando anime reciente {media_item.get('id', 'N/A')}: {str(ie)}")
-                db.rollback()
-                continue
-            except Exception as e:
-                print(f"Error procesando anime reciente {media_item.get('id', 'N/A')}: {str(e)}")
-                import traceback
-                traceback.print_exc()
-                db.rollback()
-                continue
+        upsert_rows(db, Media, [{
+            "id": item["id"],
+            "slug": item["slug"],
+            "title": item["title"],
+            "synopsis": item.get("synopsis"),
+            "poster_url": item.get("poster"),
+            "backdrop_url": item.get("image_url"),
+            "watch_url": item.get("watch_url"),
+            "created_at": _parse_dt(item.get("createdAt")) or now,
+            "updated_at": now,
+            "category_id": category_ids.get((item.get("category") or {}).get("name")),
+        } for item in latest_media],
+            conflict_cols=["id"],
+            update_cols=["slug", "title", "synopsis", "poster_url", "backdrop_url", "watch_url", "updated_at"],
+            keep_existing_cols=["category_id"])
+        upsert_rows(db, AnimeHomeLatestMedia, _unique([{
+            "media_type": MediaTypeEnum.anime,
+            "media_id": item["id"],
+            "section_id": 3,  # Asumiendo section_id=3 para latestMedia
+            "created_at": _parse_dt(item.get("createdAt")) or now,
+        } for item in latest_media], lambda r: r["media_id"]))
 
         db.commit()
         print("Todos los datos procesados y guardados correctamente.")
-        
+
     except Exception as e:
         db.rollback()
         print(f"Error general en save_anime_home: {e}")
@@ -317,125 +228,69 @@ def save_anime_catalog(data: dict):
         1: MediaStatus.finalizado,
         2: MediaStatus.emision
     }
-    
+    now = datetime.utcnow()
+    animes = data.get("animes", [])
+
     try:
         # Obtener la sección "catalog" de AnimeHomeSection
         section = db.query(AnimeHomeSection).filter(AnimeHomeSection.name == "catalog").first()
         if not section:
             raise ValueError("La sección 'catalog' no está definida en AnimeHomeSection")
 
-        for anime in data.get("animes", []):
-            # Obtener o crear la categoría
-            category_data = anime.get("category")
-            category = None
-            if category_data:
-                category = db.query(MediaType).filter(MediaType.id == category_data["id"]).first()
-                if not category:
-                    category = MediaType(
-                        id=category_data["id"],
-                        name=category_data["name"],
-                        slug=category_data.get("slug", category_data["name"].lower().replace(" ", "-")),
-                        media_type=MediaTypeEnum.anime
-                    )
-                    db.add(category)
-                    db.commit()
-                    print(f"Categoría creada: {category.id} - {category.name}")
-
-            # Verificar si el anime ya existe por su id
-            anime_record = db.query(Media).filter(Media.id == anime["id"]).first()
-            if not anime_record:
-                # Crear nuevo registro en la tabla Anime (Media)
-                anime_record = Media(
-                    id=anime.get("id"),
-                    title=anime["title"],
-                    slug=anime["slug"],
-                    synopsis=anime.get("synopsis"),
-                    poster_url=anime.get("cover"),
-                    category_id=category.id if category else None,
-                    created_at=datetime.utcnow(),
-                    updated_at=datetime.utcnow(),
-                    status=status_map.get(anime.get("status"), MediaStatus.unknown),
-                    score=anime.get("score"),
-                    votes=anime.get("votes"),
-                    episodes_count=anime.get("episodes_count"),
-                    start_date=parser.isoparse(anime["startDate"]) if anime.get("startDate") else None,
-                    end_date=parser.isoparse(anime["endDate"]) if anime.get("endDate") else None,
-                    mal_id=anime.get("mal_id"),
-                    seasons=anime.get("seasons"),
-                    backdrop_url=anime.get("backdrop_url"),
-                    trailer_id=anime.get("trailer_id"),
-                    watch_url=anime.get("watch_url"),
-                    runtime=anime.get("runtime"),
-                    next_date=parser.isoparse(anime["next_date"]) if anime.get("next_date") else None,
-                    wait_days=anime.get("wait_days"),
-                    featured=anime.get("featured", False),
-                    mature=anime.get("mature", False)
-                )
-                db.add(anime_record)
-                db.commit()
-                print(f"Media creado: {anime_record.id} - {anime_record.title}")
-            else:
-                # Actualizar datos si es necesario
-                anime_record.synopsis = anime.get("synopsis") or anime_record.synopsis
-                anime_record.poster_url = anime.get("cover") or anime_record.poster_url
-                anime_record.updated_at = datetime.utcnow()
-                anime_record.status = status_map.get(anime.get("status"), anime_record.status)
-                anime_record.start_date = parser.isoparse(anime["startDate"]) if anime.get("startDate") else anime_record.start_date
-                anime_record.end_date = parser.isoparse(anime["endDate"]) if anime.get("endDate") else anime_record.end_date
-                anime_record.category_id = category.id if category else anime_record.category_id
-                db.commit()
-                print(f"Media actualizado: {anime_record.id} - {anime_record.title}")
-
-            # Manejar géneros
-            genre_ids = [g["id"] for g in anime.get("genres", [])]
-            existing_genres = db.query(Genre).filter(Genre.id.in_(genre_ids)).all()
-            existing_genre_ids = {g.id for g in existing_genres}
-            
-            # Crear géneros que no existan
-            for genre_data in anime.get("genres", []):
-                if genre_data["id"] not in existing_genre_ids:
-                    genre = Genre(
-                        id=genre_data["id"],
-                        name=genre_data["name"],
-                        slug=genre_data["slug"],
-                        applies_to=["anime"]
-                    )
-                    db.add(genre)
-                    existing_genres.append(genre)
-                    print(f"Género creado: {genre.id} - {genre.name}")
-            
-            db.commit()
-            
-            # Asociar géneros al anime
-            anime_record.genres = existing_genres
-            db.commit()
-
-            # Añadir el anime a la tabla AnimeCatalog
-            catalog_entry = db.query(AnimeCatalog).filter(
-                AnimeCatalog.anime_id == anime_record.id,
-                AnimeCatalog.section_id == section.id
-            ).first()
-            if not catalog_entry:
-                catalog_entry = AnimeCatalog(
-                    anime_id=anime_record.id,
-                    section_id=section.id,
-                    position=anime.get("position"),
-                    created_at=parser.isoparse(anime["createdAt"]) if anime.get("createdAt") else datetime.utcnow()
-                )
-                db.add(catalog_entry)
-                db.commit()
-                print(f"Agregado a anime_catalog: {anime_record.id}")
-            else:
-                print(f"Ya existe en anime_catalog: {anime_record.id}")
-
-    except IntegrityError as e:
-        db.rollback()
-        print(f"Error de integridad al guardar anime: {e}")
+        category_ids = _ensure_categories(db, [anime.get("category") for anime in animes])
+
+        upsert_rows(db, Media, [{
+            "id": int(anime["id"]),
+            "title": anime["title"],
+            "slug": anime["slug"],
+            "synopsis": anime.get("synopsis"),
+            "poster_url": anime.get("cover"),
+            "category_id": category_ids.get((anime.get("category") or {}).get("name")),
+            "created_at": now,
+            "updated_at": now,
+            "status": status_map.get(anime.get("status")),
+            "score": anime.get("score"),
+            "votes": anime.get("votes"),
+            "episodes_count": anime.get("episodes_count"),
+            "start_date": _parse_dt(anime.get("startDate")),
+            "end_date": _parse_dt(anime.get("endDate")),
+            "mal_id": anime.get("mal_id"),
+            "seasons": anime.get("seasons"),
+            "backdrop_url": anime.get("backdrop_url"),
+            "trailer_id": anime.get("trailer_id"),
+            "watch_url": anime.get("watch_url"),
+            "runtime": anime.get("runtime"),
+            "next_date": _parse_dt(anime.get("next_date")),
+            "wait_days": anime.get("wait_days"),
+            "featured": anime.get("featured", False),
+            "mature": anime.get("mature", False),
+        } for anime in animes],
+            conflict_cols=["id"],
+            update_cols=["updated_at"],
+            keep_existing_cols=["synopsis", "poster_url", "status", "start_date", "end_date", "category_id"],
+            # Como antes: los nuevos entran como unknown y los existentes conservan su estado
+            fallbacks={"status": MediaStatus.unknown})
+
+        # Géneros: solo se tocan si el catálogo los trae
+        _link_genres(db, {int(anime["id"]): anime["genres"] for anime in animes if "genres" in anime}, replace=True)
+
+        # Añadir los animes a la tabla AnimeCatalog
+        upsert_rows(db, AnimeCatalog, [{
+            "anime_id": int(anime["id"]),
+            "section_id": section.id,
+            "position": anime.get("position"),
+            "created_at": _parse_dt(anime.get("createdAt")) or now,
+        } for anime in animes], conflict_cols=["anime_id", "section_id"])
+
+        db.commit()
+        print(f"Catálogo guardado: {len(animes)} animes")
+
     except Exception as e:
         db.rollback()
         print(f"Error al guardar anime: {e}")
         import traceback
         traceback.print_exc()
+        raise
     finally:
         db.close()
 
@@ -448,137 +303,71 @@ def save_anime_details(data: dict):
     }
     db = next(get_db())
     try:
-        mt_data = data.get("category")
-        if mt_data:
-            media_type = db.query(MediaType).filter(MediaType.name == mt_data["name"]).first()
-            if not media_type:
-                media_type = MediaType(
-                    name=mt_data["name"],
-                    description=mt_data.get("description", f"Tipo {mt_data['name']}"),
-                    added_at=datetime.utcnow()
-                )
-                db.add(media_type)
-                db.commit()
-
-        start_date = parser.parse(data["startDate"]).date() if data.get("startDate") else None
-        end_date = parser.parse(data["endDate"]).date() if data.get("endDate") else None
-        created_at = parser.isoparse(data["createdAt"].replace("+00", "Z")) if data.get("createdAt") else datetime.utcnow()
-        updated_at = parser.isoparse(data["updatedAt"].replace("+00", "Z")) if data.get("updatedAt") else None
+        category_ids = _ensure_categories(db, [data.get("category")])
 
         status_val = data.get("status")
         status_enum = status_map.get(status_val) if isinstance(status_val, int) else MediaStatus(status_val) if status_val else None
 
-        media = db.query(Media).filter(Media.id == data["id"]).first()
-        if not media:
-            media = Media(
-                id=data["id"],
-                slug=data["slug"],
-                title=data["title"],
-                aka_ja_jp=data.get("aka"),
-                synopsis=data.get("synopsis"),
-                start_date=start_date,
-                end_date=end_date,
-                status=status_enum,
-                score=data.get("score"),
-                votes=data.get("votes"),
-                backdrop_url=data.get("backdrop"),
-                trailer_id=data.get("trailer"),
-                poster_url=data.get("poster"),
-                watch_url=data.get("watch_url"),
-                seasons=data.get("seasons"),
-                episodes_count=data.get("episodes_count"),
-                mal_id=data.get("mal_id"),
-                mature=data.get("mature", False),
-                featured=data.get("featured", False),
-                category_id=media_type.id if mt_data else None,
-                created_at=created_at,
-                updated_at=updated_at
-            )
-            db.add(media)
-        else:
-            media.aka_ja_jp = data.get("aka", media.aka_ja_jp)
-            media.synopsis = data.get("synopsis", media.synopsis)
-            media.start_date = start_date or media.start_date
-            media.end_date = end_date or media.end_date
-            media.status = status_enum or media.status
-            media.score = data.get("score", media.score)
-            media.votes = data.get("votes", media.votes)
-            media.backdrop_url = data.get("backdrop", media.backdrop_url)
-            media.trailer_id = data.get("trailer", media.trailer_id)
-            media.poster_url = data.get("poster", media.poster_url)
-            media.watch_url = data.get("watch_url", media.watch_url)
-            media.seasons = data.get("seasons", media.seasons)
-            media.episodes_count = data.get("episodes_count", media.episodes_count)
-            media.mal_id = data.get("mal_id", media.mal_id)
-            media.mature = data.get("mature", media.mature)
-            media.featured = data.get("featured", media.featured)
-            media.updated_at = updated_at or media.updated_at
-
-        # Procesar géneros
-        for g in data.get("genres", []):
-            try:
-                genre = db.query(Genre).filter(Genre.slug == g["slug"]).first()
-                if not genre:
-                    genre = Genre(
-                        name=g["name"],
-                        slug=g["slug"],
-                        added_at=datetime.utcnow()
-                    )
-                    db.add(genre)
-                    db.commit()
-                if genre not in media.genres:
-                    media.genres.append(genre)
-                    db.commit()
-            except Exception as e:
-                print(f"Error procesando género {g['slug']}: {e}")
-                db.rollback()
-                continue
-
-
-
-        # Procesar content_units (episodios)
-        print(f"Procesando {len(data.get('episodes', []))} episodios para media {media.id}")
-        for ep in data.get("episodes", []):
-            try:
-                ep_id = ep.get("id")
-                print(f"Procesando episodio número {ep['number']}, id: {ep_id}")
-                if ep_id is None:
-                    print(f"Saltando episodio {ep['number']} porque id es None")
-                    continue
-                episode = db.query(Episode).filter(Episode.id == ep_id).first()
-                if not episode:
-                    episode = db.query(Episode).filter(Episode.anime_id == media.id, Episode.number == ep["number"]).first()
-                    if episode:
-                        print(f"Encontrado episodio existente por anime_id y number: {episode.id}")
-                    else:
-                        print(f"No encontrado, creando nuevo episodio")
-                if not episode:
-                    episode = Episode(
-                        id=ep_id,
-                        anime_id=media.id,
-                        number=ep["number"],
-                        image_url=ep.get("image"),
-                        watch_url=ep.get("url"),
-                        filler=ep.get("filler", False),
-                        created_at=datetime.utcnow()
-                    )
-                    db.add(episode)
-                    print(f"Episodio creado: {episode.id}")
-                else:
-                    print(f"Actualizando episodio existente: {episode.id}")
-                    episode.image_url = ep.get("image") or episode.image_url
-                    episode.watch_url = ep.get("url") or episode.watch_url
-                    episode.filler = ep.get("filler", episode.filler)
-                db.commit()
-                print(f"Episodio {ep['number']} procesado correctamente")
-            except Exception as e:
-                print(f"Error procesando episodio {ep.get('number', 'desconocido')}: {e}")
-                db.rollback()
-                continue
+        upsert_rows(db, Media, [{
+            "id": data["id"],
+            "slug": data["slug"],
+            "title": data["title"],
+            "aka_ja_jp": data.get("aka"),
+            "synopsis": data.get("synopsis"),
+            "start_date": parser.parse(data["startDate"]).date() if data.get("startDate") else None,
+            "end_date": parser.parse(data["endDate"]).date() if data.get("endDate") else None,
+            "status": status_enum,
+            "score": data.get("score"),
+            "votes": data.get("votes"),
+            "backdrop_url": data.get("backdrop"),
+            "trailer_id": data.get("trailer"),
+            "poster_url": data.get("poster"),
+            "watch_url": data.get("watch_url"),
+            "seasons": data.get("seasons"),
+            "episodes_count": data.get("episodes_count"),
+            "mal_id": data.get("mal_id"),
+            "category_id": category_ids.get((data.get("category") or {}).get("name")),
+            "created_at": parser.isoparse(data["createdAt"].replace("+00", "Z")) if data.get("createdAt") else datetime.utcnow(),
+            "updated_at": parser.isoparse(data["updatedAt"].replace("+00", "Z")) if data.get("updatedAt") else None,
+            # mature/featured solo si vienen en el payload: si no, una fila nueva toma el default
+            # de la columna (False) y una existente conserva el suyo
+            **{flag: data[flag] for flag in ("mature", "featured") if data.get(flag) is not None},
+        }],
+            conflict_cols=["id"],
+            keep_existing_cols=[
+                "aka_ja_jp", "synopsis", "start_date", "end_date", "status", "score", "votes",
+                "backdrop_url", "trailer_id", "poster_url", "watch_url", "seasons", "episodes_count",
+                "mal_id", "updated_at", *(flag for flag in ("mature", "featured") if data.get(flag) is not None),
+            ])
+
+        # Procesar géneros (se añaden los que falten)
+        _link_genres(db, {data["id"]: data.get("genres", [])})
+
+        # Procesar content_units (episodios); los que no traen id se omiten
+        episodes = [ep for ep in data.get("episodes", []) if ep.get("id") is not None]
+        print(f"Procesando {len(episodes)} episodios para media {data['id']}")
+        by_number, existing_ids = _existing_episodes(db, {data["id"]}, {ep["id"] for ep in episodes})
+        rows = []
+        for ep in episodes:
+            # Si ya hay un episodio con ese número se actualiza ese registro
+            ep_id = by_number.get((data["id"], ep["number"]), ep["id"])
+            exists = ep_id in existing_ids
+            rows.append({
+                "id": ep_id,
+                "anime_id": data["id"],
+                "number": ep["number"],
+                "image_url": ep.get("image"),
+                "watch_url": ep.get("url"),
+                "filler": ep.get("filler", None if exists else False),
+                "created_at": datetime.utcnow(),
+            })
+        upsert_rows(db, Episode, rows, conflict_cols=["id"], keep_existing_cols=["image_url", "watch_url", "filler"])
+
         db.commit()
     except Exception as e:
         db.rollback()
         print(f"Error: {e}")
+        raise
     finally:
         db.close()
 
@@ -594,149 +383,74 @@ def save_anime_episode(data: dict):
         anime_data = data.get("anime")
         if not anime_data:
             raise ValueError("Falta la información del anime en 'anime'")
+        ep_data = data.get("episode")
+        if not ep_data:
+            raise ValueError("Falta la información del episodio en 'episode'")
 
         # Buscar categoría (fallback: TV Anime)
         mt_name = anime_data.get("category", {}).get("name", "TV Anime")
-        category = db.query(MediaType).filter(MediaType.name == mt_name).first()
-        if not category:
-            category = MediaType(
-                name=mt_name,
-                slug=generate_slug(mt_name),
-                media_type=MediaTypeEnum.anime
-            )
-            db.add(category)
-            db.commit()
+        category_ids = _ensure_categories(db, [{"name": mt_name, "slug": generate_slug(mt_name)}])
 
         # Mapear status
         status_val = anime_data.get("status")
         status_enum = status_map.get(status_val) if isinstance(status_val, int) else MediaStatus(status_val) if status_val else MediaStatus.unknown
 
         # Buscar o crear Anime
-        media = db.query(Media).filter(Media.id == anime_data["id"]).first()
-        if not media:
-            media = Media(
-                id=anime_data["id"],
-                title=anime_data["title"],
-                slug=generate_slug(anime_data["title"]),
-                aka_ja_jp=anime_data.get("aka"),
-                score=anime_data.get("score"),
-                votes=anime_data.get("votes"),
-                status=status_enum,
-                episodes_count=anime_data.get("episodes_count"),
-                mal_id=anime_data.get("malId"),
-                category_id=category.id,
-                created_at=datetime.utcnow(),
-                updated_at=datetime.utcnow(),
-            )
-            db.add(media)
-        else:
-            media.title = anime_data["title"]
-            media.slug = media.slug or generate_slug(anime_data["title"])
-            media.score = anime_data.get("score", media.score)
-            media.votes = anime_data.get("votes", media.votes)
-            media.status = status_enum or media.status
-            media.episodes_count = anime_data.get("episodes_count", media.episodes_count)
-            media.mal_id = anime_data.get("malId", media.mal_id)
-            media.updated_at = datetime.utcnow()
+        anime_id = anime_data["id"]
+        upsert_rows(db, Media, [{
+            "id": anime_id,
+            "title": anime_data["title"],
+            "slug": generate_slug(anime_data["title"]),
+            "aka_ja_jp": anime_data.get("aka"),
+            "score": anime_data.get("score"),
+            "votes": anime_data.get("votes"),
+            "status": status_enum,
+            "episodes_count": anime_data.get("episodes_count"),
+            "mal_id": anime_data.get("malId"),
+            "category_id": category_ids.get(mt_name),
+            "created_at": datetime.utcnow(),
+            "updated_at": datetime.utcnow(),
+        }],
+            conflict_cols=["id"],
+            update_cols=["title", "status", "updated_at"],
+            keep_existing_cols=["score", "votes", "episodes_count", "mal_id"])
 
         # Manejar géneros (pueden venir como string o dict)
-        for g in anime_data.get("genres", []):
-            if isinstance(g, str):
-                name = g
-                slug_val = generate_slug(g)
-            elif isinstance(g, dict):
-                name = g.get("name")
-                slug_val = g.get("slug") or generate_slug(name)
-            else:
-                continue
-
-            # Buscar por slug o nombre (para evitar duplicados con acentos)
-            genre = db.query(Genre).filter(
-                or_(Genre.slug == slug_val, Genre.name == name)
-            ).first()
-
-            if not genre:
-                genre = Genre(
-                    name=name,
-                    slug=slug_val,
-                    applies_to=["anime"]
-                )
-                db.add(genre)
-                db.commit()
-
-            if genre not in media.genres:
-                media.genres.append(genre)
-
-        # Procesar episodio
-        ep_data = data.get("episode")
-        if not ep_data:
-            raise ValueError("Falta la información del episodio en 'episode'")
-
-        # Buscar episodio por ID o por (anime_id, number)
-        episode = db.query(Episode).filter(Episode.id == ep_data["id"]).first()
-        if not episode:
-            episode = db.query(Episode).filter(
-                Episode.anime_id == media.id,
-                Episode.number == ep_data["number"]
-            ).first()
-
-        if not episode:
-            episode = Episode(
-                id=ep_data["id"],
-                anime_id=media.id,
-                number=ep_data["number"],
-                filler=ep_data.get("filler", False),
-                image_url=ep_data.get("image"),
-                watch_url=ep_data.get("url"),
-                created_at=datetime.utcnow(),
-                published_at=parser.isoparse(ep_data["publishedAt"]) if ep_data.get("publishedAt") else None
-            )
-            db.add(episode)
-        else:
-            episode.filler = ep_data.get("filler", episode.filler)
-            episode.image_url = ep_data.get("image") or episode.image_url
-            episode.watch_url = ep_data.get("url") or episode.watch_url
-            episode.published_at = parser.isoparse(ep_data["publishedAt"]) if ep_data.get("publishedAt") else episode.published_at
-
-        # Procesar embeds
-        for emb in data.get("embeds", []):
-            embed = db.query(Embed).filter(
-                Embed.episode_id == episode.id,
-                Embed.server == emb["server"],
-                Embed.url == emb["url"]
-            ).first()
-            if not embed:
-                embed = Embed(
-                    episode_id=episode.id,
-                    server=emb["server"],
-                    url=emb["url"],
-                    variant=emb.get("variant")
-                )
-                db.add(embed)
-
-        # Procesar downloads
-        for dl in data.get("downloads", []):
-            download = db.query(Download).filter(
-                Download.episode_id == episode.id,
-                Download.server == dl["server"],
-                Download.url == dl["url"]
-            ).first()
-            if not download:
-                download = Download(
-                    episode_id=episode.id,
-                    server=dl["server"],
-                    url=dl["url"],
-                    variant=dl.get("variant")
-                )
-                db.add(download)
+        _link_genres(db, {anime_id: anime_data.get("genres", [])})
+
+        # Procesar episodio: por ID o por (anime_id, number)
+        by_number, existing_ids = _existing_episodes(db, {anime_id}, {ep_data["id"]})
+        episode_id = by_number.get((anime_id, ep_data["number"]), ep_data["id"])
+        exists = episode_id in existing_ids
+        upsert_rows(db, Episode, [{
+            "id": episode_id,
+            "anime_id": anime_id,
+            "number": ep_data["number"],
+            "filler": ep_data.get("filler", None if exists else False),
+            "image_url": ep_data.get("image"),
+            "watch_url": ep_data.get("url"),
+            "created_at": datetime.utcnow(),
+            "published_at": _parse_dt(ep_data.get("publishedAt")),
+        }], conflict_cols=["id"], keep_existing_cols=["filler", "image_url", "watch_url", "published_at"])
+
+        # Procesar embeds y downloads: solo se insertan los (server, url) nuevos
+        for model, links in ((Embed, data.get("embeds", [])), (Download, data.get("downloads", []))):
+            existing = set(db.query(model.server, model.url).filter(model.episode_id == episode_id).all())
+            upsert_rows(db, model, _unique([{
+                "episode_id": episode_id,
+                "server": link["server"],
+                "url": link["url"],
+                "variant": link.get("variant"),
+            } for link in links if (link["server"], link["url"]) not in existing], lambda r: (r["server"], r["url"])))
 
         db.commit()
-        print(f"Episodio {episode.number} del anime {media.title} guardado correctamente.")
+        print(f"Episodio {ep_data['number']} del anime {anime_data['title']} guardado correctamente.")
 
     except Exception as e:
         db.rollback()
         print(f"Error en save_anime_episode: {e}")
         import traceback; traceback.print_exc()
+        raise
     finally:
         db.close()
 
@@ -747,96 +461,65 @@ def generate_slug(name: str) -> str:
     return slug or 'default-slug'  # Fallback si el nombre está vacío
 
 # Función para guardar Anime Schedule
-from sqlalchemy import or_
-
 def save_anime_schedule(data: dict):
     db = next(get_db())
+    schedule = data.get("schedule", [])
     try:
-        for item in data.get("schedule", []):
-            # --- Categoría ---
-            media_type = None
-            mt_data = item.get("category")
-            if mt_data:
-                media_type = db.query(MediaType).filter(
-                    or_(
-                        MediaType.slug == (mt_data.get("slug") or generate_slug(mt_data["name"])),
-                        MediaType.name == mt_data["name"]
-                    )
-                ).first()
-                if not media_type:
-                    media_type = MediaType(
-                        name=mt_data["name"],
-                        slug=mt_data.get("slug") or generate_slug(mt_data["name"]),
-                        description=mt_data.get("description", f"Tipo {mt_data['name']}"),
-                        media_type=MediaTypeEnum.anime,
-                        added_at=datetime.utcnow()
-                    )
-                    db.add(media_type)
-                    db.flush()
-
-            # --- Media ---
-            start_date = parser.isoparse(item["startDate"]).date() if item.get("startDate") else None
-            created_at = parser.isoparse(item["createdAt"]) if item.get("createdAt") else datetime.utcnow()
-
-            media = db.query(Media).filter(Media.id == item["id"]).first()
-            if not media:
-                media = Media(
-                    id=item["id"],
-                    slug=item["slug"],
-                    title=item["title"],
-                    synopsis=item.get("synopsis"),
-                    start_date=start_date,
-                    poster_url=item.get("poster"),
-                    category_id=media_type.id if media_type else None,
-                    created_at=created_at,
-                    updated_at=datetime.utcnow(),
-                )
-                db.add(media)
-                db.flush()
-            else:
-                media.slug = media.slug or item["slug"]
-                media.title = item.get("title", media.title)
-                media.synopsis = item.get("synopsis", media.synopsis)
-                media.start_date = start_date or media.start_date
-                media.poster_url = item.get("poster", media.poster_url)
-                media.category_id = media_type.id if media_type else media.category_id
-                media.updated_at = datetime.utcnow()
-
-            # --- Último episodio ---
-            le_data = item.get("latestEpisode")
-            latest_ep_id = None
-            if le_data:
-                created_at_ep = parser.isoparse(le_data["createdAt"]) if le_data.get("createdAt") else datetime.utcnow()
-                episode = db.query(Episode).filter(Episode.id == le_data["id"]).first()
-                if not episode:
-                    episode = Episode(
-                        id=le_data["id"],
-                        anime_id=media.id,
-                        number=le_data["number"],
-                        created_at=created_at_ep
-                    )
-                    db.add(episode)
-                    db.flush()
-                latest_ep_id = episode.id
-
-            # --- AnimeSchedule ---
-            if item.get("day") and item.get("time"):
-                schedule_entry = db.query(AnimeSchedule).filter(
-                    AnimeSchedule.anime_id == media.id
-                ).first()
-
-                if not schedule_entry:
-                    schedule_entry = AnimeSchedule(
-                        anime_id=media.id,
-                        day=item["day"],
-                        time=item["time"],
-                        latest_episode_id=latest_ep_id
-                    )
-                    db.add(schedule_entry)
-                else:
-                    schedule_entry.day = item["day"]
-                    schedule_entry.time = item["time"]
-                    schedule_entry.latest_episode_id = latest_ep_id or schedule_entry.latest_episode_id
+        # --- Categorías ---
+        category_ids = _ensure_categories(db, [
+            {**item["category"], "slug": item["category"].get("slug") or generate_slug(item["category"]["name"])}
+            for item in schedule if item.get("category") and item["category"].get("name")
+        ])
+
+        # --- Media ---
+        now = datetime.utcnow()
+        upsert_rows(db, Media, [{
+            "id": item["id"],
+            "slug": item["slug"],
+            "title": item["title"],
+            "synopsis": item.get("synopsis"),
+            "start_date": parser.isoparse(item["startDate"]).date() if item.get("startDate") else None,
+            "poster_url": item.get("poster"),
+            "category_id": category_ids.get((item.get("category") or {}).get("name")),
+            "created_at": _parse_dt(item.get("createdAt")) or now,
+            "updated_at": now,
+        } for item in schedule],
+            conflict_cols=["id"],
+            update_cols=["updated_at"],
+            keep_existing_cols=["title", "synopsis", "start_date", "poster_url", "category_id"])
+
+        # --- Último episodio (se crea solo si no existe) ---
+        latest = [(item["id"], item["latestEpisode"]) for item in schedule if item.get("latestEpisode")]
+        upsert_rows(db, Episode, [{
+            "id": le["id"],
+            "anime_id": anime_id,
+            "number": le["number"],
+            "created_at": _parse_dt(le.get("createdAt")) or now,
+        } for anime_id, le in latest])
+        _, existing_ids = _existing_episodes(db, (), {le["id"] for _, le in latest})
+        latest_ep_ids = {anime_id: le["id"] for anime_id, le in latest if le["id"] in existing_ids}
+
+        # --- AnimeSchedule: una entrada por anime ---
+        entries = {item["id"]: item for item in schedule if item.get("day") and item.get("time")}
+        existing = {
+            row.anime_id: row for row in
+            db.query(AnimeSchedule.id, AnimeSchedule.anime_id, AnimeSchedule.latest_episode_id)
+            .filter(AnimeSchedule.anime_id.in_(list(entries))).all()
+        } if entries else {}
+        updates = [{
+            "id": existing[anime_id].id,
+            "day": item["day"],
+            "time": item["time"],
+            "latest_episode_id": latest_ep_ids.get(anime_id) or existing[anime_id].latest_episode_id,
+        } for anime_id, item in entries.items() if anime_id in existing]
+        if updates:
+            db.execute(update(AnimeSchedule), updates)
+        upsert_rows(db, AnimeSchedule, [{
+            "anime_id": anime_id,
+            "day": item["day"],
+            "time": item["time"],
+            "latest_episode_id": latest_ep_ids.get(anime_id),
+        } for anime_id, item in entries.items() if anime_id not in existing])
 
         db.commit()
         print("Horarios guardados/actualizados correctamente.")
@@ -848,3 +531,19 @@ def save_anime_schedule(data: dict):
         raise
     finally:
         db.close()
+
+
+# IDs de episodios ya guardados (para no tener que scrapear el episodio 1 en los detalles)
+def load_episode_ids(slug: str) -> dict:
+    """{número: id} de los episodios guardados del anime con ese slug ({} si no hay ninguno)."""
+    db = next(get_db())
+    try:
+        rows = (
+            db.query(Episode.number, Episode.id)
+            .join(Media, Media.id == Episode.anime_id)
+            .filter(Media.slug == slug)
+            .all()
+        )
+        return {number: ep_id for number, ep_id in rows}
+    finally:
+        db.close()
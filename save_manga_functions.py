@@ -3,7 +3,7 @@ from datetime import datetime, timedelta, timezone
 from dateutil import parser
 from sqlalchemy.orm import Session
 import re
-from sqlalchemy import or_
+from sqlalchemy import or_, update
 
 # Importar clases del nuevo esquema de aniki.py
 from aniki import (
@@ -11,6 +11,7 @@ from aniki import (
     Genre,
     Manga,
     Chapter,
+    ChapterManifest,
     Embed,
     Download,
     MangaHomeSection,
@@ -20,7 +21,8 @@ from aniki import (
     MangaTranslationStatusEnum,
     YesNoEnum,
     get_db,
-    MediaTypeEnum
+    MediaTypeEnum,
+    upsert_rows
 )
 
 # Función auxiliar para generar un slug
@@ -30,10 +32,6 @@ def generate_slug(name: str) -> str:
     return slug or 'default-slug'  # Fallback si el nombre está vacío
 
 # Función para guardar Manga Home
-from sqlalchemy.exc import IntegrityError
-import re
-from datetime import datetime, timedelta, timezone
-
 def save_manga_home(data: dict):
     db = next(get_db())
     status_map = {
@@ -65,39 +63,37 @@ def save_manga_home(data: dict):
         "top_semanal": 9,
         "top_mensual": 10
     }
+    type_to_slug = {
+        "manga": "manga",
+        "manhua": "manhua",
+        "manhwa": "manhwa",
+        "novel": "novel",
+        "novela": "novel",
+        "one_shot": "one_shot",
+        "one shot": "one_shot",
+        "doujinshi": "doujinshi",
+        "oel": "oel"
+    }
+    chapter_sections = ["ultimas_subidas", "ultimos_anadidos"]
 
-    def get_or_create_category(manga_type: str):
-        """Obtiene o crea una categoría basada en el tipo de manga."""
-        type_to_slug = {
-            "manga": "manga",
-            "manhua": "manhua",
-            "manhwa": "manhwa",
-            "novel": "novel",
-            "novela": "novel",
-            "one_shot": "one_shot",
-            "one shot": "one_shot",
-            "doujinshi": "doujinshi",
-            "oel": "oel"
-        }
-        slug = type_to_slug.get(manga_type.lower() if manga_type else "manga", "manga")
-        category = db.query(Category).filter(
-            Category.slug == slug,
-            Category.media_type == MediaTypeEnum.manga
-        ).first()
-        if not category:
-            category = Category(
-                name=manga_type.capitalize() if manga_type else "Manga",
-                slug=slug,
-                media_type=MediaTypeEnum.manga
-            )
-            db.add(category)
-            db.flush()
-            print(f"Categoría creada: {category.id} - {category.name}")
-        return category
+    def media_id_from(item):
+        media_id_match = re.search(r'/(\d+)/', item.get("url", "")) if item.get("url") else None
+        return int(media_id_match.group(1)) if media_id_match else None
+
+    def parse_created_at(upload_time, title):
+        created_at = datetime.now(tz=timezone(timedelta(hours=2)))  # CEST timezone
+        if upload_time and upload_time != "0 h":
+            try:
+                hours = int(re.search(r'(\d+)', upload_time).group(1)) if re.search(r'(\d+)', upload_time) else 0
+                created_at = created_at - timedelta(hours=hours)
+            except Exception as e:
+                print(f"Error al parsear upload_time '{upload_time}' para {title}: {e}")
+        return created_at
 
     try:
+        # --- 1. Recorrer secciones y normalizar items ---
+        entries = []
         for section_key in ["populares", "trending", "ultimos_anadidos", "ultimas_subidas", "top_semanal", "top_mensual"]:
-            print(f"Procesando {section_key}...")
             section_data = data.get(section_key, {})
             
             # Manejar subsecciones para populares y trending
@@ -121,157 +117,128 @@ def save_manga_home(data: dict):
                     seen = set()
                     unique_items = []
                     for item in items:
-                        media_id_match = re.search(r'/(\d+)/', item.get("url", "")) if item.get("url") else None
-                        media_id = int(media_id_match.group(1)) if media_id_match else None
-                        chapter = item.get("chapter")
-                        key = (media_id, chapter)
-                        if key not in seen and media_id is not None:
+                        key = (media_id_from(item), item.get("chapter"))
+                        if key not in seen and key[0] is not None:
                             seen.add(key)
                             unique_items.append(item)
                     items = unique_items
                 
                 for position, item in enumerate(items, 1):
-                    try:
-                        title = item.get("title", "Unknown").replace("MANGA", "").replace("MANHWA", "").strip()
-                        print(f"Procesando manga {title} ({section_name})")
-                        
-                        # Extraer ID de la URL
-                        media_id_match = re.search(r'/(\d+)/', item.get("url", "")) if item.get("url") else None
-                        media_id = int(media_id_match.group(1)) if media_id_match else None
-                        if not media_id:
-                            print(f"URL inválida o ausente para {title}, omitiendo.")
-                            continue
-                        
-                        # Obtener categoría
-                        category = get_or_create_category(item.get("type", "manga"))
-                        
-                        # Parsear upload_time
-                        upload_time = item.get("upload_time")
-                        created_at = datetime.now(tz=timezone(timedelta(hours=2)))  # CEST timezone
-                        if upload_time and upload_time != "0 h":
-                            try:
-                                hours = int(re.search(r'(\d+)', upload_time).group(1)) if re.search(r'(\d+)', upload_time) else 0
-                                created_at = created_at - timedelta(hours=hours)
-                            except Exception as e:
-                                print(f"Error al parsear upload_time '{upload_time}' para {title}: {e}")
-                                created_at = datetime.now(tz=timezone(timedelta(hours=2)))
-                        
-                        # Buscar o crear Manga
-                        manga = db.query(Manga).filter(Manga.id == media_id).first()
-                        if not manga:
-                            manga = Manga(
-                                id=media_id,
-                                title=title,
-                                subtitle=None,
-                                description=None,
-                                cover_url=item.get("cover"),
-                                type=item.get("type", "manga"),
-                                demography=item.get("demography", "") if item.get("demography") else "",
-                                state=None,
-                                status=status_map.get(item.get("status", "").lower(), MangaStatusEnum.publishing),
-                                translation_status=translation_status_map.get(item.get("translation_status", "").lower(), MangaTranslationStatusEnum.active),
-                                webcomic=yes_no_map.get(item.get("webcomic", "no"), YesNoEnum.no),
-                                yonkoma=yes_no_map.get(item.get("yonkoma", "no"), YesNoEnum.no),
-                                amateur=yes_no_map.get(item.get("amateur", "no"), YesNoEnum.no),
-                                erotic=yes_no_map.get(item.get("erotic", "no"), YesNoEnum.no),
-                                score=float(item["score"]) if item.get("score") and item["score"] != "0.00" else None,
-                                popularity=int(item["popularity"]) if item.get("popularity") is not None else 0,
-                                url=item.get("url"),
-                                alt_titles=[],
-                                synonyms=[],
-                                category_id=category.id,
-                                created_at=created_at,
-                                updated_at=created_at
-                            )
-                            db.add(manga)
-                            db.flush()
-                            print(f"Manga creado: {manga.id} - {manga.title}")
-                        else:
-                            manga.title = title
-                            manga.cover_url = item.get("cover", manga.cover_url)
-                            manga.type = item.get("type", manga.type)
-                            manga.demography = item.get("demography", manga.demography) if item.get("demography") else manga.demography
-                            manga.status = status_map.get(item.get("status", "").lower(), manga.status)
-                            manga.translation_status = translation_status_map.get(item.get("translation_status", "").lower(), manga.translation_status)
-                            manga.score = float(item["score"]) if item.get("score") and item["score"] != "0.00" else manga.score
-                            manga.popularity = int(item["popularity"]) if item.get("popularity") is not None else manga.popularity
-                            manga.url = item.get("url", manga.url)
-                            manga.category_id = category.id
-                            manga.updated_at = created_at
-                        
-                        # Géneros (vacíos en el JSON, pero si en el futuro hay, se puede agregar)
-                        if not manga.genres:
-                            manga.genres = []
-                        
-                        # Procesar capítulo para ultimas_subidas y ultimos_anadidos
-                        chapter_number = None
-                        if section_name in ["ultimas_subidas", "ultimos_anadidos"] and item.get("chapter"):
-                            chapter_number = float(item["chapter"]) if item.get("chapter") else None
-                            print(f"Procesando capítulo {chapter_number} para {title} en {section_name}")
-                            # Para ultimas_subidas, crear el capítulo incluso sin chapter_url (permitir url=None)
-                            chapter_url = item.get("url")  # Usamos la URL del manga como fallback, ya que no hay URL específica de capítulo en el JSON
-                            if chapter_number is not None:
-                                chapter = db.query(Chapter).filter(
-                                    Chapter.manga_id == manga.id,
-                                    Chapter.number == chapter_number
-                                ).first()
-                                if not chapter:
-                                    chapter = Chapter(
-                                        manga_id=manga.id,
-                                        number=chapter_number,
-                                        title=item.get("chapter_title") or f"Capítulo {chapter_number}",
-                                        url=chapter_url,  # URL del manga como fallback; puede ajustarse más tarde con scraper de detalle
-                                        date=created_at.date() if created_at else None,
-                                        group=item.get("group") or "Unknown",
-                                        created_at=created_at
-                                    )
-                                    db.add(chapter)
-                                    db.flush()
-                                    print(f"Capítulo creado: {chapter_number} para manga {manga.id}")
-                                else:
-                                    # Actualizar capítulo existente
-                                    chapter.title = item.get("chapter_title", chapter.title) or f"Capítulo {chapter_number}"
-                                    chapter.url = chapter_url or chapter.url
-                                    chapter.date = created_at.date() if created_at else chapter.date
-                                    chapter.group = item.get("group", chapter.group) or "Unknown"
-                                    print(f"Capítulo {chapter_number} actualizado para manga {manga.id}")
-                            else:
-                                print(f"No se puede crear capítulo para {title}: chapter_number inválido")
-                        
-                        # Añadir a MangaHomeItem
-                        position = item.get("position", position)
-                        existing_home_item = db.query(MangaHomeItem).filter(
-                            MangaHomeItem.manga_id == manga.id,
-                            MangaHomeItem.section_id == section_id
-                        ).first()
-                        if not existing_home_item:
-                            home_item = MangaHomeItem(
-                                manga_id=manga.id,
-                                section_id=section_id,
-                                position=position,
-                                chapter_number=chapter_number if section_name in ["ultimas_subidas", "ultimos_anadidos"] else None,
-                                upload_time=upload_time if section_name in ["ultimas_subidas", "ultimos_anadidos"] else None,
-                                created_at=created_at
-                            )
-                            db.add(home_item)
-                            db.flush()  # Flush en lugar de commit para mantener la transacción abierta
-                            print(f"Agregado a manga_home_items ({section_name}): {manga.id}")
-                        else:
-                            existing_home_item.position = position
-                            if section_name in ["ultimas_subidas", "ultimos_anadidos"]:
-                                existing_home_item.chapter_number = chapter_number if chapter_number is not None else existing_home_item.chapter_number
-                                existing_home_item.upload_time = upload_time if upload_time else existing_home_item.upload_time
-                            db.flush()  # Flush para actualizar
-                            print(f"Actualizado en manga_home_items ({section_name}): {manga.id}")
-
-                    except IntegrityError as ie:
-                        db.rollback()
-                        print(f"Error de integridad procesando {title} en {section_name}: {str(ie)}")
-                        continue
-                    except Exception as e:
-                        db.rollback()
-                        print(f"Error procesando {title} en {section_name}: {str(e)}")
+                    title = item.get("title", "Unknown").replace("MANGA", "").replace("MANHWA", "").strip()
+                    media_id = media_id_from(item)
+                    if not media_id:
+                        print(f"URL inválida o ausente para {title}, omitiendo.")
                         continue
+                    upload_time = item.get("upload_time")
+                    with_chapter = section_name in chapter_sections
+                    entries.append({
+                        "section_id": section_id,
+                        "position": item.get("position", position),
+                        "item": item,
+                        "title": title,
+                        "media_id": media_id,
+                        "upload_time": upload_time if with_chapter else None,
+                        "chapter_number": float(item["chapter"]) if with_chapter and item.get("chapter") else None,
+                        "created_at": parse_created_at(upload_time, title),
+                    })
+        print(f"Procesando manga home: {len(entries)} items")
+
+        # --- 2. Categorías por tipo de manga ---
+        def category_slug(manga_type):
+            return type_to_slug.get(manga_type.lower() if manga_type else "manga", "manga")
+
+        categories = {}
+        for e in entries:
+            manga_type = e["item"].get("type", "manga")
+            categories.setdefault(category_slug(manga_type), manga_type.capitalize() if manga_type else "Manga")
+        upsert_rows(db, Category, [
+            {"name": name, "slug": slug, "media_type": MediaTypeEnum.manga} for slug, name in categories.items()
+        ])
+        category_ids = dict(db.query(Category.slug, Category.id).filter(
+            Category.slug.in_(list(categories)),
+            Category.media_type == MediaTypeEnum.manga
+        ).all()) if categories else {}
+
+        # --- 3. Mangas (los valores por defecto solo se aplican a los nuevos) ---
+        existing_mangas = {
+            row.id for row in db.query(Manga.id).filter(Manga.id.in_({e["media_id"] for e in entries})).all()
+        } if entries else set()
+        manga_rows = []
+        for e in entries:
+            item = e["item"]
+            is_new = e["media_id"] not in existing_mangas
+            manga_rows.append({
+                "id": e["media_id"],
+                "title": e["title"],
+                "cover_url": item.get("cover"),
+                "type": item.get("type", "manga" if is_new else None),
+                "demography": item.get("demography") or ("" if is_new else None),
+                "status": status_map.get(item.get("status", "").lower(), MangaStatusEnum.publishing if is_new else None),
+                "translation_status": translation_status_map.get(item.get("translation_status", "").lower(), MangaTranslationStatusEnum.active if is_new else None),
+                "webcomic": yes_no_map.get(item.get("webcomic", "no"), YesNoEnum.no),
+                "yonkoma": yes_no_map.get(item.get("yonkoma", "no"), YesNoEnum.no),
+                "amateur": yes_no_map.get(item.get("amateur", "no"), YesNoEnum.no),
+                "erotic": yes_no_map.get(item.get("erotic", "no"), YesNoEnum.no),
+                "score": float(item["score"]) if item.get("score") and item["score"] != "0.00" else None,
+                "popularity": int(item["popularity"]) if item.get("popularity") is not None else (0 if is_new else None),
+                "url": item.get("url"),
+                "alt_titles": [],
+                "synonyms": [],
+                "category_id": category_ids.get(category_slug(item.get("type", "manga"))),
+                "created_at": e["created_at"],
+                "updated_at": e["created_at"],
+            })
+        upsert_rows(db, Manga, manga_rows,
+            conflict_cols=["id"],
+            update_cols=["title", "category_id", "updated_at"],
+            keep_existing_cols=["cover_url", "type", "demography", "status", "translation_status", "score", "popularity", "url"])
+
+        # --- 4. Capítulos de ultimas_subidas y ultimos_anadidos ---
+        # Se usa la URL del manga como fallback: el JSON no trae URL de capítulo
+        upsert_rows(db, Chapter, [{
+            "manga_id": e["media_id"],
+            "number": e["chapter_number"],
+            "title": e["item"].get("chapter_title") or f"Capítulo {e['chapter_number']}",
+            "url": e["item"].get("url"),
+            "date": e["created_at"].date(),
+            "group": e["item"].get("group") or "Unknown",
+            "created_at": e["created_at"],
+        } for e in entries if e["chapter_number"] is not None],
+            conflict_cols=["manga_id", "number"],
+            update_cols=["title", "date", "group"],
+            keep_existing_cols=["url"])
+
+        # --- 5. MangaHomeItem: una entrada por (manga, sección) ---
+        home_entries = {(e["media_id"], e["section_id"]): e for e in entries}
+        existing_items = {
+            (row.manga_id, row.section_id): row for row in
+            db.query(MangaHomeItem.id, MangaHomeItem.manga_id, MangaHomeItem.section_id,
+                     MangaHomeItem.chapter_number, MangaHomeItem.upload_time)
+            .filter(MangaHomeItem.manga_id.in_({k[0] for k in home_entries}),
+                    MangaHomeItem.section_id.in_({k[1] for k in home_entries}))
+            .all()
+        } if home_entries else {}
+        updates = []
+        for key, e in home_entries.items():
+            if key not in existing_items:
+                continue
+            row = existing_items[key]
+            updates.append({
+                "id": row.id,
+                "position": e["position"],
+                "chapter_number": e["chapter_number"] if e["chapter_number"] is not None else row.chapter_number,
+                "upload_time": e["upload_time"] or row.upload_time,
+            })
+        if updates:
+            db.execute(update(MangaHomeItem), updates)
+        upsert_rows(db, MangaHomeItem, [{
+            "manga_id": e["media_id"],
+            "section_id": e["section_id"],
+            "position": e["position"],
+            "chapter_number": e["chapter_number"],
+            "upload_time": e["upload_time"],
+            "created_at": e["created_at"],
+        } for key, e in home_entries.items() if key not in existing_items])
 
         db.commit()
         print("Datos de manga home procesados y guardados correctamente.")
@@ -505,4 +472,42 @@ def save_manga_filters(data: dict):
         traceback.print_exc()
         raise
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+# Manifiestos de capítulos (lista de imágenes del visor)
+def save_chapter_manifest(data: dict):
+    db = next(get_db())
+    try:
+        chapter_id = None
+        if data.get("source_url"):
+            chapter_id = db.query(Chapter.id).filter(Chapter.url == data["source_url"]).scalar()
+        upsert_rows(db, ChapterManifest, [{
+            "url": data["url"],
+            "source_url": data.get("source_url"),
+            "chapter_id": chapter_id,
+            "dir_path": data["dir_path"],
+            "images": data["images"],
+            "created_at": datetime.now(timezone.utc),
+        }], conflict_cols=("url",), update_cols=("dir_path", "images"), keep_existing_cols=("source_url", "chapter_id"))
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        print(f"Error al guardar el manifiesto del capítulo {data.get('url')}: {e}")
+        raise
+    finally:
+        db.close()
+
+
+def load_chapter_manifest(url: str):
+    """Manifiesto guardado para una URL de capítulo (canónica o de subida), o None."""
+    db = next(get_db())
+    try:
+        row = db.query(ChapterManifest).filter(
+            or_(ChapterManifest.url == url, ChapterManifest.source_url == url)
+        ).first()
+        if row is None:
+            return None
+        return {"url": row.url, "dir_path": row.dir_path, "images": row.images}
+    finally:
+        db.close()
@@ -0,0 +1,64 @@
+import fnmatch
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+# Los módulos de la app se importan desde la raíz del repo (como hace uvicorn con main:app)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Las pruebas no abren conexiones: basta con que aniki pueda crear el engine al importarse
+# (los routers lo importan) sin el driver de Postgres ni una base de datos levantada.
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("DB_ASYNC_ENABLED", "0")
+
+
+class FakeRedis:
+    """Sustituto en memoria de redis.Redis: get / set(px=) / delete / scan_iter, con latencia opcional."""
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.data = {}  # clave -> (valor, caduca_en)
+        self.calls = 0
+        self.fail = False
+        self._lock = threading.Lock()
+
+    def _op(self):
+        self.calls += 1
+        if self.delay:
+            time.sleep(self.delay)
+        if self.fail:
+            raise ConnectionError("Redis caído")
+
+    def get(self, key):
+        self._op()
+        with self._lock:
+            item = self.data.get(key)
+            if item is None or item[1] <= time.time():
+                self.data.pop(key, None)
+                return None
+            return item[0]
+
+    def set(self, key, value, px=None):
+        self._op()
+        with self._lock:
+            self.data[key] = (value, time.time() + px / 1000 if px else float("inf"))
+        return True
+
+    def delete(self, *keys):
+        self._op()
+        with self._lock:
+            return sum(1 for k in keys if self.data.pop(k, None) is not None)
+
+    def scan_iter(self, match="*", count=None):
+        self._op()
+        with self._lock:
+            return [k for k in list(self.data) if fnmatch.fnmatch(k, match)]
+
+
+@pytest.fixture
+def fake_redis():
+    """Factoría de clientes FakeRedis para inyectar en RedisBackend."""
+    return FakeRedis
@@ -0,0 +1,82 @@
+"""
+Pruebas del recorrido multipágina del catálogo (routers.animecatalog): validación del rango
+de páginas y salida NDJSON de crawl_catalog con páginas falsas (sin red).
+"""
+import asyncio
+import json
+
+import pytest
+from fastapi import HTTPException
+
+from routers import animecatalog
+from routers.animecatalog import parse_page_range, crawl_catalog
+
+
+@pytest.mark.parametrize("pages, expected", [
+    ("1-20", (1, 20)),
+    ("3", (3, 3)),
+    (" 2 - 4 ", (2, 4)),
+    ("5-5", (5, 5)),
+])
+def test_parse_page_range(pages, expected):
+    assert parse_page_range(pages) == expected
+
+
+@pytest.mark.parametrize("pages", [
+    "", "a-b", "1-", "-3", "1,2", "0-2", "4-2",
+    f"1-{animecatalog.CATALOG_MAX_PAGES + 1}",  # más páginas de las permitidas
+])
+def test_parse_page_range_errors(pages):
+    with pytest.raises(HTTPException) as exc:
+        parse_page_range(pages)
+    assert exc.value.status_code == 400
+
+
+def run_crawl(monkeypatch, pages, total_pages, delays=None, animes=None, errors=()):
+    """Recorre `pages` con una fetch_catalog_page falsa; devuelve (líneas, páginas terminadas)."""
+    finished = []
+    delays = delays or {}
+
+    async def fake_fetch(url, page, category=None):
+        await asyncio.sleep(delays.get(page, 0))
+        finished.append(page)
+        if page in errors:
+            raise RuntimeError(f"fallo en {page}")
+        return {
+            "url": url, "page": page, "total_results": 0, "total_pages": total_pages,
+            "animes": (animes or {}).get(page, [{"id": str(page)}]),
+        }
+
+    monkeypatch.setattr(animecatalog, "fetch_catalog_page", fake_fetch)
+    urls = {page: f"https://catalogo?page={page}" for page in pages}
+
+    async def scenario():
+        lines = [json.loads(line) async for line in crawl_catalog(urls)]
+        await asyncio.sleep(0.2)  # deja terminar lo que no se haya cancelado
+        return lines
+
+    return asyncio.run(scenario()), finished
+
+
+def test_crawl_emits_pages_in_order(monkeypatch):
+    # Las últimas páginas terminan antes, pero se emiten en el orden del rango
+    lines, _ = run_crawl(monkeypatch, range(1, 5), total_pages=10, delays={1: 0.05, 2: 0.03, 3: 0.01})
+    assert [line["page"] for line in lines] == [1, 2, 3, 4]
+
+
+def test_crawl_dedups_animes_by_id(monkeypatch):
+    animes = {1: [{"id": "a"}, {"id": "b"}], 2: [{"id": "b"}, {"id": "c"}], 3: [{"id": "a"}, {"title": "sin id"}]}
+    lines, _ = run_crawl(monkeypatch, range(1, 4), total_pages=3, animes=animes)
+    assert [[a.get("id") for a in line["animes"]] for line in lines] == [["a", "b"], ["c"], [None]]
+
+
+def test_crawl_cancels_pages_beyond_total(monkeypatch):
+    lines, finished = run_crawl(monkeypatch, range(1, 7), total_pages=2, delays={p: 0.05 for p in range(2, 7)})
+    assert [line["page"] for line in lines] == [1, 2]
+    assert sorted(finished) == [1, 2]
+
+
+def test_crawl_page_error_is_a_line(monkeypatch):
+    lines, _ = run_crawl(monkeypatch, range(1, 4), total_pages=3, errors={2})
+    assert lines[1] == {"page": 2, "url": "https://catalogo?page=2", "error": "fallo en 2"}
+    assert [line["page"] for line in lines] == [1, 2, 3]
@@ -0,0 +1,126 @@
+"""
+Pruebas de BrowserPool (core.browser) con una factoría de navegadores falsa, sin Selenium.
+"""
+import threading
+import time
+
+import pytest
+
+from core.browser import BrowserPool
+
+
+class FakeDriver:
+    def __init__(self, n):
+        self.n = n
+        self.broken = False
+        self.quit_calls = 0
+
+    def execute_script(self, script):
+        if self.broken:
+            raise RuntimeError("navegador caído")
+        return 1
+
+    def quit(self):
+        self.quit_calls += 1
+
+
+class FakeFactory:
+    def __init__(self, delay: float = 0.0, fail: bool = False):
+        self.delay = delay
+        self.fail = fail
+        self.drivers = []
+
+    def __call__(self):
+        if self.delay:
+            time.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError("no arranca")
+        driver = FakeDriver(len(self.drivers))
+        self.drivers.append(driver)
+        return driver
+
+
+def wait_until(condition, timeout: float = 2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condición no alcanzada"
+        time.sleep(0.01)
+
+
+def test_warm_fills_pool_and_leases_reuse_drivers():
+    factory = FakeFactory()
+    pool = BrowserPool(size=2, max_uses=10, lease_timeout=1, factory=factory)
+    pool.warm()
+    assert pool.stats()["alive"] == 2 and pool.stats()["idle"] == 2
+    for _ in range(5):
+        with pool.lease() as driver:
+            assert isinstance(driver, FakeDriver)
+    stats = pool.stats()
+    assert stats["created"] == 2 and stats["leases"] == 5 and stats["alive"] == 2
+
+
+def test_warm_stops_on_failure():
+    factory = FakeFactory(fail=True)
+    pool = BrowserPool(size=3, lease_timeout=1, factory=factory)
+    pool.warm()
+    assert pool.stats()["alive"] == 0 and pool.stats()["starting"] == 0
+
+
+def test_recycles_after_max_uses_in_background():
+    factory = FakeFactory()
+    pool = BrowserPool(size=1, max_uses=2, lease_timeout=1, factory=factory)
+    pool.warm()
+    for _ in range(2):
+        with pool.lease():
+            pass
+    wait_until(lambda: pool.stats()["idle"] == 1)
+    assert factory.drivers[0].quit_calls == 1
+    assert pool.stats()["recycled"] == 1 and pool.stats()["alive"] == 1
+
+
+def test_crashed_driver_is_replaced_on_checkout():
+    factory = FakeFactory()
+    pool = BrowserPool(size=1, lease_timeout=1, factory=factory)
+    pool.warm()
+    factory.drivers[0].broken = True
+    with pool.lease() as driver:
+        assert driver is factory.drivers[1]
+    assert pool.stats()["crashed"] == 1 and pool.stats()["alive"] == 1
+
+
+def test_lease_timeout_is_a_single_deadline():
+    factory = FakeFactory()
+    pool = BrowserPool(size=1, lease_timeout=0.3, factory=factory)
+    pool.warm()
+    held = threading.Event()
+    release = threading.Event()
+
+    def hold():
+        with pool.lease():
+            held.set()
+            release.wait(2)
+
+    holder = threading.Thread(target=hold)
+    holder.start()
+    held.wait(1)
+    start = time.monotonic()
+    with pytest.raises(TimeoutError):
+        with pool.lease():
+            pass
+    elapsed = time.monotonic() - start
+    release.set()
+    holder.join()
+    assert 0.25 <= elapsed < 0.5
+    assert pool.stats()["timeouts"] == 1
+
+
+def test_driver_started_after_close_is_destroyed():
+    factory = FakeFactory(delay=0.2)
+    pool = BrowserPool(size=1, lease_timeout=1, factory=factory)
+    warming = threading.Thread(target=pool.warm)
+    warming.start()
+    time.sleep(0.05)
+    pool.close()
+    warming.join()
+    assert factory.drivers[0].quit_calls == 1
+    assert pool.stats()["alive"] == 0 and pool.stats()["idle"] == 0
@@ -0,0 +1,130 @@
+"""
+Pruebas de la caché en memoria (LRUCache) y de single_flight / cached_fetch de core.cache.
+"""
+import asyncio
+import time
+
+from core import cache as cache_module
+from core.cache import LRUCache, single_flight, cached_fetch, _estimate_size
+
+
+# ---------- LRUCache ----------
+def test_evicts_least_recently_used_by_bytes():
+    value = "x" * 1000
+    size = _estimate_size(value)
+    cache = LRUCache(max_entries=100, max_bytes=size * 3)
+    for key in ("a", "b", "c"):
+        cache.set(key, value, ttl=60)
+    assert cache.get("a") == value  # "a" pasa a ser la más reciente
+    cache.set("d", value, ttl=60)
+    assert cache.get("b") is None
+    assert [cache.get(k) is not None for k in ("a", "c", "d")] == [True, True, True]
+    stats = cache.stats()
+    assert stats["evictions"] == 1 and stats["bytes"] == size * 3
+
+
+def test_evicts_by_entry_count_and_skips_oversized_values():
+    cache = LRUCache(max_entries=2, max_bytes=10_000)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.set("c", 3)
+    assert cache.get("a") is None and cache.get("c") == 3
+    cache.set("big", "x" * 20_000)
+    assert cache.get("big") is None and cache.stats()["entries"] == 2
+
+
+def test_stale_entries_within_grace_and_sweep():
+    cache = LRUCache()
+    cache.set("stale", [1], ttl=0, grace=60)
+    cache.set("gone", [2], ttl=0, grace=0)
+    time.sleep(0.01)
+    assert cache.lookup("stale") == ([1], False)
+    assert cache.lookup("stale", allow_stale=False) == (None, False)
+    assert cache.sweep() == 1  # solo "gone" ha pasado su periodo de gracia
+    stats = cache.stats()
+    assert stats["entries"] == 1 and stats["stale_hits"] == 1 and stats["misses"] == 1
+    assert stats["hit_rate"] == 0.5
+
+
+# ---------- single_flight ----------
+def test_single_flight_one_upstream_call_for_concurrent_callers():
+    calls = 0
+
+    async def fetch():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return {"ok": calls}
+
+    async def scenario():
+        return await asyncio.gather(*(single_flight("sf:shared", fetch) for _ in range(10)))
+
+    results = asyncio.run(scenario())
+    assert calls == 1
+    assert results == [{"ok": 1}] * 10
+
+
+def test_single_flight_shares_exceptions():
+    async def fetch():
+        await asyncio.sleep(0.01)
+        raise ValueError("upstream caído")
+
+    async def scenario():
+        return await asyncio.gather(*(single_flight("sf:error", fetch) for _ in range(3)), return_exceptions=True)
+
+    results = asyncio.run(scenario())
+    assert all(isinstance(r, ValueError) for r in results)
+
+
+def test_cancelled_waiter_does_not_cancel_shared_fetch():
+    done = []
+
+    async def fetch():
+        await asyncio.sleep(0.05)
+        done.append(True)
+        return "valor"
+
+    async def scenario():
+        first = asyncio.ensure_future(single_flight("sf:cancel", fetch))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        # El scrapeo sigue: otra llamada se une a él y recibe su resultado
+        return await single_flight("sf:cancel", fetch), first.cancelled()
+
+    assert asyncio.run(scenario()) == ("valor", True)
+    assert done == [True]
+
+
+def test_speculative_fetch_cancelled_with_its_only_waiter():
+    done = []
+
+    async def fetch():
+        await asyncio.sleep(0.05)
+        done.append(True)
+
+    async def scenario():
+        waiter = asyncio.ensure_future(single_flight("sf:spec", fetch, speculative=True))
+        await asyncio.sleep(0.01)
+        waiter.cancel()
+        await asyncio.sleep(0.1)
+
+    asyncio.run(scenario())
+    assert done == []
+
+
+# ---------- cached_fetch ----------
+def test_cached_fetch_treats_empty_values_as_hits(monkeypatch):
+    monkeypatch.setattr(cache_module, "cache", LRUCache())
+    calls = 0
+
+    async def fetch():
+        nonlocal calls
+        calls += 1
+        await cache_module.set_cache("cf:empty", [])
+        return []
+
+    async def scenario():
+        return [await cached_fetch("cf:empty", fetch) for _ in range(3)]
+
+    assert asyncio.run(scenario()) == [[], [], []]
+    assert calls == 1
@@ -0,0 +1,96 @@
+"""
+Pruebas de RedisBackend / TwoTierBackend contra un cliente falso inyectado (FakeRedis de
+conftest: mismo subconjunto de la API de redis-py que usa core.cache), sin servidor Redis.
+"""
+import asyncio
+import time
+
+from core.cache import RedisBackend, TwoTierBackend, LRUCache, decode_entry
+
+
+def test_roundtrip_and_prefix(fake_redis):
+    client = fake_redis()
+    backend = RedisBackend(prefix="t:", client=client)
+    backend.set("slug", {"title": "Frieren", "episodes": [1, 2, 3]}, ttl=60)
+    assert backend.get("slug") == {"title": "Frieren", "episodes": [1, 2, 3]}
+    assert "t:slug" in client.data
+    assert backend.get("otro") is None
+    assert backend.stats()["hits"] == 1 and backend.stats()["misses"] == 1
+
+
+def test_large_values_are_compressed(fake_redis):
+    backend = RedisBackend(prefix="t:", client=fake_redis())
+    value = {"synopsis": "x" * 10000}
+    backend.set("big", value, ttl=60)
+    raw = backend.client.data["t:big"][0]
+    assert raw[:1] == b"z" and len(raw) < 10000
+    assert decode_entry(raw)[0] == value
+
+
+def test_stale_within_grace(fake_redis):
+    backend = RedisBackend(prefix="t:", client=fake_redis())
+    now = time.time()
+    backend.set_entry("old", [1], expires=now - 1, stale_until=now + 60)
+    assert backend.lookup("old") == ([1], False)
+    assert backend.lookup("old", allow_stale=False) == (None, False)
+    assert backend.stats()["stale_hits"] == 1
+
+
+def test_errors_are_cache_misses(fake_redis):
+    client = fake_redis()
+    backend = RedisBackend(prefix="t:", client=client)
+    client.fail = True
+    backend.set("k", 1)
+    assert backend.get("k") is None
+    assert backend.stats()["errors"] == 2
+
+
+def test_clear_only_touches_prefix(fake_redis):
+    client = fake_redis()
+    client.set("ajeno", b"1")
+    backend = RedisBackend(prefix="t:", client=client)
+    backend.set("a", 1)
+    backend.set("b", 2)
+    backend.clear()
+    assert list(client.data) == ["ajeno"]
+
+
+def test_async_calls_do_not_block_event_loop(fake_redis):
+    backend = RedisBackend(prefix="t:", client=fake_redis(delay=0.2))
+
+    async def scenario():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        task = asyncio.create_task(ticker())
+        await backend.aset("k", {"v": 1}, ttl=60)
+        value = await backend.aget("k")
+        task.cancel()
+        return value, ticks
+
+    value, ticks = asyncio.run(scenario())
+    assert value == {"v": 1}
+    # Dos llamadas de 0.2 s: con el bucle bloqueado el ticker no avanzaría
+    assert ticks >= 10
+
+
+def test_tiered_l1_hit_skips_l2(fake_redis):
+    client = fake_redis()
+    tiered = TwoTierBackend(l1=LRUCache(), l2=RedisBackend(prefix="t:", client=client), l1_ttl=30)
+
+    async def scenario():
+        await tiered.aset("k", [1, 2], ttl=60)
+        calls = client.calls
+        assert await tiered.aget("k") == [1, 2]
+        assert client.calls == calls
+        # Otro worker (L1 vacía) lo encuentra en L2 y lo copia a su L1
+        other = TwoTierBackend(l1=LRUCache(), l2=RedisBackend(prefix="t:", client=client), l1_ttl=30)
+        assert await other.alookup("k") == ([1, 2], True)
+        assert other.l1.get("k") == [1, 2]
+
+    asyncio.run(scenario())
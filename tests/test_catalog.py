@@ -0,0 +1,65 @@
+"""
+Pruebas del parser del catálogo (utils.catalog) sobre scripts con la forma de los payloads
+SvelteKit de /catalogo: nombres de categoría y paginación (payload o HTML).
+"""
+import pytest
+
+from utils.catalog import parse_catalog, category_names, catalog_pagination
+
+SCRIPT = (
+    'g.name="Acción";a.id=1;a.name="TV Anime";b.id=2;b.name="Película";'
+    '__sveltekit_x={data:[null,{type:"data",data:{results:['
+    '{id:1,title:"Uno",categoryId:1,slug:"uno"},'
+    '{id:2,title:"Dos",categoryId:2,slug:"dos"},'
+    '{id:3,title:"Tres",categoryId:9,slug:"tres"}'
+    '],total:45,perPage:20}}]}'
+)
+
+
+def test_category_names_by_id_and_fallback_from_a():
+    assert category_names(SCRIPT) == {None: "TV Anime", 1: "TV Anime", 2: "Película"}
+
+
+def test_fallback_name_only_comes_from_a():
+    # Un .name de otra variable (un género) no sirve como nombre de categoría por defecto
+    assert category_names('g.name="Acción";b.id=2;b.name="Película"') == {2: "Película"}
+    animes, _, _ = parse_catalog("", 'g.name="Acción";x={data:{results:[{id:3,categoryId:9}]}}')
+    assert animes[0]["category"]["name"] == "Unknown"
+
+
+def test_parse_catalog_categories_and_payload_pagination():
+    animes, total, pages = parse_catalog("<p>999 Resultados</p>", SCRIPT)
+    assert [a["id"] for a in animes] == ["1", "2", "3"]
+    assert [a["category"]["name"] for a in animes] == ["TV Anime", "Película", "TV Anime"]
+    assert [a["category"]["slug"] for a in animes] == ["tv-anime", "pelicula", "tv-anime"]
+    assert animes[0]["cover"] == "https://cdn.animeav1.com/covers/1.jpg"
+    # El payload manda sobre el HTML; las páginas salen de total / perPage
+    assert (total, pages) == (45, 3)
+
+
+def test_parse_catalog_fixed_category_slug():
+    animes, _, _ = parse_catalog("", SCRIPT, category=["ova"])
+    assert {a["category"]["slug"] for a in animes} == {"ova"}
+
+
+@pytest.mark.parametrize("data, expected", [
+    ({"total": 45, "totalPages": 4}, (45, 4)),
+    ({"pagination": {"total_results": 30, "per_page": 20}}, (30, 2)),
+    ({"meta": {"count": 12, "lastPage": 1}}, (12, 1)),
+    ({"total": True, "pages": 2.0}, (999, 2)),  # los booleanos no son números
+])
+def test_catalog_pagination_from_payload(data, expected):
+    assert catalog_pagination(data, "<p>999 Resultados</p>", 20) == expected
+
+
+def test_catalog_pagination_from_html():
+    html = (
+        '<p>41 Resultados</p>'
+        '<a href="/catalogo?page=2">2</a><a class="btn" href="/catalogo?order=x&page=3"> 3 </a>'
+        '<a href="/anime/uno">7</a>'
+    )
+    assert catalog_pagination({}, html, 20) == (41, 3)
+
+
+def test_catalog_pagination_without_any_source():
+    assert catalog_pagination({}, "<p>sin datos</p>", 7) == (7, 1)
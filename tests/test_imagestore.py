@@ -0,0 +1,104 @@
+"""
+Pruebas de la caché de imágenes en disco (core.imagestore) sobre un directorio temporal.
+"""
+import asyncio
+import os
+
+from core.imagestore import DiskImageStore, image_key
+
+HEADERS = {"content-type": "image/webp", "etag": '"abc"', "set-cookie": "no-se-guarda"}
+
+
+def save(store, url, data: bytes, chunk: int = 4, buffer_size: int = 8, expected_size=None):
+    """Escribe `data` en trozos como hace el proxy y devuelve el writer."""
+    writer = store.writer(url, HEADERS)
+    writer.buffer_size = buffer_size
+
+    async def scenario():
+        for i in range(0, len(data), chunk):
+            await writer.write(data[i:i + chunk])
+        await writer.commit(expected_size=len(data) if expected_size is None else expected_size)
+
+    asyncio.run(scenario())
+    return writer
+
+
+def tmp_files(store):
+    return os.listdir(os.path.join(store.root, "tmp"))
+
+
+def test_commit_publishes_image_and_meta(tmp_path):
+    store = DiskImageStore(root=str(tmp_path), max_bytes=10_000, max_file_bytes=1_000)
+    writer = save(store, "https://img/1.webp", b"0123456789abcdefghij")
+    assert writer.committed
+    path, meta = store.lookup("https://img/1.webp")
+    key = image_key("https://img/1.webp")
+    assert path == os.path.join(str(tmp_path), key[:2], key[2:4], key)
+    with open(path, "rb") as f:
+        assert f.read() == b"0123456789abcdefghij"
+    assert meta == {"content-type": "image/webp", "etag": '"abc"'}
+    assert tmp_files(store) == []
+    assert store.stats()["writes"] == 1 and store.stats()["hits"] == 1
+
+
+def test_truncated_download_is_not_published(tmp_path):
+    store = DiskImageStore(root=str(tmp_path), max_bytes=10_000, max_file_bytes=1_000)
+    writer = save(store, "https://img/2.webp", b"0123456789abcdefghij", expected_size=99)
+    assert not writer.committed and writer.failed
+    assert store.lookup("https://img/2.webp") is None
+    assert tmp_files(store) == []
+
+
+def test_abort_removes_partial_temp_file(tmp_path):
+    store = DiskImageStore(root=str(tmp_path), max_bytes=10_000, max_file_bytes=1_000)
+    writer = store.writer("https://img/3.webp", HEADERS)
+    writer.buffer_size = 4
+
+    async def scenario():
+        await writer.write(b"01234567")  # ya hay un temporal en disco
+        assert len(tmp_files(store)) == 1
+        writer.abort()  # cliente desconectado
+
+    asyncio.run(scenario())  # asyncio.run espera al executor donde corre la limpieza
+    assert tmp_files(store) == []
+    assert not store.contains("https://img/3.webp")
+
+
+def test_oversized_image_is_not_cached(tmp_path):
+    store = DiskImageStore(root=str(tmp_path), max_bytes=10_000, max_file_bytes=10)
+    writer = save(store, "https://img/big.webp", b"x" * 32)
+    assert writer.failed and not store.contains("https://img/big.webp")
+    assert tmp_files(store) == []
+
+
+def test_evicts_least_recently_used_past_max_bytes(tmp_path):
+    data = b"x" * 100
+    meta_size = len(b'{"content-type": "image/webp", "etag": "\\"abc\\""}')
+    store = DiskImageStore(root=str(tmp_path), max_bytes=3 * (100 + meta_size), max_file_bytes=1_000)
+    for n in range(3):
+        save(store, f"https://img/{n}.webp", data, chunk=50, buffer_size=64)
+    assert store.lookup("https://img/0.webp") is not None  # 0 pasa a ser la más reciente
+    save(store, "https://img/3.webp", data, chunk=50, buffer_size=64)
+    assert [store.contains(f"https://img/{n}.webp") for n in range(4)] == [True, False, True, True]
+    evicted = store._path(image_key("https://img/1.webp"))
+    assert not os.path.exists(evicted) and not os.path.exists(evicted + ".meta")
+    assert store.stats()["evictions"] == 1 and store.stats()["bytes"] <= store.max_bytes
+
+
+def test_load_rebuilds_index_from_disk(tmp_path):
+    store = DiskImageStore(root=str(tmp_path), max_bytes=10_000, max_file_bytes=1_000)
+    for n in range(3):
+        save(store, f"https://img/{n}.webp", b"y" * 10)
+    # El orden LRU sale del mtime: la 0 es la más reciente
+    for n, mtime in enumerate((3_000, 1_000, 2_000)):
+        os.utime(store._path(image_key(f"https://img/{n}.webp")), (mtime, mtime))
+    with open(os.path.join(store.root, "tmp", "interrumpida"), "wb") as f:
+        f.write(b"a medias")
+
+    reloaded = DiskImageStore(root=str(tmp_path), max_bytes=10_000, max_file_bytes=1_000)
+    reloaded.load()
+    assert list(reloaded._index) == [image_key(f"https://img/{n}.webp") for n in (1, 2, 0)]
+    assert reloaded.stats()["bytes"] == store.stats()["bytes"]
+    assert tmp_files(reloaded) == []
+    path, meta = reloaded.lookup("https://img/2.webp")
+    assert meta["content-type"] == "image/webp"
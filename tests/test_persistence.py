@@ -0,0 +1,63 @@
+"""
+Pruebas de PersistenceQueue: fusión de trabajos con la misma clave, políticas de desbordamiento
+y contador de fallos, con funciones de guardado falsas (sin base de datos).
+"""
+import asyncio
+
+from core.persistence import PersistenceQueue
+
+
+def run_queue(queue: PersistenceQueue, jobs):
+    """Encola `jobs` (clave, payload) de golpe, espera a que se procesen y devuelve lo guardado."""
+    saved = []
+
+    async def save(payload):
+        saved.append(payload)
+
+    async def scenario():
+        results = [queue.submit(key, save, payload) for key, payload in jobs]
+        await queue.stop(timeout=2)
+        return results
+
+    return asyncio.run(scenario()), saved
+
+
+def test_duplicate_key_keeps_latest_payload():
+    queue = PersistenceQueue(maxsize=10, workers=1)
+    results, saved = run_queue(queue, [("details:a", 1), ("details:b", 2), ("details:a", 3)])
+    assert results == [True, True, True]
+    assert saved == [3, 2]
+    stats = queue.stats()
+    assert stats["merged"] == 1 and stats["enqueued"] == 2 and stats["processed"] == 2
+
+
+def test_drop_oldest_when_full():
+    queue = PersistenceQueue(maxsize=2, workers=1, overflow="drop_oldest")
+    results, saved = run_queue(queue, [("a", 1), ("b", 2), ("c", 3)])
+    assert results == [True, True, True]
+    assert saved == [2, 3]
+    assert queue.stats()["dropped"] == 1
+
+
+def test_drop_new_when_full():
+    queue = PersistenceQueue(maxsize=2, workers=1, overflow="drop_new")
+    results, saved = run_queue(queue, [("a", 1), ("b", 2), ("c", 3)])
+    assert results == [True, True, False]
+    assert saved == [1, 2]
+    assert queue.stats()["dropped"] == 1
+
+
+def test_failed_save_is_counted():
+    queue = PersistenceQueue(maxsize=10, workers=1)
+
+    def save(payload):
+        raise ValueError("sin conexión")
+
+    async def scenario():
+        queue.submit("episode:a:1", save, {})
+        await queue.stop(timeout=2)
+
+    asyncio.run(scenario())
+    stats = queue.stats()
+    assert stats["failed"] == 1 and stats["processed"] == 0
+    assert stats["last_error"] == "episode:a:1: sin conexión"
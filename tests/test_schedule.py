@@ -0,0 +1,43 @@
+"""
+Pruebas de schedule_slot (routers.animeschedule) con las entradas del horario de data.txt:
+el día y la hora salen de latestEpisode.createdAt convertido a SCHEDULE_TZ.
+"""
+from datetime import datetime, timezone
+
+import pytest
+
+from routers import animeschedule
+from routers.animeschedule import schedule_slot
+
+# Momento en que se capturó la respuesta de ejemplo de data.txt
+NOW = datetime(2025, 9, 9, 12, 0, tzinfo=timezone.utc)
+
+
+@pytest.fixture(autouse=True)
+def schedule_config(monkeypatch):
+    monkeypatch.setattr(animeschedule, "SCHEDULE_TZ", "Europe/Madrid")
+    monkeypatch.setattr(animeschedule, "SCHEDULE_DELAY_DAYS", 7)
+
+
+@pytest.mark.parametrize("created_at, now, day, time", [
+    # Muestras de /api/horario en data.txt (horario de verano, UTC+2)
+    ("2025-09-07T20:05:46.909688+00:00", NOW, "Domingo", "10:05 pm"),
+    ("2025-09-03T18:48:55.47068+00:00", NOW, "Miércoles", "08:48 pm"),
+    ("2025-08-14T13:15:22.200847+00:00", NOW, "Jueves", "Retrasado - 03:15 pm"),
+    # Formato de Postgres sin "T" (createdAt de data.txt)
+    ("2025-09-08 22:19:17.278597+00", NOW, "Martes", "12:19 am"),
+    # Cambio de hora en Madrid (26/10/2025): la misma hora UTC cae en otro día antes y después
+    ("2025-10-25T22:30:00+00:00", datetime(2025, 10, 27, tzinfo=timezone.utc), "Domingo", "12:30 am"),
+    ("2025-10-26T22:30:00+00:00", datetime(2025, 10, 27, tzinfo=timezone.utc), "Domingo", "11:30 pm"),
+    # Retraso contado sobre instantes reales aunque entre medias cambie la hora
+    ("2025-10-19T22:30:00+00:00", datetime(2025, 10, 27, tzinfo=timezone.utc), "Lunes", "Retrasado - 12:30 am"),
+])
+def test_schedule_slot_from_latest_episode(created_at, now, day, time):
+    slot = schedule_slot({"id": 2151, "latestEpisode": {"id": 1, "number": 9, "createdAt": created_at}}, now=now)
+    assert (slot["day"], slot["time"]) == (day, time)
+    assert slot["poster"] == "https://cdn.animeav1.com/covers/2151.jpg"
+
+
+def test_schedule_slot_without_latest_episode_uses_start_date():
+    slot = schedule_slot({"id": 2271, "startDate": "2025-07-24", "latestEpisode": None}, now=NOW)
+    assert (slot["day"], slot["time"]) == ("Jueves", None)
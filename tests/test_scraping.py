@@ -0,0 +1,95 @@
+"""
+Pruebas de utils.scraping: localización del script de datos de SvelteKit en el HTML y
+extracción de bloques `nombre:{...}` / `nombre:[...]` de ese script.
+"""
+import pytest
+
+from utils import scraping
+from utils.scraping import (
+    find_js_blocks, extract_js_object, extract_js_array, extract_data_block,
+    extract_sveltekit_script, get_sveltekit_script,
+)
+
+SCRIPT = (
+    '{media:{title:"a } { ] [",eps:[{n:1},{n:2}],note:\'}\',tpl:`]`},'
+    'data:[1,[2,3]],other:{media:{inner:1}}}'
+)
+
+
+def span_text(text, span):
+    return text[span[0]:span[1]]
+
+
+def test_find_js_blocks_all_occurrences_in_order():
+    found = find_js_blocks(SCRIPT, ["media", "data"])
+    assert [span_text(SCRIPT, s) for s in found["media"]] == [
+        '{title:"a } { ] [",eps:[{n:1},{n:2}],note:\'}\',tpl:`]`}',
+        "{inner:1}",
+    ]
+    assert [span_text(SCRIPT, s) for s in found["data"]] == ["[1,[2,3]]"]
+
+
+def test_find_js_blocks_first_only():
+    found = find_js_blocks(SCRIPT, ["media", "data"], first_only=True)
+    assert len(found["media"]) == 1 and span_text(SCRIPT, found["media"][0]).startswith("{title:")
+
+
+def test_find_js_blocks_ignores_suffixes_and_attributes():
+    assert find_js_blocks("{xmedia:{a:1},m.media:{b:1}}", ["media"]) == {"media": []}
+
+
+def test_braces_inside_strings_do_not_count():
+    assert extract_js_object(SCRIPT, "media:").endswith("tpl:`]`}")
+
+
+def test_nested_blocks():
+    assert extract_js_array(SCRIPT, "eps") == "[{n:1},{n:2}]"
+    assert extract_js_array(SCRIPT, "data") == "[1,[2,3]]"
+    # Desde `pos` se salta el primer media y se encuentra el anidado en other
+    found = find_js_blocks(SCRIPT, ["media"], pos=SCRIPT.index("other"), first_only=True)
+    assert [span_text(SCRIPT, s) for s in found["media"]] == ["{inner:1}"]
+
+
+@pytest.mark.parametrize("call", [
+    lambda: extract_js_object(SCRIPT, "missing:"),
+    lambda: extract_js_array(SCRIPT, "media"),  # existe, pero como objeto
+    lambda: extract_js_object("{media:{a:[1,2}", "media:"),  # sin cerrar
+])
+def test_missing_or_unclosed_block_raises(call):
+    with pytest.raises(ValueError):
+        call()
+
+
+def test_extract_data_block_picks_innermost_container():
+    script = '{data:{nodes:[{data:{featured:[1],x:2}}]}}'
+    assert extract_data_block(script, "featured") == "{featured:[1],x:2}"
+
+
+# ---------- script de datos de SvelteKit ----------
+PAGE = (
+    '<html><head><script src="app.js" data-x="__sveltekit"></script><script>var a = 1</script></head>'
+    '<body><script type="module">\n__sveltekit_abc = {data:[1]};\n</script></body></html>'
+)
+
+
+def test_extract_sveltekit_script_fast_path():
+    # El marcador en un atributo no cuenta; se devuelve el contenido del script que lo contiene
+    assert extract_sveltekit_script(PAGE) == "\n__sveltekit_abc = {data:[1]};\n"
+    assert get_sveltekit_script(PAGE) == "\n__sveltekit_abc = {data:[1]};\n"
+
+
+@pytest.mark.parametrize("html", [
+    "<SCRIPT>__sveltekit_x = {a:1}</SCRIPT>",  # etiqueta en mayúsculas
+    "<script>__sveltekit_x = {a:1}",  # script sin cerrar
+])
+def test_get_sveltekit_script_falls_back_to_parser(html, monkeypatch):
+    calls = []
+    real_parse_html = scraping.parse_html
+    monkeypatch.setattr(scraping, "parse_html", lambda text: calls.append(text) or real_parse_html(text))
+    assert extract_sveltekit_script(html) is None
+    assert get_sveltekit_script(html) == "__sveltekit_x = {a:1}"
+    assert calls == [html]
+
+
+def test_get_sveltekit_script_without_marker():
+    assert get_sveltekit_script("<p>nada</p>") is None
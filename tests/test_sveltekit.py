@@ -0,0 +1,44 @@
+"""
+Pruebas del decodificador de literales JS de SvelteKit (utils.sveltekit): cada caso es un
+literal tal como aparece en los payloads y el objeto Python que debe salir.
+"""
+import pytest
+
+from utils.sveltekit import decode_js, js_to_json
+
+
+@pytest.mark.parametrize("text, expected", [
+    # Claves sin comillas, incluidas las numéricas y con $ / _
+    ('{id:1,title:"Frieren",0:"x",$k:true,_k:false}',
+     {"id": 1, "title": "Frieren", "0": "x", "$k": True, "_k": False}),
+    # Puntuación y "clave:" dentro de strings no se tocan
+    ('{synopsis:"a {b} ] [c, key: d,}",n:1}', {"synopsis": "a {b} ] [c, key: d,}", "n": 1}),
+    ("{a:'x {y} key: z'}", {"a": "x {y} key: z"}),
+    # Comillas simples, con escapes de comilla simple y comillas dobles dentro
+    ("{a:'it\\'s \"ok\"'}", {"a": 'it\'s "ok"'}),
+    ("['uno','dos']", ["uno", "dos"]),
+    # undefined / void 0 -> null
+    ("{a:undefined,b:void 0,c:null}", {"a": None, "b": None, "c": None}),
+    # new Date("...") -> el string ISO; con timestamp numérico -> null
+    ('{d:new Date("2024-05-01T10:00:00Z")}', {"d": "2024-05-01T10:00:00Z"}),
+    ("{d:new Date(1714557600000)}", {"d": None}),
+    # Infinity / -Infinity / NaN no existen en JSON -> null
+    ("{a:-Infinity,b:Infinity,c:NaN}", {"a": None, "b": None, "c": None}),
+    # \xHH y continuación de línea dentro de strings
+    ('{a:"\\x41\\x42c"}', {"a": "ABc"}),
+    ("{a:'\\x41'}", {"a": "A"}),
+    ('{a:"uno \\\ndos"}', {"a": "uno dos"}),
+    # Escapes JSON normales pasan tal cual
+    ('{a:"l1\\nl2 \\"q\\" \\\\"}', {"a": 'l1\nl2 "q" \\'}),
+    # Comas finales en arrays y objetos
+    ("{a:[1,2,],b:{c:1,},}", {"a": [1, 2], "b": {"c": 1}}),
+    ("[ 1 , 2 , ]", [1, 2]),
+    # Números con punto inicial o final
+    ("{a:1.,b:.5,c:-.5,d:1e3,e:-2}", {"a": 1.0, "b": 0.5, "c": -0.5, "d": 1000.0, "e": -2}),
+])
+def test_decode_js(text, expected):
+    assert decode_js(text) == expected
+
+
+def test_js_to_json_only_rewrites_non_json_tokens():
+    assert js_to_json('{a:"x",b:[1,2,],c:undefined}') == '{"a":"x","b":[1,2],"c":null}'
@@ -0,0 +1,111 @@
+"""
+Pruebas de ViewerRegistry (core.viewers): resolución por prefijo, TTL deslizante, expulsión
+LRU con on_evict y registro compartido entre workers (FakeRedis de conftest).
+"""
+import asyncio
+import time
+
+from core.cache import RedisBackend
+from core.viewers import ViewerRegistry
+
+
+def test_viewer_registry_shared_between_workers(fake_redis):
+    client = fake_redis()
+    a = ViewerRegistry(ttl=60, backend=RedisBackend(prefix="v:", client=client))
+    b = ViewerRegistry(ttl=60, backend=RedisBackend(prefix="v:", client=client))
+
+    async def scenario():
+        viewer_id = await a.new_id()
+        await a.register(viewer_id, {"chapter_title": "cap_1", "images": ["1.webp"]})
+        assert await b.resolve_prefix(viewer_id[:8]) == viewer_id
+        assert (await b.get(viewer_id))["chapter_title"] == "cap_1"
+        assert b.stats()["shared_hits"] == 1
+        await a.remove(viewer_id)
+        assert await a.get(viewer_id) is None
+        return viewer_id
+
+    viewer_id = asyncio.run(scenario())
+    assert f"v:id:{viewer_id}" not in client.data
+
+
+def test_memory_registry_resolves_prefix():
+    registry = ViewerRegistry(ttl=60)
+
+    async def scenario():
+        viewer_id = await registry.new_id()
+        await registry.register(viewer_id, {"chapter_title": "x"})
+        return await registry.resolve_prefix(viewer_id[:8]) == viewer_id
+
+    assert asyncio.run(scenario())
+
+
+def test_sliding_ttl_expiry_calls_on_evict():
+    evicted = []
+    registry = ViewerRegistry(ttl=0.2, on_evict=evicted.append)
+
+    async def scenario():
+        viewer_id = await registry.new_id()
+        await registry.register(viewer_id, {"chapter_title": "x"})
+        # Cada uso renueva el TTL: sigue vivo más allá de los 0.2 s desde que se creó
+        for _ in range(3):
+            await asyncio.sleep(0.1)
+            assert await registry.get(viewer_id) is not None
+        await asyncio.sleep(0.25)
+        assert await registry.get(viewer_id) is None
+        return viewer_id
+
+    viewer_id = asyncio.run(scenario())
+    assert evicted == [viewer_id]
+    assert registry.stats()["expired"] == 1 and len(registry) == 0
+
+
+def test_sweep_purges_expired_viewers():
+    evicted = []
+    registry = ViewerRegistry(ttl=0.05, on_evict=evicted.append)
+
+    async def scenario():
+        ids = [await registry.new_id() for _ in range(3)]
+        for viewer_id in ids:
+            await registry.register(viewer_id, {})
+        return ids
+
+    ids = asyncio.run(scenario())
+    time.sleep(0.1)
+    assert registry.sweep() == 3
+    assert sorted(evicted) == sorted(ids)
+
+
+def test_lru_eviction_past_max_entries_calls_on_evict():
+    evicted = []
+    registry = ViewerRegistry(ttl=60, max_entries=2, on_evict=evicted.append)
+
+    async def scenario():
+        a, b, c = [await registry.new_id() for _ in range(3)]
+        await registry.register(a, {"n": 1})
+        await registry.register(b, {"n": 2})
+        await registry.get(a)  # b pasa a ser el menos usado
+        await registry.register(c, {"n": 3})
+        assert await registry.get(b) is None
+        assert await registry.resolve_prefix(b[:8]) is None
+        assert (await registry.get(a))["n"] == 1
+        return b
+
+    b = asyncio.run(scenario())
+    assert evicted == [b]
+    assert registry.stats()["evicted"] == 1
+
+
+def test_on_evict_errors_do_not_break_registry():
+    def on_evict(viewer_id):
+        raise RuntimeError("fallo al cancelar la precarga")
+
+    registry = ViewerRegistry(ttl=60, max_entries=1, on_evict=on_evict)
+
+    async def scenario():
+        a, b = await registry.new_id(), await registry.new_id()
+        await registry.register(a, {})
+        await registry.register(b, {})
+        await registry.remove(b)
+        return len(registry)
+
+    assert asyncio.run(scenario()) == 0
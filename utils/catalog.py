@@ -0,0 +1,111 @@
+import re
+from utils.scraping import extract_data_block, extract_js_array
+from utils.sveltekit import decode_js
+
+# Parser de las páginas del catálogo de animeav1 (/catalogo). Todo sale del payload SvelteKit
+# decodificado de una vez; el HTML solo se consulta con regex si el payload no trae la paginación.
+
+CATEGORY_SLUGS = {1: "tv-anime", 2: "pelicula", 3: "ova", 4: "especial"}
+# Empiezan por un literal (".name=") para que el motor de regex salte directamente a los candidatos
+CATEGORY_NAME_RE = re.compile(r"\.name=\"([^\"]+)\"")
+CATEGORY_ID_RE = re.compile(r"\.id=(\d+)")
+TRAILING_IDENT_RE = re.compile(r"([A-Za-z_$][\w$]*)$")
+RESULTS_COUNT_RE = re.compile(r"(\d+) Resultados")
+PAGE_LINK_RE = re.compile(r"<a\b[^>]*\bhref=\"[^\"]*page=[^\"]*\"[^>]*>\s*(\d+)\s*</a>")
+TOTAL_KEYS = ("total", "totalResults", "total_results", "count")
+PAGES_KEYS = ("totalPages", "total_pages", "pages", "lastPage", "last_page", "pageCount")
+PER_PAGE_KEYS = ("perPage", "per_page", "pageSize", "limit")
+
+def category_names(script: str) -> dict:
+    """
+    Nombres de categoría declarados en el script (`a.name="TV Anime"`), calculados una sola
+    vez por página: {categoryId: nombre} cuando la variable también tiene `a.id=N`, y None con
+    el primer `a.name` (lo que se usaba antes para todos los animes). La clave None se limita
+    a la variable `a` como el regex anterior: otros `.name=` del script (géneros, etc.) no valen.
+    """
+    def owner(m):
+        ident = TRAILING_IDENT_RE.search(script, max(0, m.start() - 64), m.start())
+        return ident.group(1) if ident else None
+
+    ids = {owner(m): int(m.group(1)) for m in CATEGORY_ID_RE.finditer(script)}
+    names = {}
+    for m in CATEGORY_NAME_RE.finditer(script):
+        name = m.group(1)
+        var = owner(m)
+        if var == "a":
+            names.setdefault(None, name)
+        if var in ids:
+            names.setdefault(ids[var], name)
+    return names
+
+def _first_int(data: dict, keys) -> int:
+    for source in (data, data.get("pagination"), data.get("meta")):
+        if isinstance(source, dict):
+            for key in keys:
+                value = source.get(key)
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    return int(value)
+    return None
+
+def catalog_pagination(data: dict, html: str, count: int):
+    """
+    (total_results, total_pages) a partir del payload; si no trae esos campos, con dos regex
+    sobre el HTML ("N Resultados" y los enlaces numerados de paginación), sin construir DOM.
+    """
+    total = _first_int(data, TOTAL_KEYS)
+    pages = _first_int(data, PAGES_KEYS)
+    per_page = _first_int(data, PER_PAGE_KEYS)
+    if pages is None and total is not None and per_page:
+        pages = -(-total // per_page)
+    if total is None:
+        m = RESULTS_COUNT_RE.search(html)
+        total = int(m.group(1)) if m else count
+    if pages is None:
+        links = [int(n) for n in PAGE_LINK_RE.findall(html)]
+        pages = max(links) if links else 1
+    return total, pages
+
+def parse_catalog(html: str, script: str, category: list[str] = None):
+    """
+    Parser del catálogo en una sola pasada estructural: se localiza el objeto `data:{...}` que
+    contiene `results:` y se decodifica entero con decode_js (sin trocear por "},{" ni un regex
+    por campo). Devuelve (animes, total_results, total_pages).
+    """
+    try:
+        data = decode_js(extract_data_block(script, "results"))
+    except ValueError:
+        data = {"results": decode_js(extract_js_array(script, "results"))}
+    results = data.get("results") if isinstance(data, dict) else None
+    if not isinstance(results, list):
+        raise ValueError("'results' no es una lista")
+
+    names = category_names(script)
+    fixed_slug = category[0] if category and len(category) == 1 else None
+    animes = []
+    for item in results:
+        if not isinstance(item, dict):
+            continue
+        anime = {}
+        if item.get("id") is not None:
+            anime_id = str(item["id"])
+            anime["id"] = anime_id
+            anime["cover"] = f"https://cdn.animeav1.com/covers/{anime_id}.jpg"
+        for key in ("title", "synopsis"):
+            if item.get(key) is not None:
+                anime[key] = item[key]
+        category_id = item.get("categoryId")
+        if isinstance(category_id, int):
+            anime["categoryId"] = category_id
+        if item.get("slug") is not None:
+            anime["slug"] = item["slug"]
+        if not anime:
+            continue
+        anime["category"] = {
+            "id": anime.get("categoryId"),
+            "name": names.get(anime.get("categoryId"), names.get(None, "Unknown")),
+            "slug": fixed_slug or CATEGORY_SLUGS.get(anime.get("categoryId"), "tv-anime"),
+        }
+        animes.append(anime)
+
+    total_results, total_pages = catalog_pagination(data, html, len(animes))
+    return animes, total_results, total_pages
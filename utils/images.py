@@ -0,0 +1,145 @@
+import asyncio
+import logging
+import httpx
+from fastapi import HTTPException, Request, Response
+from fastapi.responses import FileResponse, StreamingResponse
+from starlette.background import BackgroundTask
+from core.config import IMAGE_CACHE_ENABLED, IMAGE_CACHE_CONTROL
+from core.http import get_image_client
+from core.imagestore import DiskImageStore, image_store
+
+logger = logging.getLogger(__name__)
+
+# Cabeceras de la petición del cliente que se reenvían al origen (rangos y peticiones condicionales)
+FORWARD_REQUEST_HEADERS = ("range", "if-range", "if-none-match", "if-modified-since")
+# Cabeceras de la respuesta del origen que se devuelven tal cual
+FORWARD_RESPONSE_HEADERS = (
+    "content-type", "content-length", "content-range", "content-encoding", "accept-ranges",
+    "etag", "last-modified", "cache-control", "expires",
+)
+RETRY_STATUS = {429, 500, 502, 503, 504}
+RETRIES = 3
+RETRY_BACKOFF = 0.5  # segundos, se duplica en cada intento
+
+
+async def open_upstream(url: str, headers: dict) -> httpx.Response:
+    """
+    Abre la respuesta del origen en modo stream (sin leer el cuerpo), reintentando errores
+    de red y 429/5xx con backoff exponencial. Quien la recibe debe cerrarla (aclose).
+    """
+    client = get_image_client()
+    for attempt in range(RETRIES + 1):
+        try:
+            response = await client.send(client.build_request("GET", url, headers=headers), stream=True)
+        except httpx.TransportError as e:
+            if attempt == RETRIES:
+                raise HTTPException(status_code=502, detail=f"No se pudo obtener la imagen: {e}")
+        else:
+            if response.status_code not in RETRY_STATUS or attempt == RETRIES:
+                return response
+            await response.aclose()
+        await asyncio.sleep(RETRY_BACKOFF * 2 ** attempt)
+
+
+async def stream_image(url: str, headers: dict, request: Request = None, store: DiskImageStore = None) -> Response:
+    """
+    Proxy en streaming de una imagen: reenvía Range/condicionales, pasa el cuerpo a trozos
+    según llega (nunca entero en memoria) y conserva Content-Length, ETag, Cache-Control...
+    Si el cliente se desconecta, Starlette cancela el iterador y se cierra la conexión al origen.
+    Con `store`, las respuestas 200 completas se copian a la vez a la caché en disco.
+    """
+    headers = dict(headers)
+    if request is not None:
+        for name in FORWARD_REQUEST_HEADERS:
+            if name in request.headers:
+                headers[name] = request.headers[name]
+
+    upstream = await open_upstream(url, headers)
+    forwarded = {k: upstream.headers[k] for k in FORWARD_RESPONSE_HEADERS if k in upstream.headers}
+
+    if upstream.status_code == 304:
+        await upstream.aclose()
+        return Response(status_code=304, headers=forwarded)
+    if upstream.status_code not in (200, 206):
+        await upstream.aclose()
+        raise HTTPException(status_code=400, detail=f"No se pudo obtener la imagen: Código de estado {upstream.status_code}")
+
+    writer = store.writer(url, upstream.headers) if store is not None and upstream.status_code == 200 else None
+    expected = int(upstream.headers["content-length"]) if "content-length" in upstream.headers else None
+
+    async def body():
+        try:
+            async for chunk in upstream.aiter_raw():
+                if writer is not None:
+                    await writer.write(chunk)
+                yield chunk
+            if writer is not None:
+                await writer.commit(expected)
+        finally:
+            if writer is not None:
+                writer.abort()  # no hace nada si ya se publicó
+            await upstream.aclose()
+
+    media_type = forwarded.pop("content-type", "image/webp")
+    return StreamingResponse(
+        body(),
+        status_code=upstream.status_code,
+        headers=forwarded,
+        media_type=media_type,
+        background=BackgroundTask(upstream.aclose),
+    )
+
+
+async def fetch_to_store(url: str, headers: dict, store: DiskImageStore = image_store) -> bool:
+    """Descarga una imagen directamente a la caché en disco (precarga). True si quedó guardada."""
+    upstream = await open_upstream(url, headers)
+    try:
+        if upstream.status_code != 200:
+            return False
+        writer = store.writer(url, upstream.headers)
+        expected = int(upstream.headers["content-length"]) if "content-length" in upstream.headers else None
+        try:
+            async for chunk in upstream.aiter_raw():
+                await writer.write(chunk)
+            await writer.commit(expected)
+        finally:
+            writer.abort()
+        return writer.committed
+    finally:
+        await upstream.aclose()
+
+
+def _not_modified(request: Request, meta: dict) -> bool:
+    if request is None:
+        return False
+    etag = meta.get("etag")
+    if etag and request.headers.get("if-none-match"):
+        return etag in (t.strip() for t in request.headers["if-none-match"].split(","))
+    last_modified = meta.get("last-modified")
+    return bool(last_modified) and request.headers.get("if-modified-since") == last_modified
+
+
+async def serve_image(url: str, headers: dict, request: Request = None, store: DiskImageStore = image_store) -> Response:
+    """
+    Sirve una imagen remota pasando por la caché en disco: los aciertos salen con FileResponse
+    (sendfile, Range incluido) y los fallos se proxifican en streaming guardándose por el camino.
+    La cabecera X-Cache (HIT/MISS) indica de dónde salió.
+    Vale para cualquier URL absoluta: páginas de manga (dir_path + filename) o los posters,
+    backdrops y miniaturas de utils/builders.py.
+    """
+    if not IMAGE_CACHE_ENABLED or store is None:
+        return await stream_image(url, headers, request)
+
+    hit = await asyncio.to_thread(store.lookup, url)
+    if hit is None:
+        response = await stream_image(url, headers, request, store=store)
+        response.headers["x-cache"] = "MISS"
+        return response
+
+    path, meta = hit
+    response_headers = {k: v for k, v in meta.items() if k != "content-type"}
+    response_headers["x-cache"] = "HIT"
+    response_headers.setdefault("cache-control", IMAGE_CACHE_CONTROL)
+    if _not_modified(request, meta):
+        return Response(status_code=304, headers=response_headers)
+    return FileResponse(path, media_type=meta.get("content-type", "image/webp"), headers=response_headers)
@@ -0,0 +1,8 @@
+import orjson
+
+MEDIA_TYPE = "application/x-ndjson"
+
+
+def dumps_line(item: dict) -> bytes:
+    """Una línea NDJSON (objeto JSON + salto de línea) para las respuestas en streaming."""
+    return orjson.dumps(item, default=str) + b"\n"
@@ -0,0 +1,82 @@
+import importlib.util
+import logging
+from bs4 import BeautifulSoup, SoupStrainer
+from core.config import HTML_PARSER
+
+try:
+    from bs4.filter import ElementFilter  # bs4 >= 4.13
+except ImportError:
+    ElementFilter = None
+
+logger = logging.getLogger(__name__)
+
+# ===========================
+# Backend del parser
+# ===========================
+_PARSER_MODULES = {"lxml": "lxml", "html5lib": "html5lib", "html.parser": None}
+
+
+def resolve_parser(name: str = HTML_PARSER) -> str:
+    """Nombre de parser utilizable por BeautifulSoup; cae a html.parser si falta la librería."""
+    module = _PARSER_MODULES.get(name, name)
+    if module is None or importlib.util.find_spec(module) is not None:
+        return name
+    logger.warning(f"[PARSER] '{name}' no está instalado; usando html.parser")
+    return "html.parser"
+
+
+PARSER = resolve_parser()
+
+
+# ===========================
+# Filtros de subárboles (solo se construye lo que la ruta necesita)
+# ===========================
+def tag_filter(match):
+    """
+    Crea un parse_only a partir de `match(nombre, attrs) -> bool`, evaluado sobre cada etiqueta
+    de primer nivel: las que coinciden se parsean con todo su subárbol y el resto se descarta
+    sin crear objetos. Funciona con bs4 < 4.13 (SoupStrainer con función) y >= 4.13 (ElementFilter).
+    """
+    if ElementFilter is not None:
+        class _TagFilter(ElementFilter):
+            def allow_tag_creation(self, nsprefix, name, attrs):
+                return match(name, attrs or {})
+
+            def allow_string_creation(self, string):
+                return False  # texto suelto fuera de las etiquetas elegidas
+
+        return _TagFilter()
+    return SoupStrainer(lambda name, attrs=None: match(name, attrs or {}))
+
+
+def _classes(attrs) -> set:
+    value = attrs.get("class") or ""
+    return set(value.split() if isinstance(value, str) else value)
+
+
+def _match_search_cards(name, attrs):
+    return name == "div" and "element" in _classes(attrs)
+
+
+def _match_manga_detail(name, attrs):
+    classes = _classes(attrs)
+    return (
+        name == "header"
+        or "element-header-content" in classes
+        or "book-status" in classes
+        or attrs.get("id") == "chapters"
+    )
+
+
+# Tarjetas de resultados de /library (mangasearch)
+SEARCH_CARDS = tag_filter(_match_search_cards)
+# Ficha de una obra: cabecera (título, géneros, títulos alternativos), estado y lista de capítulos
+MANGA_DETAIL = tag_filter(_match_manga_detail)
+
+
+def parse_html(html: str, only=None, parser: str = None) -> BeautifulSoup:
+    """
+    Parsea `html` con el backend configurado. `only` es uno de los filtros de arriba (o
+    cualquier parse_only de bs4); sin él se construye el DOM completo.
+    """
+    return BeautifulSoup(html, parser or PARSER, parse_only=only)
@@ -0,0 +1,147 @@
+import asyncio
+import logging
+import time
+from urllib.parse import urlsplit
+from core.config import (
+    IMAGE_PREFETCH_ENABLED, IMAGE_PREFETCH_CONCURRENCY, IMAGE_PREFETCH_HOST_RATE, IMAGE_PREFETCH_TIMEOUT
+)
+from core.imagestore import DiskImageStore, image_store
+from utils.images import fetch_to_store
+
+logger = logging.getLogger(__name__)
+
+
+class HostRateLimiter:
+    """
+    Límite de peticiones por segundo y host (intervalo mínimo entre arranques). Es aparte del
+    semáforo de core.http.host_limit, que limita la concurrencia y no el ritmo.
+    """
+
+    def __init__(self, rate: float = IMAGE_PREFETCH_HOST_RATE):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next = {}  # host -> instante a partir del cual puede salir la siguiente petición
+
+    async def wait(self, url: str):
+        if not self.interval:
+            return
+        host = urlsplit(url).netloc
+        now = time.monotonic()
+        start = max(now, self._next.get(host, now))
+        self._next[host] = start + self.interval
+        if start > now:
+            await asyncio.sleep(start - now)
+
+
+class ImagePrefetcher:
+    """
+    Precarga en segundo plano de las páginas de un capítulo en la caché de imágenes, para que
+    las peticiones del visor a proxy_image se sirvan desde disco. Un trabajo por visor, con
+    concurrencia acotada (global, compartida por todos los trabajos) y ritmo limitado por host.
+    El registro de visores llama a cancel() cuando uno expira.
+    """
+
+    def __init__(self, store: DiskImageStore = image_store, concurrency: int = IMAGE_PREFETCH_CONCURRENCY,
+                 timeout: float = IMAGE_PREFETCH_TIMEOUT, enabled: bool = IMAGE_PREFETCH_ENABLED):
+        self.store = store
+        self.enabled = enabled
+        self.timeout = timeout
+        self.concurrency = concurrency
+        self._semaphore = None  # se crea dentro del bucle de eventos
+        self._rate = HostRateLimiter()
+        self._jobs = {}  # viewer_id -> asyncio.Task
+        self._planned = {}  # viewer_id -> set de URLs de su capítulo
+        self.fetched = 0
+        self.skipped = 0  # ya estaban en disco
+        self.failed = 0
+        self.cancelled = 0
+        self.page_hits = 0  # páginas pedidas por el visor que ya estaban en disco
+        self.page_misses = 0  # páginas pedidas antes de que la precarga llegara a ellas
+
+    def start(self, viewer_id: str, urls, headers: dict):
+        """Lanza la precarga de un visor (no bloquea). No hace nada si está desactivada."""
+        if not self.enabled or not urls:
+            return None
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        self.cancel(viewer_id)
+        self._planned[viewer_id] = set(urls)
+        task = asyncio.create_task(self._run(viewer_id, list(urls), dict(headers)))
+        self._jobs[viewer_id] = task
+        task.add_done_callback(lambda t, vid=viewer_id: self._done(vid, t))
+        return task
+
+    def cancel(self, viewer_id: str):
+        self._planned.pop(viewer_id, None)
+        task = self._jobs.pop(viewer_id, None)
+        if task is not None and not task.done():
+            task.cancel()
+            self.cancelled += 1
+
+    async def close(self):
+        tasks = [t for t in self._jobs.values() if not t.done()]
+        for viewer_id in list(self._jobs):
+            self.cancel(viewer_id)
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def record(self, viewer_id: str, url: str, hit: bool):
+        """Anota si una página pedida por el visor estaba ya precargada (para el hit rate)."""
+        if url not in self._planned.get(viewer_id, ()):
+            return
+        if hit:
+            self.page_hits += 1
+        else:
+            self.page_misses += 1
+
+    def _done(self, viewer_id: str, task: asyncio.Task):
+        if self._jobs.get(viewer_id) is task:
+            del self._jobs[viewer_id]
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning("Precarga del visor %s fallida: %s", viewer_id, task.exception())
+
+    async def _run(self, viewer_id: str, urls, headers: dict):
+        try:
+            # En orden de página: las primeras son las que el lector va a pedir antes
+            await asyncio.wait_for(
+                asyncio.gather(*(self._fetch(url, headers) for url in urls)), self.timeout
+            )
+        except asyncio.TimeoutError:
+            logger.info("Precarga del visor %s cortada tras %.0fs", viewer_id, self.timeout)
+
+    async def _fetch(self, url: str, headers: dict):
+        async with self._semaphore:
+            if await asyncio.to_thread(self.store.contains, url):
+                self.skipped += 1
+                return
+            await self._rate.wait(url)
+            try:
+                ok = await fetch_to_store(url, headers, self.store)
+            except Exception as e:
+                logger.debug("Precarga de %s fallida: %s", url, e)
+                ok = False
+            if ok:
+                self.fetched += 1
+            else:
+                self.failed += 1
+
+    def stats(self) -> dict:
+        requested = self.page_hits + self.page_misses
+        return {
+            "enabled": self.enabled,
+            "concurrency": self.concurrency,
+            "active_jobs": sum(1 for t in self._jobs.values() if not t.done()),
+            "fetched": self.fetched,
+            "skipped_cached": self.skipped,
+            "failed": self.failed,
+            "cancelled": self.cancelled,
+            "page_hits": self.page_hits,
+            "page_misses": self.page_misses,
+            "hit_rate": round(self.page_hits / requested, 4) if requested else 0.0,
+        }
+
+
+image_prefetcher = ImagePrefetcher()
+
+
+def get_prefetch_stats() -> dict:
+    return image_prefetcher.stats()
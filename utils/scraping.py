@@ -1,12 +1,14 @@
-import re, json, httpx
+import re, json
+from functools import lru_cache
 from bs4 import BeautifulSoup
 from core.config import HEADERS
+from core.http import http_get
+from utils.parsing import parse_html
 
 async def fetch_html(url):
-    async with httpx.AsyncClient() as client:
-        r = await client.get(url, headers=HEADERS)
-        r.raise_for_status()
-        return r.text
+    r = await http_get(url, headers=HEADERS)
+    r.raise_for_status()
+    return r.text
 
 def find_sveltekit_script(soup: BeautifulSoup):
     for s in soup.find_all("script"):
@@ -14,35 +16,120 @@ def find_sveltekit_script(soup: BeautifulSoup):
             return s.string
     return None
 
+def extract_sveltekit_script(html: str, marker: str = "__sveltekit"):
+    """
+    Camino rápido: devuelve el texto del <script> que contiene `marker` buscando con
+    str.find/rfind sobre el HTML, sin construir ningún DOM. None si no lo encuentra.
+    """
+    idx = html.find(marker)
+    while idx != -1:
+        open_idx = html.rfind("<script", 0, idx)
+        if open_idx == -1:
+            return None
+        open_end = html.find(">", open_idx)
+        close_idx = html.find("</script", idx)
+        if close_idx == -1:
+            return None
+        # El marcador tiene que estar dentro de ese script (y no en un atributo ni tras su cierre)
+        if (html[open_idx + 7] in " \t\r\n>" and open_end < idx
+                and html.rfind("</script", open_idx, idx) == -1):
+            return html[open_end + 1:close_idx]
+        idx = html.find(marker, idx + len(marker))
+    return None
+
+def get_sveltekit_script(html: str):
+    """Script de datos de SvelteKit: camino rápido y, si falla, BeautifulSoup como respaldo."""
+    script = extract_sveltekit_script(html)
+    if script is not None:
+        return script
+    return find_sveltekit_script(parse_html(html))
+
+# ===========================
+# Extracción de bloques JS (una sola pasada)
+# ===========================
+# Recorre el script con un único finditer que salta strings ("...", '...', `...`) enteros,
+# cuenta corchetes/llaves y anota dónde empieza y termina cada bloque `nombre: {...}` o
+# `nombre: [...]` pedido. Devuelve spans (inicio, fin) sobre el texto original: el llamador
+# corta solo lo que necesita, sin copias intermedias ni recorridos carácter a carácter.
+
+@lru_cache(maxsize=32)
+def _block_pattern(names: tuple, openers: str):
+    keys = "|".join(re.escape(n) for n in names)
+    return re.compile(
+        r'"(?:[^"\\]|\\.)*"|\'(?:[^\'\\]|\\.)*\'|`(?:[^`\\]|\\.)*`'
+        rf"|(?<![\w$.])(?P<key>{keys})\s*:\s*(?=[{re.escape(openers)}])"
+        r"|[{}\[\]]",
+        re.DOTALL,
+    )
+
+def find_js_blocks(text: str, names, openers: str = "{[", pos: int = 0, first_only: bool = False) -> dict:
+    """
+    Busca en una sola pasada los bloques `nombre:{...}` / `nombre:[...]` de `names`.
+    Devuelve {nombre: [(inicio, fin), ...]} con spans sobre `text` (fin exclusivo) en orden
+    de aparición. Con first_only se detiene en cuanto tiene el primer bloque de cada nombre.
+    Los corchetes dentro de strings no cuentan, así que un "{" en una sinopsis no rompe nada.
+    """
+    names = tuple(names)
+    found = {name: [] for name in names}
+    pending = None  # nombre cuya apertura es el siguiente token
+    open_blocks = []  # (profundidad, nombre, inicio)
+    started = set()
+    depth = 0
+    remaining = len(names)
+    for m in _block_pattern(names, openers).finditer(text, pos):
+        tok = m.group()
+        first = tok[0]
+        if m.group("key"):
+            # Con first_only solo cuenta la primera apertura de cada nombre (no las anidadas)
+            if not (first_only and m.group("key") in started):
+                pending = m.group("key")
+        elif first in "{[":
+            depth += 1
+            if pending is not None:
+                open_blocks.append((depth, pending, m.start()))
+                started.add(pending)
+                pending = None
+        elif first in "}]":
+            if open_blocks and open_blocks[-1][0] == depth:
+                _, name, block_start = open_blocks.pop()
+                found[name].append((block_start, m.end()))
+                if first_only:
+                    remaining -= 1
+                    if remaining == 0:
+                        break
+            depth -= 1
+    return found
+
+def _first_block(text: str, name: str, openers: str, pos: int = 0) -> str:
+    spans = find_js_blocks(text, [name], openers=openers, pos=pos, first_only=True)[name]
+    if not spans:
+        raise ValueError(f"No se encontró '{name}:{openers}' o no se cerró correctamente")
+    start, end = spans[0]
+    return text[start:end]
+
 def extract_js_object(text: str, start_marker: str) -> str:
-    start = text.find(start_marker)
-    if start == -1:
-        raise ValueError(f"No se encontró {start_marker}")
-    start = text.find("{", start)
-    brace_count = 0
-    for i in range(start, len(text)):
-        if text[i] == "{":
-            brace_count += 1
-        elif text[i] == "}":
-            brace_count -= 1
-            if brace_count == 0:
-                return text[start:i + 1]
-    raise ValueError("No se cerró el objeto correctamente")
+    """Primer objeto `marcador{...}` (p. ej. "media:") del script."""
+    return _first_block(text, start_marker.rstrip(": "), "{")
+
+def extract_js_array(text: str, name: str, pos: int = 0) -> str:
+    """Primer array `nombre:[...]` (p. ej. el `data:[` de SvelteKit) a partir de `pos`."""
+    return _first_block(text, name, "[", pos)
+
+def extract_data_block(script_text: str, key: str) -> str:
+    """Objeto `data:{...}` más interno que contiene `key:`, en la misma pasada que busca ambos."""
+    blocks = find_js_blocks(script_text, ["data", key])
+    if not blocks[key]:
+        raise ValueError(f"No se encontró '{key}:' en el script")
+    key_start = blocks[key][0][0]
+    containing = [
+        (start, end) for start, end in blocks["data"]
+        if start < key_start < end and script_text[start] == "{"
+    ]
+    if not containing:
+        raise ValueError(f"No se encontró 'data:{{' que contenga {key}:")
+    start, end = max(containing)  # el más interno
+    return script_text[start:end]
 
 def extract_home_block(script_text: str) -> str:
-    target_index = script_text.find("featured:")
-    if target_index == -1:
-        raise ValueError("No se encontró 'featured:' en el script")
-    start_data = script_text.rfind("data:{", 0, target_index)
-    if start_data == -1:
-        raise ValueError("No se encontró 'data:{' antes de featured:")
-    start_brace = script_text.find("{", start_data)
-    brace_count = 0
-    for i in range(start_brace, len(script_text)):
-        if script_text[i] == "{":
-            brace_count += 1
-        elif script_text[i] == "}":
-            brace_count -= 1
-            if brace_count == 0:
-                return script_text[start_brace:i + 1]
-    raise ValueError("No se cerró el bloque correctamente")
+    """Objeto `data:{...}` que contiene `featured:`, en la misma pasada que busca ambos."""
+    return extract_data_block(script_text, "featured")
@@ -0,0 +1,73 @@
+import json
+import re
+
+import orjson
+
+# Decodificador del subconjunto de literales JS que emite SvelteKit en sus payloads
+# (claves sin comillas, undefined, void 0, comas finales, new Date("..."), strings con comillas
+# simples). Una sola pasada de re.sub traduce el literal a JSON válido tocando solo los tokens
+# que no son JSON (la puntuación y los espacios pasan sin llamar a Python) y el resultado se
+# parsea con orjson. Los strings se consumen enteros, así que
+# un "clave:" o una coma dentro de un texto nunca se reescriben.
+
+_TOKEN = re.compile(r'''
+    (?P<str>"(?:[^"\\]|\\.)*")
+  | (?P<key>(?:[A-Za-z_$][\w$]*|\d+)(?=\s*:))
+  | (?P<num>-?(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)
+  | (?P<comma>,(?=\s*[}\]]))
+  | (?P<sqstr>'(?:[^'\\]|\\.)*')
+  | (?P<void>void\s+0\b)
+  | (?P<date>new\s+Date\(\s*(?P<date_arg>"(?:[^"\\]|\\.)*"|-?\d+)\s*\))
+  | (?P<ident>-?[A-Za-z_$][\w$]*)
+''', re.VERBOSE | re.DOTALL)
+
+_LITERALS = {"true": "true", "false": "false", "null": "null"}
+_JS_ESCAPE = re.compile(r"\\(x[0-9A-Fa-f]{2}|.)", re.DOTALL)
+
+
+def _fix_escapes(s: str) -> str:
+    """Convierte los escapes válidos en JS pero no en JSON (\\xHH, \\', continuación de línea)."""
+    def repl(m):
+        esc = m.group(1)
+        if len(esc) == 3:
+            return "\\u00" + esc[1:]
+        if esc == "'":
+            return "'"
+        if esc == "\n":
+            return ""
+        return m.group()  # escape JSON válido (incluido "\\\\"), se deja igual
+    return _JS_ESCAPE.sub(repl, s)
+
+
+def _translate(m) -> str:
+    kind = m.lastgroup
+    tok = m.group()
+    if kind == "str":
+        # Solo \xHH, \' y la continuación de línea necesitan reescritura; "\n", "\"", etc. ya son JSON
+        if "\\x" in tok or "\\'" in tok or "\\\n" in tok:
+            return _fix_escapes(tok)
+        return tok
+    if kind == "key":
+        return '"' + tok + '"'
+    if kind == "num":
+        return tok if tok[-1] != "." and tok.lstrip("-")[0] != "." else str(float(tok))
+    if kind == "comma":
+        return ""  # coma final: "[1,2,]" -> "[1,2]"
+    if kind == "sqstr":
+        body = _fix_escapes(tok[1:-1].replace('\\"', '"')).replace('"', '\\"')
+        return json.dumps(json.loads('"' + body + '"'))
+    if kind == "date" and m.group("date_arg")[0] == '"':
+        return m.group("date_arg")
+    # true/false/null pasan tal cual; undefined, void 0, NaN, Infinity y cualquier otro
+    # identificador suelto (referencias de devalue) se convierten en null
+    return _LITERALS.get(tok, "null")
+
+
+def js_to_json(text: str) -> str:
+    """Traduce un literal de objeto/array JS (subconjunto SvelteKit) a texto JSON."""
+    return _TOKEN.sub(_translate, text)
+
+
+def decode_js(text: str):
+    """Decodifica un literal JS de SvelteKit a objetos Python (dict/list/...)."""
+    return orjson.loads(js_to_json(text))